@@ -38,6 +38,11 @@ def create_app():
     sys.modules['app'].ai_service = ai_service
     sys.modules['app'].AI_AVAILABLE = AI_AVAILABLE
 
+    # Fila de jobs: registra os handlers (workers e aquecimento do RAG: start_background_services)
+    from app.services import background_tasks  # noqa: F401
+    sys.modules['app'].rag_snapshot = None
+    sys.modules['app'].job_worker = None
+
     # Registrar todos os blueprints usando o novo sistema
     from app.routes import register_all_blueprints
     register_all_blueprints(app)
@@ -73,4 +78,23 @@ def create_app():
         app.logger.addHandler(stream_handler)
 
 
+def start_background_services(app):
+    """
+    Aquecimento do RAG e workers embutidos da fila de jobs
+
+    Só no processo que atende requisições (post_worker_init do gunicorn ou
+    servidor de desenvolvimento). Comandos de CLI (flask db upgrade,
+    import-training...) também chamam create_app e não devem iniciar threads
+    que reivindicam jobs.
+    """
+    import sys
+    package = sys.modules['app']
+    if package.job_worker is not None or package.rag_snapshot is not None:
+        return
+
+    # Snapshot + aquecimento dos caches do RAG em background (evita pico de latência pós-deploy)
+    from app.services.rag_snapshot import start_rag_warmup
+    package.rag_snapshot = start_rag_warmup(app, package.ai_service.rag)
 
+    from app.services.job_queue import start_job_workers
+    package.job_worker = start_job_workers(app)
@@ -12,7 +12,10 @@ from .volunteer import (
 )
 from .triage import TriageLog, RiskLevel, TriageAction
 from .admin import AdminLog, AdminAction, LogLevel
-from .training import TrainingData, TrainingDataType, TrainingDataStatus
+from .training import TrainingData, TrainingDataType, TrainingDataStatus, TrainingChunk
+from .embedding import EmbeddingCache
+from .job import Job
+from .idempotency import IdempotencyKey
 from .base import BaseModel
 
 # Lista de todos os modelos para facilitar importação
@@ -42,5 +45,9 @@ __all__ = [
     'TrainingData',
     'TrainingDataType',
     'TrainingDataStatus',
+    'TrainingChunk',
+    'EmbeddingCache',
+    'Job',
+    'IdempotencyKey',
     'BaseModel'
 ]
@@ -25,6 +25,16 @@ class ChatMessageType(Enum):
     SYSTEM = "system"
 
 
+PREVIEW_LENGTH = 100
+
+
+def message_preview(content):
+    """Prévia exibida na lista de conversas"""
+    if content and len(content) > PREVIEW_LENGTH:
+        return content[:PREVIEW_LENGTH] + '...'
+    return content
+
+
 class ChatSession(BaseModel):
     def get_messages(self, limit=None, offset=0):
         """Retorna as mensagens da sessão em formato de dicionário - OTIMIZADO"""
@@ -76,6 +86,13 @@ class ChatSession(BaseModel):
     triage_declined_reason = db.Column(db.Text, nullable=True)  # Motivo da recusa se aplicável
     triage_context = db.Column(db.Text, nullable=True)  # JSON com contexto da triagem
     
+    # Resumo contínuo da conversa (mensagens antigas condensadas em background)
+    summary = db.Column(db.Text, nullable=True)
+    summary_until_id = db.Column(db.Integer, nullable=True)  # Última mensagem incluída no resumo
+    summary_message_count = db.Column(db.Integer, default=0, nullable=False)
+    summary_updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    summary_requested_at = db.Column(db.DateTime(timezone=True), nullable=True)  # Job de resumo pendente (dedupe)
+    
     # Feedback e avaliação
     user_rating = db.Column(db.Integer, nullable=True)  # 1-5
     user_feedback = db.Column(db.Text, nullable=True)
@@ -100,6 +117,10 @@ class ChatSession(BaseModel):
     
     last_activity = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     
+    # Prévia da última mensagem (lista de conversas sem consultar chat_messages)
+    last_message_preview = db.Column(db.String(120), nullable=True)
+    last_message_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.started_at = datetime.now(timezone.utc)
@@ -130,9 +151,14 @@ class ChatSession(BaseModel):
         # OTIMIZAÇÃO: Incrementar contador em vez de recontar
         self.message_count += 1
         self.last_activity = datetime.now(timezone.utc)
+        self.last_message_preview = message_preview(content)
+        self.last_message_at = self.last_activity
         # Adicionar à sessão sem commit automático (permite transações batch)
         db.session.add(message)
         db.session.add(self)
+        # Cache dos últimos turnos: atualizado quando a transação for commitada
+        from app.services.history_cache import recent_turns_cache
+        recent_turns_cache.stage(db.session, message, self.message_count)
         print(f"[DB] Mensagem salva: session_id={self.id} | tipo={message_type} | sender_id={sender_id} | content='{content}'")
         return message
     
@@ -170,6 +196,7 @@ class ChatSession(BaseModel):
         # Anonimizar mensagens
         for message in self.messages:
             message.anonymize_data()
+        self.last_message_preview = None
         
         self.is_anonymized = True
         self.anonymized_at = datetime.utcnow()
@@ -0,0 +1,25 @@
+"""
+Modelo para cache persistente de embeddings
+"""
+
+from datetime import datetime, timezone
+from app import db
+
+
+class EmbeddingCache(db.Model):
+    """
+    Cache de embeddings endereçado pelo conteúdo
+
+    Cada texto normalizado é identificado pelo SHA-256; o mesmo texto nunca é
+    enviado duas vezes ao provedor para o mesmo modelo.
+    """
+    __tablename__ = 'embedding_cache'
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 do texto normalizado
+    model = db.Column(db.String(100), primary_key=True)  # Modelo que gerou o vetor
+    dimensions = db.Column(db.Integer, nullable=False)
+    embedding = db.Column(db.LargeBinary, nullable=False)  # float32 serializado
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<EmbeddingCache {self.model}:{self.content_hash[:12]}>"
@@ -0,0 +1,34 @@
+"""
+Modelo das chaves de idempotência das requisições (header Idempotency-Key)
+"""
+
+from datetime import datetime, timezone
+from app import db
+
+
+class IdempotencyKey(db.Model):
+    """
+    Resposta gravada de uma requisição idempotente
+
+    Uma linha por (usuário, chave). Enquanto status = 'processing' a primeira
+    requisição ainda está em andamento; as repetições esperam por ela e depois
+    recebem a mesma resposta. Linhas expiradas podem ser reaproveitadas.
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_idempotency_keys_user_key'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    idempotency_key = db.Column(db.String(128), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 do corpo da requisição
+    status = db.Column(db.String(20), nullable=False, default='processing')  # processing | done
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.user_id}:{self.idempotency_key} {self.status}>"
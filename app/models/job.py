@@ -0,0 +1,34 @@
+"""
+Modelo da fila de jobs em background (PostgreSQL)
+"""
+
+from datetime import datetime, timezone
+from app import db
+
+
+class Job(db.Model):
+    """
+    Job da fila durável
+
+    Os workers reivindicam jobs com FOR UPDATE SKIP LOCKED; um job em execução
+    cujo locked_until expirou (worker morto) volta a ser elegível.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)  # Nome do handler registrado
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Maior = antes
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    locked_until = db.Column(db.DateTime(timezone=True), nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON devolvido pelo handler
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
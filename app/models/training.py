@@ -136,3 +136,25 @@ class TrainingData(BaseModel):
             'content_preview': self.get_content_preview()
         })
         return data
+
+
+class TrainingChunk(BaseModel):
+    """
+    Trecho indexado de um dado de treinamento (texto ou arquivo)
+
+    Gerado pelo pipeline de ingestão: cada documento é dividido em trechos com
+    sobreposição, deduplicados pelo hash do conteúdo e embeddados para o RAG.
+    """
+    __tablename__ = 'training_chunks'
+
+    training_data_id = db.Column(db.Integer, db.ForeignKey('training_data.id', ondelete='CASCADE'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)  # Posição do trecho no documento
+    page = db.Column(db.Integer, nullable=True)  # Página/seção de origem (quando disponível)
+    content = db.Column(Text, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)  # SHA-256 do texto normalizado
+    embedding = db.Column(Vector(1536), nullable=True, comment="Embedding do trecho para busca vetorial (RAG)")
+
+    training_data = db.relationship('TrainingData', backref=db.backref('chunks', lazy='dynamic', cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<TrainingChunk {self.training_data_id}#{self.chunk_index}>'
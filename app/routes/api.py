@@ -6,6 +6,7 @@ API REST simplificada para Por Você: apenas OpenAI, sem fallback, endpoints ess
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import User, ChatSession
+from app.services.chat_history import fetch_page, history_etag, not_modified, session_version
 from app import db
 from datetime import datetime
 
@@ -31,11 +32,26 @@ def get_chat_messages(session_id):
     user = get_current_user()
     if not user:
         return jsonify({'error': 'Usuário não encontrado'}), 404
-    session = ChatSession.query.filter_by(id=session_id, user_id=user.id).first()
-    if not session:
+    # Polling: versão da sessão numa consulta de colunas; sem novidade, 304 sem carregar mensagens
+    version = session_version(session_id, user.id)
+    if not version:
         return jsonify({'error': 'Sessão não encontrada'}), 404
-    messages = session.get_messages()
-    return jsonify({'session': session.to_dict(), 'messages': messages})
+    limit = request.args.get('limit', default=50, type=int)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    etag = history_etag(version, limit, before, after)
+    if not_modified(etag):
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            page = fetch_page(session_id, before=before, after=after, limit=limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        session = db.session.get(ChatSession, session_id)
+        response = jsonify({'session': session.to_dict(), **page})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # Consentimento
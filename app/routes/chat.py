@@ -2,12 +2,15 @@
 Rotas do chat com IA - Versão corrigida usando mensagens em JSON
 """
 
+import asyncio
 import json
-from flask import Blueprint, render_template, request, jsonify, session, current_app
+from flask import Blueprint, Response, render_template, request, jsonify, session, current_app, stream_with_context, url_for
 from flask_login import login_required, current_user
 from app.models import ChatSession
 from app.models.chat import ChatSessionStatus
 from app import db
+from app.services.idempotency import idempotent
+from app.services.rate_limit import rate_limited
 from datetime import datetime, timezone, timedelta
 
 # Importar ai_service condicionalmente
@@ -75,306 +78,251 @@ def new_session():
 # Endpoint padronizado para envio de mensagem e resposta da IA (OpenAI only)
 @chat.route('/api/chat/send', methods=['POST'])
 @login_required
+@rate_limited('chat_send')
+@idempotent('chat_send')
 def api_chat_send():
-    """Enviar mensagem e receber resposta da IA (OpenAI only)"""
+    """
+    Enviar mensagem e receber resposta da IA (OpenAI only)
+
+    No modo assíncrono (CHAT_ASYNC_MODE ou "async": true no corpo) a mensagem e
+    o risco são gravados, a geração é enfileirada e a resposta é 202 com o id
+    do job; a resposta da IA vem por /api/chat/jobs/<job_id> (polling ou SSE).
+
+    Com o header Idempotency-Key, repetições do cliente recebem a resposta
+    original em vez de gravar outra mensagem e chamar o LLM de novo.
+    """
+    from app.services.chat_pipeline import generate_reply
+    from app.services.chat_jobs import chat_jobs
     data = request.get_json()
-    message_content = data.get('message', '').strip()
-    session_id = data.get('session_id')
-    if not message_content:
-        return jsonify({'success': False, 'error': 'Mensagem não pode estar vazia'}), 400
-    if not session_id:
-        return jsonify({'success': False, 'error': 'ID da sessão é obrigatório'}), 400
-    from app.models import ChatMessageType, ChatSessionStatus
+    async_mode = bool(data.get('async', current_app.config.get('CHAT_ASYNC_MODE', False)))
     try:
-        # Query eficiente
-        chat_session = ChatSession.query.filter_by(
-            id=session_id,
-            user_id=current_user.id,
-            status=ChatSessionStatus.ACTIVE.value
-        ).first()
-        if not chat_session:
-            return jsonify({'success': False, 'error': 'Sessão de chat não encontrada ou inativa'}), 404
+        turn, error = _prepare_send_turn(data)
+        if error:
+            return error
+        if turn.detected_risk_level == 'critical' and current_app.config.get('CHAT_CRISIS_FAST_PATH', True):
+            return _crisis_response(turn)
 
-        # Análise de sentimento e risco
-        sentiment_analysis = None
-        detected_risk_level = 'low'
-        if AI_AVAILABLE and ai_service and ai_service.openai_client:
-            try:
-                sentiment_analysis = ai_service.analyze_with_risk_assessment(message_content)
-                detected_risk_level = sentiment_analysis.get('risk_level', 'low')
-            except Exception as e:
-                detected_risk_level = ai_service.assess_risk_level(message_content)
+        if not async_mode:
+            return jsonify(generate_reply(turn))
 
-        # Adicionar mensagem do usuário
-        user_message = chat_session.add_message(
-            content=message_content,
-            message_type=ChatMessageType.USER,
-            sender_id=current_user.id
-        )
-        if sentiment_analysis:
-            user_message.sentiment_score = sentiment_analysis.get('score')
-            user_message.risk_indicators = json.dumps({
-                'risk_level': detected_risk_level,
-                'emotion': sentiment_analysis.get('emotion'),
-                'intensity': sentiment_analysis.get('intensity'),
-                'confidence': sentiment_analysis.get('confidence'),
-                'requires_attention': sentiment_analysis.get('requires_attention', False),
-                'timestamp': sentiment_analysis.get('timestamp')
-            }, ensure_ascii=False)
-
-        # Atualizar o maior nível de risco detectado
-        risk_levels = {'low': 1, 'moderate': 2, 'high': 3, 'critical': 4}
-        if chat_session.initial_risk_level is None:
-            chat_session.initial_risk_level = detected_risk_level
-        else:
-            current_level = risk_levels.get(chat_session.initial_risk_level, 1)
-            new_level = risk_levels.get(detected_risk_level, 1)
-            if new_level > current_level:
-                chat_session.initial_risk_level = detected_risk_level
-
-        # --- Correção 1: Encaminhamento por risco OU pedido explícito de ajuda ---
-        triage_log = None
-        explicit_help_keywords = [
-            'quero ajuda', 'preciso de ajuda', 'quero atendimento', 'quero falar com um profissional',
-            'preciso de atendimento', 'preciso falar com alguém', 'quero suporte', 'me encaminhe', 'me encaminhar', 'encaminhamento', 'quero conversar com profissional'
-        ]
-        user_asked_for_help = any(kw in message_content.lower() for kw in explicit_help_keywords)
-        triage_reason = None
-        triage_level = None
-        # Só aciona triagem automática para risco alto/crítico, ou por pedido explícito
-        if detected_risk_level in ['high', 'critical']:
-            triage_level = detected_risk_level
-            triage_reason = f'Triagem iniciada por risco {detected_risk_level}.'
-        elif user_asked_for_help:
-            triage_level = 'low'
-            triage_reason = 'Triagem iniciada por pedido explícito do usuário.'
-        # Só cria log e marca contexto se ainda não foi chamado nesta sessão
-        if triage_level and not getattr(chat_session, 'triage_triggered', False):
-            from app.models.triage import TriageLog, RiskLevel
-            risk_enum_map = {
-                'low': RiskLevel.LOW,
-                'moderate': RiskLevel.MODERATE,
-                'high': RiskLevel.HIGH,
-                'critical': RiskLevel.CRITICAL
-            }
-            try:
-                triage_log = TriageLog(
-                    user_id=current_user.id,
-                    chat_session_id=chat_session.id,
-                    risk_level=risk_enum_map.get(triage_level, RiskLevel.MODERATE),
-                    confidence_score=sentiment_analysis.get('confidence', 0.5) if sentiment_analysis else 0.5,
-                    trigger_content=message_content[:500],
-                    context_type='chat_message',
-                    suicidal_ideation='suicidal_ideation' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
-                    self_harm_risk='self_harm' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
-                    severe_depression='severe_depression' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
-                    anxiety_disorder='anxiety_panic' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
-                    triage_status='initiated'
-                )
-                triage_log.emotional_state = sentiment_analysis.get('emotion', 'Análise em andamento') if sentiment_analysis else 'A avaliar'
-                triage_log.notes = triage_reason
-                db.session.add(triage_log)
-                db.session.flush()
-                session['triage_id'] = triage_log.id
-                chat_session.triage_triggered = True
-                chat_session.triage_status = 'initiated'
-                db.session.flush()
-            except Exception as e:
-                pass
-        # Se triagem já foi chamada (ou recusada/completada), nunca perder o contexto
-        # (Não sobrescrever triage_triggered/triage_status se já existe)
-
-        # --- Correção 2: Memória contextual ---
-        from app.models import ChatMessage
-        conversation_history = db.session.query(ChatMessage).filter_by(
-            session_id=chat_session.id
-        ).order_by(ChatMessage.created_at.asc()).limit(20).all()
-        history_list = []
-        for msg in conversation_history:
-            history_list.append({
-                'content': msg.content,
-                'message_type': msg.message_type.value if hasattr(msg.message_type, 'value') else msg.message_type,
-                'created_at': msg.created_at.isoformat()
-            })
-        # history_list agora é passado para o serviço de IA como contexto
-
-        # --- Correção 3: Respostas menos genéricas ---
-        def get_varied_response(risk, user_name, last_user_message):
-            # Respostas curtas e acolhedoras
-            if risk == 'critical':
-                return f"{user_name}, sua segurança é prioridade. Recomendo buscar ajuda profissional agora. CVV: 188. Estou aqui para te ouvir."  # 2 frases
-            elif risk == 'high':
-                return f"{user_name}, entendo que está difícil. Falar com um profissional pode ajudar. Quer conversar mais sobre isso?"  # 2 frases
-            elif risk == 'moderate':
-                return f"{user_name}, vejo que está passando por desafios. O que tem te ajudado? Conte comigo."  # 2 frases
-            else:
-                return f"Olá {user_name}! Como você está?"  # 1 frase
-
-        # --- Correção 4: Reconhecimento de perguntas objetivas ---
-        def check_objective_question(message, history):
-            # Exemplo: quantas vezes fui encaminhado para triagem
-            # Contar encaminhamentos reais para triagem (mensagens da IA que sugerem/provocam encaminhamento)
-            triage_keywords = ['encaminhei para triagem', 'triagem emergencial', 'profissional de saúde', 'CVV', 'SAMU', 'encaminhar para ajuda profissional']
-            triage_count = 0
-            for msg in history:
-                if msg['message_type'] == 'ai' and any(kw in msg['content'].lower() for kw in triage_keywords):
-                    triage_count += 1
-            if 'quantas vezes' in message and 'triagem' in message:
-                return f"Você foi encaminhado para triagem {triage_count} vez(es) nesta conversa."  # resposta direta
-            if 'número' in message and 'triagem' in message:
-                return f"Foram {triage_count} encaminhamentos para triagem."  # resposta direta
-            # Recuperar último relato de problema do usuário
-            if 'qual era o meu problema' in message:
-                problem_keywords = ['terminei', 'perdi', 'morreu', 'sofrendo', 'ansioso', 'depressão', 'solidão', 'relacionamento', 'triste', 'doente', 'demitido', 'separação', 'divórcio', 'abandono', 'medo', 'pânico', 'quero me machucar', 'quero morrer']
-                for msg in reversed(history):
-                    if msg['message_type'] == 'user' and any(kw in msg['content'].lower() for kw in problem_keywords):
-                        return f"Seu relato mais recente foi: '{msg['content']}'. Se quiser falar mais sobre isso, estou aqui para te ouvir."
-                # fallback: última mensagem longa do usuário
-                for msg in reversed(history):
-                    if msg['message_type'] == 'user' and len(msg['content']) > 10:
-                        return f"Você relatou: '{msg['content']}.'"
-            return None
-
-        # --- Correção 5: Empatia situacional ---
-        def get_situational_empathy(message):
-            if 'relacionamento' in message or 'sozinho' in message:
-                return "Sinto muito pelo término. Sentir-se sozinho é normal, mas você não está só. Conte comigo."  # 2 frases
-            return None
-
-        # --- Correção 6: Explorar sentimento do usuário ---
-        def explore_feelings(message):
-            return "Como você está se sentindo?"  # 1 frase
-
-        # Preparar resposta da IA
-        user_name = getattr(current_user, 'first_name', '') or 'amigo'
-        objective_answer = check_objective_question(message_content.lower(), history_list)
-        situational_empathy = get_situational_empathy(message_content.lower())
-        varied_response = get_varied_response(detected_risk_level, user_name, message_content)
-        feelings_question = explore_feelings(message_content)
-
-        # IA disponível
-        if AI_AVAILABLE and ai_service and ai_service.openai_client:
-            user_context = {
-                'name': user_name,
-                'triage_triggered': getattr(chat_session, 'triage_triggered', False),
-                'triage_status': getattr(chat_session, 'triage_status', None),
-                'triage_declined_reason': getattr(chat_session, 'triage_declined_reason', None)
-            }
-            try:
-                ai_response = ai_service.generate_response(
-                    user_message=message_content,
-                    risk_level=detected_risk_level,
-                    user_context=user_context,
-                    conversation_history=history_list
-                )
-                response_text = ai_response['message']
-            except Exception:
-                response_text = None
-        else:
-            response_text = None
-
-        # Montar resposta final considerando correções
-        # Se o usuário pediu ajuda explicitamente, resposta de encaminhamento
-        if user_asked_for_help:
-            final_response = (
-                f"Zé, percebo que você pediu ajuda. Sua segurança é prioridade. Vou te encaminhar para triagem profissional agora.\n"
-                "🆘 Precisa de Ajuda Imediata? Estes contatos estão disponíveis 24 horas:\n"
-                "CVV - Centro de Valorização da Vida\n📞 188\nApoio emocional gratuito 24h\nSAMU\n📞 192\nEmergências médicas\n🏥 Quero Falar com um Profissional\n💬 Continuar Conversando Aqui"
-            )
-        else:
-            final_response = objective_answer or situational_empathy or varied_response
-            # Adicionar pergunta sobre sentimentos se não for pergunta objetiva
-            if not objective_answer:
-                final_response += ' ' + feelings_question
-            # Se IA respondeu, priorizar resposta da IA (mas limitar tamanho)
-            if response_text:
-                frases = response_text.split('.')
-                final_response = '.'.join(frases[:3]).strip()
-                if not final_response.endswith('.'):
-                    final_response += '.'
-
-        ai_message = chat_session.add_message(
-            content=final_response,
-            message_type=ChatMessageType.AI
-        )
+        # Modo assíncrono: grava o turno e libera o worker
         db.session.commit()
-
-        response_data = {
+        job = chat_jobs.submit(
+            current_app._get_current_object(),
+            user_id=current_user.id,
+            session_id=turn.session_id,
+            fn=lambda: generate_reply(turn)
+        )
+        return jsonify({
             'success': True,
+            **_job_links(job),
             'user_message': {
-                'content': message_content,
-                'timestamp': user_message.created_at.isoformat(),
+                'content': turn.message_content,
+                'timestamp': turn.user_message_timestamp,
                 'sender_type': 'user'
             },
-            'ai_response': {
-                'content': final_response,
-                'timestamp': ai_message.created_at.isoformat(),
-                'sender_type': 'ai'
-            },
-            'risk_assessment': {
-                'risk_level': detected_risk_level,
-                'requires_triage': detected_risk_level in ['high', 'critical'] or user_asked_for_help,
-                'triage_id': triage_log.id if triage_log else None
-            }
-        }
-        return jsonify(response_data)
+            'risk_assessment': turn.risk_assessment()
+        }), 202
     except Exception as e:
         current_app.logger.error(f"Erro ao processar mensagem: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
 
 
+@chat.route('/api/chat/send-async', methods=['POST'])
+@login_required
+@rate_limited('chat_send')
+@idempotent('chat_send')
+async def api_chat_send_async():
+    """
+    Mesmo contrato de /api/chat/send (modo síncrono), com a geração em corrotina
+
+    A espera pelo LLM usa o cliente assíncrono do OpenAI (agenerate_reply);
+    requer o extra async do Flask (asgiref). O trabalho bloqueante (banco,
+    sentimento pelo LLM, resposta de crise) roda em threads com o mesmo
+    contexto, nunca no event loop.
+    """
+    from app.services.chat_pipeline import agenerate_reply
+    data = request.get_json()
+    try:
+        turn, error = await asyncio.to_thread(_prepare_send_turn, data)
+        if error:
+            return error
+        if turn.detected_risk_level == 'critical' and current_app.config.get('CHAT_CRISIS_FAST_PATH', True):
+            return await asyncio.to_thread(_crisis_response, turn)
+        return jsonify(await agenerate_reply(turn))
+    except Exception as e:
+        current_app.logger.error(f"Erro ao processar mensagem (async): {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
+
+
+def _prepare_send_turn(data):
+    """
+    Valida o corpo, grava a mensagem do usuário e prepara o turno
+
+    Returns:
+        (turno, None) ou (None, resposta de erro)
+    """
+    message_content = data.get('message', '').strip()
+    session_id = data.get('session_id')
+    if not message_content:
+        return None, (jsonify({'success': False, 'error': 'Mensagem não pode estar vazia'}), 400)
+    if not session_id:
+        return None, (jsonify({'success': False, 'error': 'ID da sessão é obrigatório'}), 400)
+    from app.services.chat_pipeline import prepare_turn
+    from app.services.deadline import Deadline
+    # Prazo único do turno, repassado a todas as etapas (RAG, sentimento, LLM)
+    deadline = Deadline.for_chat_turn(current_app.config.get('CHAT_TURN_BUDGET_SECONDS'))
+    # Query eficiente
+    chat_session = ChatSession.query.filter_by(
+        id=session_id,
+        user_id=current_user.id,
+        status=ChatSessionStatus.ACTIVE.value
+    ).first()
+    if not chat_session:
+        return None, (jsonify({'success': False, 'error': 'Sessão de chat não encontrada ou inativa'}), 404)
+
+    turn = prepare_turn(chat_session, current_user, message_content, deadline=deadline)
+    if turn.triage_log_id:
+        session['triage_id'] = turn.triage_log_id
+    return turn, None
+
+
+def _crisis_response(turn):
+    """
+    Risco crítico: mensagem de segurança imediata, sem esperar RAG/LLM;
+    a resposta personalizada chega depois como continuação (job)
+    """
+    from app.services.chat_pipeline import generate_reply, send_crisis_reply
+    from app.services.chat_jobs import chat_jobs
+    from app.services.crisis_reply import SUPPORTED_LOCALES
+    response_data = send_crisis_reply(turn, request.accept_languages.best_match(SUPPORTED_LOCALES))
+    job = chat_jobs.submit(
+        current_app._get_current_object(),
+        user_id=current_user.id,
+        session_id=turn.session_id,
+        fn=lambda: generate_reply(turn, follow_up=True)
+    )
+    response_data['follow_up'] = _job_links(job)
+    return jsonify(response_data)
+
+
+def _job_links(job):
+    """Id, status e URLs de acompanhamento de um job de geração"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('chat.api_chat_job', job_id=job.id),
+        'stream_url': url_for('chat.api_chat_job_stream', job_id=job.id)
+    }
+
+
+def _get_own_job(job_id):
+    """Job do usuário atual (None se não existe, expirou ou é de outro usuário)"""
+    from app.services.chat_jobs import chat_jobs
+    job = chat_jobs.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+
+@chat.route('/api/chat/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_chat_job(job_id):
+    """Status de uma geração assíncrona (202 enquanto pendente)"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+    # Long polling opcional: ?wait=N segura a requisição até N segundos
+    wait = min(request.args.get('wait', default=0, type=float), 25)
+    if wait > 0 and not job.finished:
+        job.wait(wait)
+    if not job.finished:
+        response = jsonify(job.to_dict())
+        response.headers['Retry-After'] = '1'
+        return response, 202
+    return jsonify(job.to_dict()), 200 if job.status == 'done' else 500
+
+
+@chat.route('/api/chat/jobs/<job_id>/stream', methods=['GET'])
+@login_required
+def api_chat_job_stream(job_id):
+    """Resposta de uma geração assíncrona via Server-Sent Events"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado ou expirado'}), 404
+
+    def events():
+        # Heartbeat a cada 15s mantém a conexão aberta atrás de proxies
+        while not job.wait(15):
+            yield ': keep-alive\n\n'
+        payload = json.dumps(job.to_dict(), ensure_ascii=False)
+        yield f"event: {job.status}\ndata: {payload}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 
 # Endpoint padronizado para recuperar histórico de mensagens
 @chat.route('/api/chat/receive', methods=['GET'])
 @login_required
 def api_chat_receive():
-    """Recuperar histórico de mensagens - OTIMIZADO"""
+    """
+    Recuperar histórico de mensagens - paginado por cursor
+
+    Sem cursor devolve as mensagens mais recentes; `before` pagina para trás e
+    `after` traz só as novas (polling). Com If-None-Match igual ao ETag atual
+    responde 304 sem carregar as mensagens.
+    """
+    from app.services.chat_history import fetch_page, history_etag, not_modified, session_version
     session_id = request.args.get('session_id', type=int)
-    limit = request.args.get('limit', default=50, type=int)  # Limitar mensagens
-    offset = request.args.get('offset', default=0, type=int)
-    
+    limit = request.args.get('limit', default=50, type=int)
+    before = request.args.get('before')
+    after = request.args.get('after')
+
     if not session_id:
         return jsonify({'success': False, 'error': 'ID da sessão é obrigatório'}), 400
-    
-    # Limitar o número máximo de mensagens para evitar sobrecarga
-    limit = min(limit, 100)  # Máximo 100 mensagens por request
-    
+
     try:
-        chat_session = ChatSession.query.filter_by(
-            id=session_id, 
-            user_id=current_user.id
-        ).first()
-        
-        if not chat_session:
+        version = session_version(session_id, current_user.id)
+        if not version:
             return jsonify({'success': False, 'error': 'Sessão não encontrada'}), 404
-        
-        # OTIMIZAÇÃO: Usar método paginado
-        messages = chat_session.get_messages(limit=limit, offset=offset)
-        
-        # Se não houver mensagens, adiciona mensagem de boas-vindas temporária
-        if not messages and offset == 0:
-            messages = [{
-                'id': 0,
-                'session_id': chat_session.id,
-                'sender_id': None,
-                'content': 'Olá! Sou seu assistente de apoio emocional. Como você está se sentindo hoje?',
-                'message_type': 'ai',
-                'sentiment_score': None,
-                'ai_model_used': None,
-                'ai_confidence': None,
-                'processing_time_ms': None,
-                'created_at': chat_session.started_at.isoformat() if chat_session.started_at else None,
-                'is_anonymized': False
-            }]
-        
-        return jsonify({
-            'success': True, 
-            'messages': messages,
-            'total_messages': chat_session.message_count,
-            'has_more': (offset + len(messages)) < chat_session.message_count
-        })
-        
+
+        etag = history_etag(version, limit, before, after)
+        if not_modified(etag):
+            response = current_app.response_class(status=304)
+        else:
+            page = fetch_page(session_id, before=before, after=after, limit=limit)
+
+            # Se não houver mensagens, adiciona mensagem de boas-vindas temporária
+            if not page['messages'] and not before and not after:
+                page['messages'] = [{
+                    'id': 0,
+                    'session_id': session_id,
+                    'sender_id': None,
+                    'content': 'Olá! Sou seu assistente de apoio emocional. Como você está se sentindo hoje?',
+                    'message_type': 'ai',
+                    'sentiment_score': None,
+                    'ai_model_used': None,
+                    'ai_confidence': None,
+                    'processing_time_ms': None,
+                    'created_at': version.started_at.isoformat() if version.started_at else None,
+                    'is_anonymized': False
+                }]
+
+            response = jsonify({
+                'success': True,
+                **page,
+                'total_messages': version.message_count
+            })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Erro ao buscar mensagens: {str(e)}")
         return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
@@ -407,6 +355,13 @@ def end_session(session_id):
             message_type=ChatMessageType.AI
         )
         db.session.commit()
+        # Embeddings da conversa para o RAG em background
+        try:
+            from app.services.job_queue import job_queue
+            job_queue.enqueue('conversation_embeddings', {'session_id': chat_session.id})
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Erro ao agendar embeddings da sessão {chat_session.id}: {e}')
         return jsonify({
             'success': True,
             'message': 'Sessão finalizada com sucesso',
@@ -504,37 +459,18 @@ def check_session_status(session_id):
 @chat.route('/api/conversations', methods=['GET'])
 @login_required
 def get_conversations():
-    """Obter histórico de conversas do usuário"""
+    """Obter histórico de conversas do usuário (paginado: ?before=<next_cursor>)"""
+    from app.services.conversation_list import list_conversations
     try:
-        from app.models import ChatSession, ChatMessage
-        from sqlalchemy import desc
-        
-        # Buscar todas as sessões do usuário, incluindo as finalizadas
-        sessions = ChatSession.query.filter_by(
-            user_id=current_user.id
-        ).order_by(desc(ChatSession.created_at)).limit(50).all()
-        
-        conversations = []
-        for session in sessions:
-            # Buscar última mensagem para prévia
-            last_message = ChatMessage.query.filter_by(
-                session_id=session.id
-            ).order_by(desc(ChatMessage.created_at)).first()
-            
-            conversations.append({
-                'id': session.id,
-                'title': session.title or f"Conversa {session.created_at.strftime('%d/%m/%Y')}",
-                'created_at': session.created_at.isoformat(),
-                'status': session.status.value if hasattr(session.status, 'value') else session.status,
-                'message_count': session.message_count,
-                'last_message': last_message.content[:100] + '...' if last_message and len(last_message.content) > 100 else (last_message.content if last_message else 'Conversa iniciada')
-            })
-        
-        return jsonify({
-            'success': True,
-            'conversations': conversations
-        })
+        page = list_conversations(
+            current_user.id,
+            before=request.args.get('before'),
+            limit=request.args.get('limit', default=50, type=int)
+        )
+        return jsonify({'success': True, **page})
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -601,6 +537,13 @@ def api_end_session():
                 chat_session.duration_minutes = 0
         
         db.session.commit()
+        # Embeddings da conversa para o RAG em background
+        try:
+            from app.services.job_queue import job_queue
+            job_queue.enqueue('conversation_embeddings', {'session_id': chat_session.id})
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Erro ao agendar embeddings da sessão {chat_session.id}: {e}')
         
         return jsonify({
             'success': True,
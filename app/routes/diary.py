@@ -6,6 +6,7 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_required, current_user
 from app.models import DiaryEntry, User
 from app.services.ai_service import AIService
+from app.services.rate_limit import rate_limited
 from app import db
 from datetime import datetime, timedelta
 import json
@@ -24,6 +25,7 @@ def diary_interface():
 
 @diary.route('/api/diary/add', methods=['POST'])
 @login_required
+@rate_limited('diary_analysis')
 def add_entry():
     """Endpoint para adicionar nova entrada no diário"""
     try:
@@ -70,19 +72,14 @@ def add_entry():
         # Salvar no banco
         entry.save()
         
-        # Análise com IA se disponível
+        # Análise com IA em background (fila de jobs; não segura a requisição)
         try:
-            from app import ai_service
-            if ai_service and hasattr(ai_service, 'analyze_diary_entry'):
-                analysis = ai_service.analyze_diary_entry(content)
-                if analysis:
-                    entry.sentiment_score = analysis.get('sentiment_score', entry.sentiment_score)
-                    entry.emotions = json.dumps(analysis.get('themes', []))
-                    entry.risk_factors = json.dumps(analysis.get('risk_indicators', []))
-                    entry.save()
+            from app.services.job_queue import job_queue
+            job_queue.enqueue('diary_analysis', {'entry_id': entry.id})
         except Exception as ai_error:
-            print(f"Erro na análise IA: {ai_error}")
-            # Continuar mesmo se a IA falhar
+            db.session.rollback()
+            print(f"Erro ao agendar análise IA: {ai_error}")
+            # Continuar mesmo se o agendamento falhar
         
         return jsonify({
             'success': True,
@@ -119,9 +119,12 @@ def health_check():
     except:
         db_status = False
         
+    # Nível de degradação do pipeline do chat (0 = completo)
+    from app.services.degradation import degradation
     return jsonify({
         'status': 'ok' if db_status else 'error',
         'database': 'connected' if db_status else 'disconnected',
+        'degradation': {'level': degradation.level, 'name': degradation.level_name},
         'timestamp': request.environ.get('REQUEST_TIME', 'unknown')
     }), 200 if db_status else 503
 
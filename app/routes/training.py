@@ -157,6 +157,13 @@ def submit():
             training_data.status = TrainingDataStatus.APPROVED
             training_data.save()
 
+            # Extração, chunking e embeddings em background (fila de jobs)
+            try:
+                from app.services.job_queue import job_queue
+                job_queue.enqueue('training_ingestion', {'training_data_id': training_data.id})
+            except Exception as e:
+                logger.error(f"Erro ao agendar ingestão do treinamento {training_data.id}: {e}")
+
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 # Retorna HTML parcial para AJAX
                 return render_template('training/success.html', user=current_user)
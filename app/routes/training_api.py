@@ -3,7 +3,7 @@ API para Gerenciamento e Monitoramento do Sistema de Treinamento de IA
 """
 
 from flask import Blueprint, request, jsonify, current_app
-from flask_login import login_required
+from flask_login import login_required, current_user
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -11,6 +11,7 @@ from typing import Dict, List, Optional
 # Importar serviços
 from app.services.ai_service import AIService
 from app.services.finetuning_preparator import finetuning_preparator
+from app.services.rate_limit import rate_limited
 
 logger = logging.getLogger(__name__)
 
@@ -205,6 +206,17 @@ def create_finetuning_dataset():
         if not isinstance(max_samples, int) or max_samples < 1 or max_samples > 10000:
             return jsonify({'error': 'max_samples deve ser um inteiro entre 1 e 10000'}), 400
         
+        # Geração em background: grava o arquivo e o resultado fica no job
+        if data.get('async'):
+            from app.services.job_queue import job_queue
+            job_id = job_queue.enqueue('finetuning_dataset', {
+                'dataset_type': dataset_type,
+                'format_type': format_type,
+                'max_samples': max_samples,
+                'file_path': data.get('file_path')
+            })
+            return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+        
         ai_service = AIService()
         result = ai_service.create_finetuning_dataset(dataset_type, format_type, max_samples)
         
@@ -215,6 +227,25 @@ def create_finetuning_dataset():
         return jsonify({'error': str(e)}), 500
 
 
+@training_api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job_status(job_id):
+    """Status de um job em background (ex.: dataset de fine-tuning) - apenas administradores"""
+    # Payload e resultado podem conter dados sensíveis (ex.: análise de risco do diário)
+    if not current_user.is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+    try:
+        from app.services.job_queue import job_queue
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Erro ao consultar job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @training_api_bp.route('/finetuning/dataset/save', methods=['POST'])
 @login_required
 def save_finetuning_dataset():
@@ -285,6 +316,7 @@ def clear_training_cache():
 
 @training_api_bp.route('/test/response', methods=['POST'])
 @login_required
+@rate_limited('training_test')
 def test_ai_response():
     """Testa resposta da IA com sistema completo"""
     try:
@@ -325,6 +357,7 @@ def test_ai_response():
 
 @training_api_bp.route('/test/sentiment', methods=['POST'])
 @login_required
+@rate_limited('training_test')
 def test_sentiment_analysis():
     """Testa análise de sentimento"""
     try:
@@ -82,7 +82,7 @@ Rotas do dashboard do voluntário
 """
 
 
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash
+from flask import Blueprint, Response, render_template, request, redirect, url_for, jsonify, flash, current_app
 from flask_login import login_required, current_user
 from app.models import User, Volunteer
 from app.models.chat1a1 import Chat1a1Session, Chat1a1Message
@@ -91,6 +91,8 @@ from app import db
 from datetime import datetime
 from datetime import datetime, timezone
 import sqlalchemy as sa
+from app.services.realtime import event_broker, session_channel, stream_events
+from app.services.waiting_queue import claim_next, claim_session, waiting_queue
 
 volunteer = Blueprint('volunteer', __name__)
 
@@ -130,45 +132,8 @@ def dashboard():
 @login_required
 def new_service():
     """Lista de clientes esperando atendimento"""
-    # Buscar todas as sessões em espera, ordenadas por prioridade e data
-    waiting_sessions = Chat1a1Session.query.filter(
-        Chat1a1Session.status == 'WAITING',
-        Chat1a1Session.volunteer_id == None
-    ).order_by(
-        # Prioridade: critical > high > normal
-        sa.case(
-            (Chat1a1Session.priority_level == 'critical', 1),
-            (Chat1a1Session.priority_level == 'high', 2),
-            else_=3
-        ),
-        Chat1a1Session.started_at.asc()  # Mais antigos primeiro
-    ).all()
-    
-    # Criar lista com informações completas dos clientes
-    clients_waiting = []
-    for session in waiting_sessions:
-        client = session.user
-        
-        # Buscar a triagem mais recente do cliente
-        triage_log = TriageLog.query.filter_by(user_id=client.id).order_by(TriageLog.created_at.desc()).first()
-        
-        client_info = {
-            'session': session,
-            'client': client,
-            'triage_log': triage_log,
-            'waiting_time': datetime.now(timezone.utc) - session.started_at,
-            'priority_label': {
-                'critical': 'Urgente',
-                'high': 'Alto',
-                'normal': 'Normal'
-            }.get(session.priority_level, 'Normal'),
-            'priority_color': {
-                'critical': '#d63031',
-                'high': '#e17055', 
-                'normal': '#00b894'
-            }.get(session.priority_level, '#00b894')
-        }
-        clients_waiting.append(client_info)
+    # Ordem de atendimento: prioridade, risco da triagem e tempo de espera (aging)
+    clients_waiting = waiting_queue.waiting_list()
     
     return render_template('volunteer/new_service_list.html', clients_waiting=clients_waiting)
 
@@ -198,22 +163,14 @@ def view_client_details(session_id):
 @login_required
 def accept_client(session_id):
     """Aceitar um cliente e iniciar chat 1a1"""
-    session = Chat1a1Session.query.get_or_404(session_id)
+    volunteer = _get_or_create_volunteer()
     
-    # Verificar se a sessão ainda está disponível
-    if session.status != 'WAITING':
+    # Atribuir voluntário à sessão (atômico: só se ainda estiver em espera)
+    session = claim_session(session_id, volunteer.id)
+    if session is None:
+        flash('Este cliente já está sendo atendido por outro voluntário.', 'info')
         return redirect(url_for('volunteer.new_service'))
-    
-    # Criar ou obter voluntário
-    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
-    if not volunteer:
-        volunteer = Volunteer(user_id=current_user.id)
-        db.session.add(volunteer)
-        db.session.commit()
-    
-    # Atribuir voluntário à sessão
-    session.volunteer_id = volunteer.id
-    session.status = 'ACTIVE'
+    _publish_status(session)
     db.session.commit()
     
     # Redirecionar para o chat
@@ -224,22 +181,14 @@ def accept_client(session_id):
 @login_required
 def video_call(session_id):
     """Iniciar chamada de vídeo com cliente"""
-    session = Chat1a1Session.query.get_or_404(session_id)
+    volunteer = _get_or_create_volunteer()
     
-    # Verificar se a sessão ainda está disponível
-    if session.status != 'WAITING':
+    # Atribuir voluntário à sessão e iniciar vídeo (atômico: só se ainda estiver em espera)
+    session = claim_session(session_id, volunteer.id)
+    if session is None:
+        flash('Este cliente já está sendo atendido por outro voluntário.', 'info')
         return redirect(url_for('volunteer.new_service'))
-    
-    # Criar ou obter voluntário
-    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
-    if not volunteer:
-        volunteer = Volunteer(user_id=current_user.id)
-        db.session.add(volunteer)
-        db.session.commit()
-    
-    # Atribuir voluntário à sessão e iniciar vídeo
-    session.volunteer_id = volunteer.id
-    session.status = 'ACTIVE'
+    _publish_status(session)
     db.session.commit()
     
     # TODO: Implementar notificação para o cliente sobre chamada de vídeo
@@ -247,6 +196,31 @@ def video_call(session_id):
     return redirect(url_for('volunteer.client_chat', session_id=session_id))
 
 
+@volunteer.route('/claim_next', methods=['POST'])
+@login_required
+def claim_next_client():
+    """Atender o próximo cliente da fila (maior prioridade, mais antigo)"""
+    volunteer = _get_or_create_volunteer()
+    session = claim_next(volunteer.id)
+    if session is None:
+        db.session.commit()
+        flash('Nenhum cliente aguardando atendimento.', 'info')
+        return redirect(url_for('volunteer.new_service'))
+    _publish_status(session)
+    db.session.commit()
+    return redirect(url_for('volunteer.client_chat', session_id=session.id))
+
+
+def _get_or_create_volunteer():
+    """Voluntário do usuário atual (criado no primeiro atendimento)"""
+    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
+    if not volunteer:
+        volunteer = Volunteer(user_id=current_user.id)
+        db.session.add(volunteer)
+        db.session.flush()
+    return volunteer
+
+
 @volunteer.route('/reject_client/<int:session_id>')
 @login_required
 def reject_client(session_id):
@@ -293,11 +267,8 @@ def client_send_message(session_id):
         return {"error": "Sessão não está ativa"}, 404
         
     # Verificar se o usuário pode enviar mensagens nesta sessão
-    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
-    is_volunteer = volunteer and session.volunteer_id == volunteer.id
-    is_client = session.user_id == current_user.id
-    
-    if not (is_volunteer or is_client):
+    role = _session_role(session)
+    if role is None:
         return {"error": "Acesso negado a esta sessão"}, 403
     
     data = request.get_json()
@@ -309,11 +280,17 @@ def client_send_message(session_id):
             session_id=session.id,
             sender_id=current_user.id,
             content=content,
-            message_type='volunteer' if is_volunteer else 'client'
+            message_type=role
         )
         
         db.session.add(message)
         session.message_count += 1
+        db.session.flush()
+        # Entregue às conexões SSE da sessão depois do commit
+        event_broker.publish_on_commit(
+            db.session, session_channel(session.id), 'message',
+            _message_payload(message, current_user.first_name), event_id=message.id
+        )
         db.session.commit()
     
     return {"success": True}
@@ -322,40 +299,108 @@ def client_send_message(session_id):
 @volunteer.route('/api/messages/<int:session_id>')
 @login_required
 def get_messages(session_id):
-    """Buscar mensagens do chat 1a1"""
+    """Buscar mensagens do chat 1a1 (?since_id=N traz só as posteriores, para reconexão)"""
     session = Chat1a1Session.query.get_or_404(session_id)
     
     # Verificar se o usuário pode ver as mensagens
-    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
-    is_volunteer = volunteer and session.volunteer_id == volunteer.id
-    is_client = session.user_id == current_user.id
-    
-    if not (is_volunteer or is_client):
+    if _session_role(session) is None:
         return {"error": "Acesso negado a esta sessão"}, 403
     
-    messages = session.messages.order_by(Chat1a1Message.created_at.asc()).all()
-    
-    messages_data = []
-    for message in messages:
-        # Buscar o nome do usuário diretamente do banco
-        sender = User.query.get(message.sender_id)
-        sender_name = sender.first_name if sender else 'Desconhecido'
-        
-        messages_data.append({
-            'id': message.id,
-            'content': message.content,
-            'sender_type': message.message_type,
-            'sender_name': sender_name,
-            'created_at': message.created_at.isoformat()
-        })
-    
+    since_id = request.args.get('since_id', default=0, type=int)
     return jsonify({
         'success': True,
-        'messages': messages_data,
+        'messages': _messages_since(session.id, since_id),
         'session_status': session.status
     })
 
 
+@volunteer.route('/api/chat1a1/<int:session_id>/stream')
+@login_required
+def stream_session_events(session_id):
+    """
+    Server-Sent Events da sessão 1a1: mensagens novas, status e digitação
+
+    Reconexão: Last-Event-ID (ou ?since_id=N) reenvia as mensagens perdidas.
+    """
+    session = Chat1a1Session.query.get_or_404(session_id)
+    if _session_role(session) is None:
+        return {"error": "Acesso negado a esta sessão"}, 403
+
+    since_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since_id', default=0, type=int)
+    # Assina antes de ler o backlog: nada publicado no intervalo se perde
+    subscription = event_broker.subscribe(session_channel(session.id), current_app._get_current_object())
+    try:
+        backlog = [
+            {'channel': subscription.channel, 'event': 'message', 'id': message['id'], 'data': message}
+            for message in _messages_since(session.id, since_id)
+        ] if since_id else []
+        backlog.append({'channel': subscription.channel, 'event': 'status', 'id': None,
+                        'data': _status_payload(session)})
+        # A conexão do banco volta ao pool antes do streaming (a conexão SSE é longa)
+        db.session.close()
+    except Exception:
+        subscription.close()
+        raise
+
+    return Response(stream_events(subscription, backlog, last_id=since_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@volunteer.route('/api/chat1a1/<int:session_id>/typing', methods=['POST'])
+@login_required
+def typing_event(session_id):
+    """Indicador de digitação (efêmero, não é gravado)"""
+    session = Chat1a1Session.query.get_or_404(session_id)
+    role = _session_role(session)
+    if role is None:
+        return {"error": "Acesso negado a esta sessão"}, 403
+    data = request.get_json(silent=True) or {}
+    event_broker.publish(session_channel(session.id), 'typing',
+                         {'sender_type': role, 'typing': bool(data.get('typing', True))})
+    return {"success": True}
+
+
+def _session_role(session):
+    """'volunteer', 'client' ou None (sem acesso à sessão)"""
+    volunteer = Volunteer.query.filter_by(user_id=current_user.id).first()
+    if volunteer and session.volunteer_id == volunteer.id:
+        return 'volunteer'
+    if session.user_id == current_user.id:
+        return 'client'
+    return None
+
+
+def _message_payload(message, sender_name):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender_type': message.message_type,
+        'message_type': message.message_type,
+        'sender_name': sender_name or 'Desconhecido',
+        'created_at': message.created_at.isoformat()
+    }
+
+
+def _messages_since(session_id, since_id=0):
+    """Mensagens com id > since_id e nome do remetente numa única consulta"""
+    rows = db.session.query(Chat1a1Message, User.first_name).outerjoin(
+        User, User.id == Chat1a1Message.sender_id
+    ).filter(
+        Chat1a1Message.session_id == session_id,
+        Chat1a1Message.id > since_id
+    ).order_by(Chat1a1Message.id.asc()).all()
+    return [_message_payload(message, sender_name) for message, sender_name in rows]
+
+
+def _status_payload(session):
+    return {'status': session.status, 'volunteer_connected': session.volunteer_id is not None}
+
+
+def _publish_status(session):
+    """Status da sessão (aceita/encerrada) para o cliente, no commit"""
+    event_broker.publish_on_commit(db.session, session_channel(session.id), 'status', _status_payload(session))
+
+
 @volunteer.route('/end_session/<int:session_id>')
 @login_required
 def end_session(session_id):
@@ -370,6 +415,7 @@ def end_session(session_id):
     # Encerrar a sessão
     session.status = 'COMPLETED'
     session.completed_at = datetime.utcnow()
+    _publish_status(session)
     db.session.commit()
     
     flash('Atendimento encerrado com sucesso!', 'success')
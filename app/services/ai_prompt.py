@@ -55,7 +55,8 @@ class PromptContext:
     user_message: str
     risk_level: RiskLevel
     user_name: Optional[str] = None
-    session_history: Optional[List[Dict]] = None
+    session_history: Optional[List[Dict]] = None  # Últimos turnos (janela recente)
+    conversation_summary: Optional[str] = None  # Resumo das mensagens anteriores à janela
     training_context: Optional[str] = None
     conversation_examples: Optional[List[Dict]] = None
     emotional_state: Optional[str] = None
@@ -121,6 +122,12 @@ class AIPromptManager:
             prompt += f"Estado emocional: {context.emotional_state}\n"
         if context.dominant_themes:
             prompt += f"Temas principais: {', '.join(context.dominant_themes)}\n"
+        # Resumo + últimos turnos: tamanho constante em conversas longas
+        if context.conversation_summary:
+            prompt += f"Resumo da conversa até aqui: {context.conversation_summary}\n"
+        history = self._recent_history_lines(context)
+        if history:
+            prompt += "Histórico recente:\n" + "\n".join(history) + "\n"
         prompt += "Responda de forma empática, breve e útil."
 
         # Estrutura compatível com OpenAI/Gemini
@@ -135,6 +142,18 @@ class AIPromptManager:
             "temperature": 0.7
         }
     
+    @staticmethod
+    def _recent_history_lines(context: PromptContext, max_chars: int = 500) -> List[str]:
+        """Janela recente do histórico, sem repetir a mensagem atual"""
+        history = list(context.session_history or [])
+        if history and history[-1].get('content') == context.user_message:
+            history = history[:-1]
+        lines = []
+        for msg in history:
+            speaker = 'Usuário' if msg.get('message_type') == 'user' else 'Assistente'
+            lines.append(f"{speaker}: {str(msg.get('content', ''))[:max_chars]}")
+        return lines
+
     # Configurações de provider podem ser movidas para um arquivo utilitário se necessário
     
     # Função de análise de humor pode ser movida para utilitário se desejado
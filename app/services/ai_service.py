@@ -4,13 +4,16 @@ Inclui: Análise de Sentimentos, Geração de Respostas, RAG e Sistema de Prompt
 
 """
 
+import asyncio
 import json
 import os
 import logging
 import random
+import time
 from datetime import datetime, UTC
 from typing import Dict, List, Optional
 from sqlalchemy import text
+from cachetools import LRUCache, TTLCache
 
 try:
     import openai
@@ -38,6 +41,14 @@ from .ai_prompt import AIPromptManager, PromptContext, RiskLevel, PromptType
 
 # === IMPORTAR SISTEMAS AVANÇADOS ===
 from .finetuning_preparator import finetuning_preparator
+from .retrieval_state import RetrievalStateStore, merge_candidates
+from .embedding_service import content_hash
+from .llm_admission import llm_admission
+from .speculation import speculative_generator
+from .degradation import degradation
+from .deadline import Deadline, activate as activate_deadline, statement_timeout
+from .safe_cache import MISSING, SafeCache
+from .rate_limit import rate_limiter
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -59,12 +70,25 @@ class SimpleRAG:
     
     def __init__(self):
         """Inicializa o sistema RAG consolidado"""
-        self.cache = {}  # Cache simples mas eficaz
-        self.training_cache = {}  # Cache para dados de treinamento
-        logger.info("SimpleRAG consolidado inicializado")
+        # Caches protegidos por lock: vários turnos simultâneos no mesmo worker (threads/greenlets)
+        self.cache = SafeCache()  # Cache simples mas eficaz
+        self.training_cache = SafeCache()  # Cache para dados de treinamento
+        self.ranked_cache = SafeCache(LRUCache(maxsize=1000))  # Candidatos já ranqueados (evita repetir a busca para os exemplos)
+        self.session_states = RetrievalStateStore()  # Candidatos acumulados por sessão (busca incremental)
+        # Resultados do banco por assinatura de palavras-chave (compartilhado entre mensagens parecidas)
+        self.signature_cache = SafeCache(TTLCache(
+            maxsize=int(os.getenv('RAG_SIGNATURE_CACHE_SIZE', '2000')),
+            ttl=int(os.getenv('RAG_SIGNATURE_CACHE_TTL', '3600'))
+        ))
+        self.cache_writes = 0  # Usado pelo snapshot para saber se há algo novo a gravar
+        self.snapshot_manager = None  # RAGSnapshotManager (carrega o snapshot sob demanda)
+        # 'regex' (busca original) ou 'hybrid' (léxico + vetorial com RRF e MMR)
+        self.retrieval_mode = os.getenv('RAG_RETRIEVAL_MODE', 'regex').lower()
+        self._hybrid_retriever = None
+        logger.info(f"SimpleRAG consolidado inicializado (modo: {self.retrieval_mode})")
     
     def get_relevant_context(self, user_message: str, risk_level: str = 'low', 
-                           limit: int = 3) -> Optional[str]:
+                           limit: int = 3, session_id: Optional[int] = None) -> Optional[str]:
         print(f"[RAG] Buscando contexto para: '{user_message}' | Risco: {risk_level} | Limite: {limit}")
         """
         Busca contexto relevante de conversas bem-sucedidas
@@ -73,28 +97,23 @@ class SimpleRAG:
             user_message: Mensagem do usuário
             risk_level: Nível de risco (low, moderate, high, critical)
             limit: Número máximo de exemplos a retornar
+            session_id: Sessão de chat (habilita a busca incremental entre turnos)
             
         Returns:
             String com contexto relevante ou None se não encontrar
         """
         try:
-            # Verificar cache primeiro
-            cache_key = f"{hash(user_message)}_{risk_level}_{limit}"
-            if cache_key in self.cache:
-                print(f"[RAG] Contexto encontrado no cache.")
-                return self.cache[cache_key]
-
-            # Extrair palavras-chave da mensagem
-            keywords = self._extract_keywords(user_message)
-            print(f"[RAG] Palavras-chave extraídas: {keywords}")
+            if self.snapshot_manager:
+                self.snapshot_manager.ensure_loaded()
 
-            # Buscar conversas similares
-            similar_conversations = self._find_similar_conversations(keywords, risk_level, limit * 2)
-            print(f"[RAG] Conversas similares encontradas: {len(similar_conversations)}")
+            # Verificar cache primeiro (chave estável entre processos, para o snapshot)
+            cache_key = f"{content_hash(user_message)}_{risk_level}_{limit}"
+            cached = self.cache.get(cache_key, MISSING)
+            if cached is not MISSING:
+                print(f"[RAG] Contexto encontrado no cache.")
+                return cached
 
-            # Ranquear por relevância
-            ranked_conversations = self._rank_conversations(similar_conversations, user_message)
-            print(f"[RAG] Conversas ranqueadas: {len(ranked_conversations)}")
+            ranked_conversations = self._get_ranked_conversations(user_message, risk_level, limit, session_id)
 
             # Construir contexto a partir das melhores
             context = self._build_context(ranked_conversations[:limit])
@@ -102,6 +121,7 @@ class SimpleRAG:
 
             # Cachear resultado
             self.cache[cache_key] = context
+            self.cache_writes += 1
 
             return context
 
@@ -110,6 +130,81 @@ class SimpleRAG:
             print(f"[RAG] Erro: {e}")
             return None
     
+    def _get_ranked_conversations(self, user_message: str, risk_level: str, limit: int,
+                                  session_id: Optional[int] = None) -> List[Dict]:
+        """Busca e ranqueia conversas conforme o modo de recuperação configurado"""
+        if self.snapshot_manager:
+            self.snapshot_manager.ensure_loaded()
+        cache_key = f"{content_hash(user_message)}_{risk_level}_{limit}_{session_id}"
+        cached = self.ranked_cache.get(cache_key, MISSING)
+        if cached is not MISSING:
+            return cached
+
+        # Extrair palavras-chave da mensagem
+        keywords = self._extract_keywords(user_message)
+        print(f"[RAG] Palavras-chave extraídas: {keywords}")
+
+        state = self.session_states.get(session_id) if session_id is not None else None
+        if state is not None:
+            new_keywords = state.new_keywords(keywords)
+            self.session_states.record(
+                turns=1,
+                full_lookups=1 if state.turns == 0 else 0,
+                keywords_queried=len(new_keywords),
+                keywords_reused=len(keywords) - len(new_keywords)
+            )
+            state.turns += 1
+
+        ranked_conversations = None
+        if self.retrieval_mode == 'hybrid':
+            try:
+                ranked_conversations = self.hybrid_retriever.retrieve(user_message, keywords, limit, state=state)
+            except Exception as e:
+                logger.error(f"Erro na busca híbrida, usando busca por palavras-chave: {e}")
+                ranked_conversations = None
+
+        if ranked_conversations is None:
+            if state is not None:
+                similar_conversations = self._find_incremental_conversations(state, keywords, risk_level, limit)
+            else:
+                # Buscar conversas similares
+                similar_conversations = self._find_similar_conversations(keywords, risk_level, limit * 2)
+            print(f"[RAG] Conversas similares encontradas: {len(similar_conversations)}")
+
+            # Ranquear por relevância
+            ranked_conversations = self._rank_conversations(similar_conversations, user_message)
+
+        print(f"[RAG] Conversas ranqueadas: {len(ranked_conversations)}")
+        self.ranked_cache[cache_key] = ranked_conversations
+        return ranked_conversations
+
+    def _find_incremental_conversations(self, state, keywords: List[str], risk_level: str,
+                                        limit: int) -> List[Dict]:
+        """Consulta só as palavras-chave novas da sessão e une aos candidatos anteriores"""
+        new_keywords = state.new_keywords(keywords)
+        if new_keywords or not state.candidates:
+            found = self._find_similar_conversations(new_keywords or keywords, risk_level, limit * 2)
+            state.keywords.update(new_keywords or keywords)
+        else:
+            found = []
+            self.session_states.record(lexical_skipped=1)
+            print("[RAG] Sem palavras-chave novas: reaproveitando candidatos da sessão")
+        state.candidates = merge_candidates(
+            state.candidates, found,
+            key_fn=lambda c: (c.get('user_message'), c.get('ai_response')),
+            limit=max(limit * 10, 30), newest_first=True
+        )
+        # Cópias: o ranqueamento grava relevance_score nos dicionários
+        return [dict(c) for c in state.candidates]
+
+    @property
+    def hybrid_retriever(self):
+        """HybridRetriever criado na primeira busca em modo híbrido"""
+        if self._hybrid_retriever is None:
+            from .hybrid_retrieval import HybridRetriever
+            self._hybrid_retriever = HybridRetriever()
+        return self._hybrid_retriever
+
     def _extract_keywords(self, text: str) -> List[str]:
         """Extrai palavras-chave relevantes para saúde mental"""
         mental_health_keywords = [
@@ -133,78 +228,99 @@ class SimpleRAG:
         
         return list(set(found_keywords))[:10]  # Remover duplicatas e limitar
     
-    def _find_similar_conversations(self, keywords: List[str], risk_level: str, 
+    @staticmethod
+    def query_signature(keywords: List[str], limit: int) -> str:
+        """Assinatura da consulta: palavras-chave ordenadas + limite"""
+        return f"{'|'.join(sorted(set(keywords)))}:{limit}"
+
+    def _find_similar_conversations(self, keywords: List[str], risk_level: str,
+                                  limit: int = 10) -> List[Dict]:
+        """Busca conversas similares reaproveitando o resultado de consultas com a mesma assinatura"""
+        signature = self.query_signature(keywords, limit)
+        cached = self.signature_cache.get(signature)
+        if cached is not None:
+            print(f"[RAG] Assinatura em cache: {signature}")
+            return [dict(row) for row in cached]
+        rows = self._query_similar_conversations(keywords, risk_level, limit)
+        if rows:
+            self.signature_cache[signature] = rows
+            self.cache_writes += 1
+        return [dict(row) for row in rows]
+
+    def _query_similar_conversations(self, keywords: List[str], risk_level: str, 
                                   limit: int = 10) -> List[Dict]:
         print(f"[RAG] Buscando conversas no banco. Keywords: {keywords} | Limite: {limit}")
         """Busca conversas similares no banco de dados priorizando só palavras-chave e avaliação, sem filtrar por risco"""
         try:
             from app import db
-            # Log: total de conversas no banco
-            total_sessions = db.session.execute(
-                text("SELECT COUNT(*) FROM chat_sessions")
-            ).scalar()
-            print(f"[RAG] Total de sessões de chat no banco: {total_sessions}")
-            if keywords:
-                keyword_pattern = '|'.join([k for k in keywords if len(k) > 3])
-            else:
-                keyword_pattern = ''
-            # 1. Busca com keywords (qualquer risco, sem filtro de avaliação)
-            query = text("""
-                SELECT DISTINCT
-                    cm_user.content as user_message,
-                    cm_ai.content as ai_response,
-                    cs.user_rating,
-                    cs.initial_risk_level,
-                    cm_ai.created_at
-                FROM chat_sessions cs
-                JOIN chat_messages cm_user ON cs.id = cm_user.session_id 
-                    AND cm_user.message_type = 'USER'
-                JOIN chat_messages cm_ai ON cs.id = cm_ai.session_id 
-                    AND cm_ai.message_type = 'AI'
-                    AND cm_ai.id > cm_user.id
-                WHERE 
-                    (:keyword_pattern = '' OR cm_user.content ~* :keyword_pattern)
-                    AND cm_user.created_at >= NOW() - INTERVAL '6 months'
-                    AND LENGTH(cm_user.content) > 10
-                    AND LENGTH(cm_ai.content) > 20
-                ORDER BY cs.user_rating DESC, cm_ai.created_at DESC
-                LIMIT :limit
-            """)
-            result = db.session.execute(query, {
-                'keyword_pattern': keyword_pattern,
-                'limit': limit
-            })
-            rows = [dict(row._mapping) for row in result]
-            print(f"[RAG] Linhas retornadas do banco (keywords): {len(rows)}")
-            if rows:
+            # Consultas limitadas ao prazo do turno, se houver
+            with statement_timeout(db.session):
+                # Log: total de conversas no banco
+                total_sessions = db.session.execute(
+                    text("SELECT COUNT(*) FROM chat_sessions")
+                ).scalar()
+                print(f"[RAG] Total de sessões de chat no banco: {total_sessions}")
+                if keywords:
+                    keyword_pattern = '|'.join([k for k in keywords if len(k) > 3])
+                else:
+                    keyword_pattern = ''
+                # 1. Busca com keywords (qualquer risco, sem filtro de avaliação)
+                query = text("""
+                    SELECT DISTINCT
+                        cm_user.content as user_message,
+                        cm_ai.content as ai_response,
+                        cs.user_rating,
+                        cs.initial_risk_level,
+                        cm_ai.created_at
+                    FROM chat_sessions cs
+                    JOIN chat_messages cm_user ON cs.id = cm_user.session_id 
+                        AND cm_user.message_type = 'USER'
+                    JOIN chat_messages cm_ai ON cs.id = cm_ai.session_id 
+                        AND cm_ai.message_type = 'AI'
+                        AND cm_ai.id > cm_user.id
+                    WHERE 
+                        (:keyword_pattern = '' OR cm_user.content ~* :keyword_pattern)
+                        AND cm_user.created_at >= NOW() - INTERVAL '6 months'
+                        AND LENGTH(cm_user.content) > 10
+                        AND LENGTH(cm_ai.content) > 20
+                    ORDER BY cs.user_rating DESC, cm_ai.created_at DESC
+                    LIMIT :limit
+                """)
+                result = db.session.execute(query, {
+                    'keyword_pattern': keyword_pattern,
+                    'limit': limit
+                })
+                rows = [dict(row._mapping) for row in result]
+                print(f"[RAG] Linhas retornadas do banco (keywords): {len(rows)}")
+                if rows:
+                    return rows
+                # 2. Última tentativa: pega os últimos registros (sem filtro de avaliação)
+                query = text("""
+                    SELECT DISTINCT
+                        cm_user.content as user_message,
+                        cm_ai.content as ai_response,
+                        cs.user_rating,
+                        cs.initial_risk_level,
+                        cm_ai.created_at
+                    FROM chat_sessions cs
+                    JOIN chat_messages cm_user ON cs.id = cm_user.session_id 
+                        AND cm_user.message_type = 'USER'
+                    JOIN chat_messages cm_ai ON cs.id = cm_ai.session_id 
+                        AND cm_ai.message_type = 'AI'
+                        AND cm_ai.id > cm_user.id
+                    WHERE 
+                        cm_user.created_at >= NOW() - INTERVAL '6 months'
+                        AND LENGTH(cm_user.content) > 10
+                        AND LENGTH(cm_ai.content) > 20
+                    ORDER BY cs.user_rating DESC, cm_ai.created_at DESC
+                    LIMIT :limit
+                """)
+                result = db.session.execute(query, {
+                    'limit': limit
+                })
+                rows = [dict(row._mapping) for row in result]
+                print(f"[RAG] Linhas retornadas do banco (só últimos): {len(rows)}")
                 return rows
-            # 2. Última tentativa: pega os últimos registros (sem filtro de avaliação)
-            query = text("""
-                SELECT DISTINCT
-                    cm_user.content as user_message,
-                    cm_ai.content as ai_response,
-                    cs.user_rating,
-                    cs.initial_risk_level,
-                    cm_ai.created_at
-                FROM chat_sessions cs
-                JOIN chat_messages cm_user ON cs.id = cm_user.session_id 
-                    AND cm_user.message_type = 'USER'
-                JOIN chat_messages cm_ai ON cs.id = cm_ai.session_id 
-                    AND cm_ai.message_type = 'AI'
-                    AND cm_ai.id > cm_user.id
-                WHERE 
-                    cm_user.created_at >= NOW() - INTERVAL '6 months'
-                    AND LENGTH(cm_user.content) > 10
-                    AND LENGTH(cm_ai.content) > 20
-                ORDER BY cs.user_rating DESC, cm_ai.created_at DESC
-                LIMIT :limit
-            """)
-            result = db.session.execute(query, {
-                'limit': limit
-            })
-            rows = [dict(row._mapping) for row in result]
-            print(f"[RAG] Linhas retornadas do banco (só últimos): {len(rows)}")
-            return rows
         except Exception as e:
             logger.error(f"Erro na busca de conversas: {e}")
             print(f"[RAG] Erro: {e}")
@@ -257,7 +373,8 @@ class SimpleRAG:
     # === MÉTODOS AVANÇADOS (CONSOLIDADOS DO ADVANCED RAG SERVICE) ===
     
     def get_enhanced_context(self, user_message: str, risk_level: str, 
-                           context_type: str = 'all', limit: int = 3) -> Dict:
+                           context_type: str = 'all', limit: int = 3,
+                           session_id: Optional[int] = None) -> Dict:
         """
         Método avançado para buscar contexto enriquecido
         
@@ -266,6 +383,7 @@ class SimpleRAG:
             risk_level: Nível de risco
             context_type: Tipo de contexto ('all', 'conversations', 'training')
             limit: Limite de resultados
+            session_id: Sessão de chat (busca incremental entre turnos)
             
         Returns:
             Dict com contexto_prompt, training_data e conversation_examples
@@ -279,10 +397,10 @@ class SimpleRAG:
             
             # Buscar conversas se solicitado
             if context_type in ['all', 'conversations']:
-                conversation_context = self.get_relevant_context(user_message, risk_level, limit)
+                conversation_context = self.get_relevant_context(user_message, risk_level, limit, session_id)
                 if conversation_context:
                     result['context_prompt'] += conversation_context
-                    result['conversation_examples'] = self._get_conversation_examples(user_message, risk_level, limit)
+                    result['conversation_examples'] = self._get_conversation_examples(user_message, risk_level, limit, session_id)
             
             # Buscar dados de treinamento se solicitado
             if context_type in ['all', 'training']:
@@ -309,9 +427,10 @@ class SimpleRAG:
             Lista de dicionários com conteúdo encontrado
         """
         try:
-            cache_key = f"training_search_{hash(query)}_{limit}"
-            if cache_key in self.training_cache:
-                return self.training_cache[cache_key]
+            cache_key = f"training_search_{content_hash(query)}_{limit}"
+            cached = self.training_cache.get(cache_key, MISSING)
+            if cached is not MISSING:
+                return cached
             
             # Implementação simples de busca em training data
             # Aqui você pode expandir para buscar em diferentes fontes
@@ -356,7 +475,11 @@ class SimpleRAG:
                 'high_quality_conversations': int(result.high_quality_sessions) if result else 0,
                 'cache_size': len(self.cache),
                 'training_cache_size': len(self.training_cache),
-                'system_type': 'consolidated_rag'
+                'signature_cache_size': len(self.signature_cache),
+                'system_type': 'consolidated_rag',
+                'retrieval_mode': self.retrieval_mode,
+                'hybrid': self._hybrid_retriever.get_statistics() if self._hybrid_retriever else None,
+                'session_retrieval': self.session_states.get_statistics()
             }
             
         except Exception as e:
@@ -371,15 +494,12 @@ class SimpleRAG:
                 'error': str(e)
             }
     
-    def _get_conversation_examples(self, user_message: str, risk_level: str, limit: int) -> List[Dict]:
+    def _get_conversation_examples(self, user_message: str, risk_level: str, limit: int,
+                                   session_id: Optional[int] = None) -> List[Dict]:
         print(f"[RAG] Obtendo exemplos de conversas para: '{user_message}' | Risco: {risk_level} | Limite: {limit}")
         """Obtém exemplos de conversas formatados para o sistema de prompts"""
         try:
-            conversations = self._find_similar_conversations(
-                self._extract_keywords(user_message), 
-                risk_level, 
-                limit
-            )
+            conversations = self._get_ranked_conversations(user_message, risk_level, limit, session_id)
             
             examples = []
             for conv in conversations[:limit]:
@@ -460,12 +580,12 @@ class SimpleRAG:
                 LIMIT :limit
             """)
             
-            result = db.session.execute(query, {
-                'keyword_pattern': keyword_pattern,
-                'limit': limit
-            })
-            
-            return [dict(row._mapping) for row in result]
+            with statement_timeout(db.session):
+                result = db.session.execute(query, {
+                    'keyword_pattern': keyword_pattern,
+                    'limit': limit
+                })
+                return [dict(row._mapping) for row in result]
             
         except Exception as e:
             logger.error(f"Erro na busca de training-like content: {e}")
@@ -543,15 +663,19 @@ class AIService:
         self.log_training_usage = False  # Desabilitado - logger não disponível
         
         # === CACHE E OTIMIZAÇÕES ===
-        self.response_cache = {}
         self.cache_max_size = 100
+        self.response_cache = SafeCache(LRUCache(maxsize=self.cache_max_size))
+        self._async_openai_client = None  # openai.AsyncOpenAI (caminho assíncrono do chat)
         
         logger.info("AIService v2.0 inicializado com sucesso")
     
-    def analyze_sentiment(self, text: str) -> Dict:
+    def analyze_sentiment(self, text: str, risk_level: Optional[str] = None,
+                          deadline: Optional[Deadline] = None) -> Dict:
         """
         Analisa o sentimento do texto usando OpenAI com fallback inteligente
         Garante que o prompt peça resposta JSON, faz print do retorno e trata erro de parsing.
+        risk_level define a prioridade da chamada no controle de admissão do LLM.
+        deadline (prazo do turno) limita a espera na fila e o timeout da chamada.
         """
         if not self.openai_client:
             return self._basic_sentiment_analysis(text)
@@ -563,15 +687,17 @@ class AIService:
                 '{"score": float, "confidence": float, "emotion": "...", "intensity": "..."}'
                 "\nNão adicione explicações, apenas o JSON."
             )
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": system_content},
-                    {"role": "user", "content": f"Mensagem: {text}"}
-                ],
-                max_tokens=150,
-                temperature=0.3
-            )
+            with llm_admission.slot(risk_level, self._queue_timeout(risk_level, deadline)):
+                response = self.openai_client.chat.completions.create(
+                    model=self.openai_model,
+                    messages=[
+                        {"role": "system", "content": system_content},
+                        {"role": "user", "content": f"Mensagem: {text}"}
+                    ],
+                    max_tokens=150,
+                    temperature=0.3,
+                    **self._request_timeout(deadline)
+                )
             content = response.choices[0].message.content.strip()
             print(f"[OpenAI Sentiment Raw]: {content}")
             try:
@@ -590,6 +716,18 @@ class AIService:
             logger.error(f"Erro na análise OpenAI: {e}")
             return self._basic_sentiment_analysis(text)
     
+    @staticmethod
+    def _queue_timeout(risk_level: Optional[str], deadline: Optional[Deadline]) -> Optional[float]:
+        """Espera máxima na fila do LLM: a do nível de risco, limitada pelo prazo do turno"""
+        if deadline is None:
+            return None
+        return deadline.timeout(cap=llm_admission.queue_timeout(risk_level))
+
+    @staticmethod
+    def _request_timeout(deadline: Optional[Deadline]) -> Dict:
+        """kwargs de timeout do provedor derivados do tempo restante do turno"""
+        return {'timeout': deadline.timeout()} if deadline is not None else {}
+
     def _basic_sentiment_analysis(self, text: str) -> Dict:
         """Análise básica de sentimento como fallback"""
         text_lower = text.lower()
@@ -737,12 +875,13 @@ class AIService:
         
         return 'low'
     
-    def analyze_with_risk_assessment(self, text: str) -> Dict:
+    def analyze_with_risk_assessment(self, text: str, deadline: Optional[Deadline] = None) -> Dict:
         """
         Análise completa: sentimento + risco em uma chamada otimizada
         
         Args:
             text: Texto para análise completa
+            deadline: Prazo do turno do chat (limita a chamada ao LLM)
             
         Returns:
             Dict com análise completa
@@ -750,11 +889,12 @@ class AIService:
         try:
             # Verificar cache primeiro
             cache_key = f"analysis_{hash(text)}"
-            if cache_key in self.response_cache:
-                return self.response_cache[cache_key]
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            # Análise de sentimento
-            sentiment_result = self.analyze_sentiment(text)
+            # Análise de sentimento (prioridade na fila do LLM pela triagem por padrões)
+            sentiment_result = self.analyze_sentiment(text, risk_level=self.assess_risk_level(text), deadline=deadline)
             
             # Avaliação de risco
             risk_level = self.assess_risk_level(text, sentiment_result)
@@ -828,6 +968,55 @@ class AIService:
         except Exception as e:
             logger.error(f"Erro na análise do diário: {e}")
             return None
+
+    def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict],
+                               max_chars: int = 1200) -> Optional[str]:
+        """
+        Condensa mensagens antigas do chat, junto com o resumo anterior, num resumo curto
+
+        Usado pelo job de resumo contínuo (conversation_summary.py); sem LLM,
+        faz um resumo extrativo com as mensagens do usuário.
+        """
+        if not messages:
+            return previous_summary
+        transcript = "\n".join(
+            f"{'Usuário' if msg.get('message_type') == 'user' else 'Assistente'}: {msg.get('content', '')[:500]}"
+            for msg in messages
+        )
+        if self.openai_client:
+            try:
+                system_content = (
+                    "Você resume conversas de apoio emocional para dar contexto ao assistente. "
+                    "Atualize o resumo anterior com as novas mensagens em até 6 frases, em português, "
+                    "preservando: situação relatada, sentimentos, sinais de risco, encaminhamentos e o que ajudou. "
+                    "Não invente informações."
+                )
+                with llm_admission.slot('low'):
+                    response = self.openai_client.chat.completions.create(
+                        model=self.openai_model,
+                        messages=[
+                            {"role": "system", "content": system_content},
+                            {"role": "user", "content": f"Resumo anterior: {previous_summary or '(nenhum)'}\n\nNovas mensagens:\n{transcript}"}
+                        ],
+                        max_tokens=250,
+                        temperature=0.3
+                    )
+                summary = response.choices[0].message.content.strip()
+                if summary:
+                    return summary[:max_chars]
+            except Exception as e:
+                logger.error(f"Erro ao resumir conversa com OpenAI: {e}")
+        return self._basic_conversation_summary(previous_summary, messages, max_chars)
+
+    def _basic_conversation_summary(self, previous_summary: Optional[str], messages: List[Dict],
+                                    max_chars: int = 1200) -> str:
+        """Resumo extrativo: primeira frase das mensagens do usuário, as mais recentes preservadas"""
+        points = [
+            msg.get('content', '').split('.')[0].strip()[:150]
+            for msg in messages if msg.get('message_type') == 'user' and msg.get('content')
+        ]
+        summary = '; '.join(filter(None, [previous_summary] + points))
+        return summary[-max_chars:]
     
     def _detect_emotions_in_text(self, text: str) -> List[str]:
         """Detecta emoções específicas no texto usando palavras-chave"""
@@ -904,7 +1093,7 @@ class AIService:
     def generate_response(self, user_message: str, risk_level: str = 'low', 
                          user_context: Optional[Dict] = None, 
                          conversation_history: Optional[List] = None, 
-                         fallback: bool = True) -> Dict:
+                         fallback: bool = True, deadline: Optional[Deadline] = None) -> Dict:
         """
         Gera resposta empática usando LLMs com RAG avançado e Prompt Engineering
         
@@ -914,110 +1103,29 @@ class AIService:
             user_context: Contexto do usuário (nome, etc.)
             conversation_history: Histórico da conversa
             fallback: Se deve usar fallback em caso de erro
+            deadline: Prazo do turno; limita RAG, fila e chamadas aos provedores
             
         Returns:
             Dict com resposta gerada e metadados
         """
-        errors = []
-
-        # RESPOSTAS INTELIGENTES SOBRE O HISTÓRICO E CONTEXTO COMPLETO
-        user_message_lower = user_message.lower()
-
-
         errors = []
         
         try:
             print(f"AI_RESPONSE_START: Processando mensagem de risco {risk_level}")
-            
-            # 1. Buscar contexto avançado usando RAG
-            rag_context = None
-            rag_result = None
-            if self.rag_enabled:
-                try:
-                    rag_result = self.rag.get_enhanced_context(
-                        user_message, 
-                        risk_level, 
-                        context_type='all', 
-                        limit=3
-                    )
-                    rag_context = rag_result.get('context_prompt', '')
-                    print(f"RAG_CONTEXT: {len(rag_result.get('training_data', []))} dados + {len(rag_result.get('conversation_examples', []))} conversas")
-                except Exception as e:
-                    logger.warning(f"Erro no RAG: {e}")
-
-            # 2. Preparar contexto para prompt engineering (incluindo triagem)
-            prompt_context = PromptContext(
-                user_message=user_message,
-                risk_level=RiskLevel(risk_level),
-                user_name=user_context.get('name') if user_context else None,
-                session_history=conversation_history,
-                training_context=rag_context,
-                conversation_examples=rag_result.get('conversation_examples', []) if rag_result else None
-            )
-
-
-            # 2.1. Adicionar contexto de triagem se disponível
-            if user_context:
-                triage_triggered = user_context.get('triage_triggered', False)
-                triage_status = user_context.get('triage_status')
-                triage_declined_reason = user_context.get('triage_declined_reason')
-
-                # Construir contexto de triagem para a IA
-                triage_context_info = ""
-                triage_print_reason = None
-                if triage_triggered:
-                    if triage_status == 'declined':
-                        triage_context_info = f"\n\nCONTEXTO IMPORTANTE: O usuário recusou participar da triagem psicológica. "
-                        if triage_declined_reason:
-                            triage_context_info += f"Motivo: {triage_declined_reason}. "
-                            triage_print_reason = f"Usuário recusou triagem. Motivo: {triage_declined_reason}"
-                        else:
-                            triage_print_reason = "Usuário recusou triagem. Sem motivo informado."
-                        triage_context_info += "Seja respeitoso com essa decisão, mas mantenha-se atento aos sinais de risco. Não insista na triagem, mas continue oferecendo apoio emocional."
-                    elif triage_status == 'initiated':
-                        triage_context_info = f"\n\nCONTEXTO: O usuário iniciou o processo de triagem psicológica. Apoie e encoraje a continuidade deste processo."
-                        triage_print_reason = "Usuário iniciou a triagem psicológica."
-                    elif triage_status == 'completed':
-                        triage_context_info = f"\n\nCONTEXTO: O usuário completou a triagem psicológica. Use essas informações para personalizar melhor suas respostas."
-                        triage_print_reason = "Usuário completou a triagem psicológica."
-
-                # Adicionar ao contexto de treinamento
-                if triage_context_info and prompt_context.training_context:
-                    prompt_context.training_context += triage_context_info
-                elif triage_context_info:
-                    prompt_context.training_context = triage_context_info
-
-                # Print informativo
-                if triage_print_reason:
-                    print(f"[TRIAGEM ATIVADA] Status: {triage_status} | Motivo: {triage_print_reason}")
+            prompt_context = self._build_prompt_context(user_message, risk_level, user_context,
+                                                        conversation_history, deadline)
 
             # 3. Tentar OpenAI consolidado
             if self.openai_client:
                 try:
                     prompt_data = self.prompt_manager.build_contextual_prompt(prompt_context, provider='openai')
-                    response = self.openai_client.chat.completions.create(
-                        model=self.openai_model,
-                        messages=prompt_data['messages'],
-                        max_tokens=prompt_data.get('max_tokens', 120),
-                        temperature=prompt_data.get('temperature', 0.7),
-                        presence_penalty=prompt_data.get('presence_penalty', 0),
-                        frequency_penalty=prompt_data.get('frequency_penalty', 0)
-                    )
-                    ai_response = response.choices[0].message.content.strip()
-                    result = {
-                        'message': ai_response,
-                        'risk_level': prompt_context.risk_level.value,
-                        'confidence': 0.95,
-                        'source': 'openai',
-                        'model': self.openai_model,
-                        'rag_used': bool(prompt_context.training_context),
-                        'prompt_engineering': 'consolidated',
-                        'timestamp': datetime.now(UTC).isoformat(),
-                        'tokens_used': response.usage.total_tokens if hasattr(response, 'usage') else None
-                    }
-                    if prompt_context.training_context:
-                        result['rag_context_length'] = len(prompt_context.training_context)
-                    return result
+                    # Admissão por prioridade: crise passa na frente sob carga
+                    with llm_admission.slot(risk_level, self._queue_timeout(risk_level, deadline)):
+                        response = self.openai_client.chat.completions.create(
+                            **self._openai_params(prompt_data),
+                            **self._request_timeout(deadline)
+                        )
+                    return self._openai_result(response, prompt_context)
                 except Exception as e:
                     errors.append(f"OpenAI: {str(e)}")
                     logger.warning(f"Falha no OpenAI: {e}")
@@ -1025,22 +1133,7 @@ class AIService:
             # 4. Tentar Gemini consolidado (fallback)
             if self.gemini_client and fallback:
                 try:
-                    prompt_data = self.prompt_manager.build_contextual_prompt(prompt_context, provider='gemini')
-                    model = self.gemini_client.GenerativeModel(self.gemini_model)
-                    response = model.generate_content(prompt_data['prompt'])
-                    ai_response = response.text.strip()
-                    result = {
-                        'message': ai_response,
-                        'risk_level': prompt_context.risk_level.value,
-                        'confidence': 0.90,
-                        'source': 'gemini',
-                        'rag_used': bool(prompt_context.training_context),
-                        'prompt_engineering': 'consolidated',
-                        'timestamp': datetime.now(UTC).isoformat()
-                    }
-                    if prompt_context.training_context:
-                        result['rag_context_length'] = len(prompt_context.training_context)
-                    return result
+                    return self._generate_with_gemini(prompt_context, risk_level, deadline)
                 except Exception as e:
                     errors.append(f"Gemini: {str(e)}")
                     logger.warning(f"Falha no Gemini: {e}")
@@ -1051,8 +1144,189 @@ class AIService:
         except Exception as e:
             logger.error(f"Erro crítico na geração de resposta: {e}")
             return self._generate_response_fallback(user_message, risk_level, user_context, errors + [str(e)])
-    
-    
+
+    async def agenerate_response(self, user_message: str, risk_level: str = 'low',
+                                 user_context: Optional[Dict] = None,
+                                 conversation_history: Optional[List] = None,
+                                 fallback: bool = True, deadline: Optional[Deadline] = None) -> Dict:
+        """
+        Versão assíncrona de generate_response (mesmo resultado)
+
+        RAG e prompt rodam numa thread (acesso ao banco é síncrono) e a chamada
+        ao OpenAI usa o cliente assíncrono: enquanto o provedor responde, o
+        event loop atende outros turnos.
+        """
+        errors = []
+
+        try:
+            print(f"AI_RESPONSE_START (async): Processando mensagem de risco {risk_level}")
+            # to_thread copia o contexto (app context do Flask e prazo do turno)
+            prompt_context = await asyncio.to_thread(
+                self._build_prompt_context, user_message, risk_level, user_context,
+                conversation_history, deadline
+            )
+
+            if self.openai_client and self.async_openai_client:
+                try:
+                    prompt_data = self.prompt_manager.build_contextual_prompt(prompt_context, provider='openai')
+                    async with llm_admission.aslot(risk_level, self._queue_timeout(risk_level, deadline)):
+                        response = await self.async_openai_client.chat.completions.create(
+                            **self._openai_params(prompt_data),
+                            **self._request_timeout(deadline)
+                        )
+                    return self._openai_result(response, prompt_context)
+                except Exception as e:
+                    errors.append(f"OpenAI: {str(e)}")
+                    logger.warning(f"Falha no OpenAI (async): {e}")
+
+            if self.gemini_client and fallback:
+                try:
+                    return await asyncio.to_thread(self._generate_with_gemini, prompt_context, risk_level, deadline)
+                except Exception as e:
+                    errors.append(f"Gemini: {str(e)}")
+                    logger.warning(f"Falha no Gemini: {e}")
+
+            return self._generate_response_fallback(user_message, risk_level, user_context, errors)
+
+        except Exception as e:
+            logger.error(f"Erro crítico na geração de resposta: {e}")
+            return self._generate_response_fallback(user_message, risk_level, user_context, errors + [str(e)])
+
+    @property
+    def async_openai_client(self):
+        """Cliente AsyncOpenAI, criado no primeiro uso do caminho assíncrono"""
+        if self._async_openai_client is None and OPENAI_AVAILABLE and os.getenv("OPENAI_API_KEY"):
+            self._async_openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._async_openai_client
+
+    def _build_prompt_context(self, user_message: str, risk_level: str, user_context: Optional[Dict],
+                              conversation_history: Optional[List],
+                              deadline: Optional[Deadline] = None) -> PromptContext:
+        """RAG + PromptContext com o contexto de triagem (etapas 1 e 2 da geração)"""
+        # 1. Buscar contexto avançado usando RAG
+        rag_context = None
+        rag_result = None
+        # Degradação: sem RAG sob carga (nunca para high/critical); prazo curto também pula o RAG
+        if self.rag_enabled and degradation.use_rag(risk_level) and (deadline is None or deadline.allows('rag')):
+            rag_started = time.perf_counter()
+            try:
+                with activate_deadline(deadline):
+                    rag_result = self.rag.get_enhanced_context(
+                        user_message, 
+                        risk_level, 
+                        context_type='all', 
+                        limit=3,
+                        session_id=user_context.get('session_id') if user_context else None
+                    )
+                rag_context = rag_result.get('context_prompt', '')
+                degradation.record('rag', time.perf_counter() - rag_started)
+                print(f"RAG_CONTEXT: {len(rag_result.get('training_data', []))} dados + {len(rag_result.get('conversation_examples', []))} conversas")
+            except Exception as e:
+                degradation.record('rag', time.perf_counter() - rag_started, ok=False)
+                logger.warning(f"Erro no RAG: {e}")
+
+        # 2. Preparar contexto para prompt engineering (incluindo triagem)
+        prompt_context = PromptContext(
+            user_message=user_message,
+            risk_level=RiskLevel(risk_level),
+            user_name=user_context.get('name') if user_context else None,
+            session_history=conversation_history,
+            conversation_summary=user_context.get('conversation_summary') if user_context else None,
+            training_context=rag_context,
+            conversation_examples=rag_result.get('conversation_examples', []) if rag_result else None
+        )
+
+
+        # 2.1. Adicionar contexto de triagem se disponível
+        if user_context:
+            triage_triggered = user_context.get('triage_triggered', False)
+            triage_status = user_context.get('triage_status')
+            triage_declined_reason = user_context.get('triage_declined_reason')
+
+            # Construir contexto de triagem para a IA
+            triage_context_info = ""
+            triage_print_reason = None
+            if triage_triggered:
+                if triage_status == 'declined':
+                    triage_context_info = f"\n\nCONTEXTO IMPORTANTE: O usuário recusou participar da triagem psicológica. "
+                    if triage_declined_reason:
+                        triage_context_info += f"Motivo: {triage_declined_reason}. "
+                        triage_print_reason = f"Usuário recusou triagem. Motivo: {triage_declined_reason}"
+                    else:
+                        triage_print_reason = "Usuário recusou triagem. Sem motivo informado."
+                    triage_context_info += "Seja respeitoso com essa decisão, mas mantenha-se atento aos sinais de risco. Não insista na triagem, mas continue oferecendo apoio emocional."
+                elif triage_status == 'initiated':
+                    triage_context_info = f"\n\nCONTEXTO: O usuário iniciou o processo de triagem psicológica. Apoie e encoraje a continuidade deste processo."
+                    triage_print_reason = "Usuário iniciou a triagem psicológica."
+                elif triage_status == 'completed':
+                    triage_context_info = f"\n\nCONTEXTO: O usuário completou a triagem psicológica. Use essas informações para personalizar melhor suas respostas."
+                    triage_print_reason = "Usuário completou a triagem psicológica."
+
+            # Adicionar ao contexto de treinamento
+            if triage_context_info and prompt_context.training_context:
+                prompt_context.training_context += triage_context_info
+            elif triage_context_info:
+                prompt_context.training_context = triage_context_info
+
+            # Print informativo
+            if triage_print_reason:
+                print(f"[TRIAGEM ATIVADA] Status: {triage_status} | Motivo: {triage_print_reason}")
+
+        return prompt_context
+
+    def _openai_params(self, prompt_data: Dict) -> Dict:
+        """Parâmetros de chat.completions.create (mesmos no cliente síncrono e no assíncrono)"""
+        return {
+            'model': self.openai_model,
+            'messages': prompt_data['messages'],
+            'max_tokens': prompt_data.get('max_tokens', 120),
+            'temperature': prompt_data.get('temperature', 0.7),
+            'presence_penalty': prompt_data.get('presence_penalty', 0),
+            'frequency_penalty': prompt_data.get('frequency_penalty', 0)
+        }
+
+    def _openai_result(self, response, prompt_context: PromptContext) -> Dict:
+        ai_response = response.choices[0].message.content.strip()
+        result = {
+            'message': ai_response,
+            'risk_level': prompt_context.risk_level.value,
+            'confidence': 0.95,
+            'source': 'openai',
+            'model': self.openai_model,
+            'rag_used': bool(prompt_context.training_context),
+            'prompt_engineering': 'consolidated',
+            'timestamp': datetime.now(UTC).isoformat(),
+            'tokens_used': response.usage.total_tokens if hasattr(response, 'usage') else None
+        }
+        if prompt_context.training_context:
+            result['rag_context_length'] = len(prompt_context.training_context)
+        return result
+
+    def _generate_with_gemini(self, prompt_context: PromptContext, risk_level: str,
+                              deadline: Optional[Deadline] = None) -> Dict:
+        """Geração pelo Gemini (fallback); levanta exceção em caso de falha"""
+        prompt_data = self.prompt_manager.build_contextual_prompt(prompt_context, provider='gemini')
+        model = self.gemini_client.GenerativeModel(self.gemini_model)
+        with llm_admission.slot(risk_level, self._queue_timeout(risk_level, deadline)):
+            if deadline is not None:
+                response = model.generate_content(prompt_data['prompt'],
+                                                  request_options={'timeout': deadline.timeout()})
+            else:
+                response = model.generate_content(prompt_data['prompt'])
+        ai_response = response.text.strip()
+        result = {
+            'message': ai_response,
+            'risk_level': prompt_context.risk_level.value,
+            'confidence': 0.90,
+            'source': 'gemini',
+            'rag_used': bool(prompt_context.training_context),
+            'prompt_engineering': 'consolidated',
+            'timestamp': datetime.now(UTC).isoformat()
+        }
+        if prompt_context.training_context:
+            result['rag_context_length'] = len(prompt_context.training_context)
+        return result
+
     def _generate_response_fallback(self, user_message: str, risk_level: str, 
                                    user_context: Optional[Dict], 
                                    errors: Optional[List] = None) -> Dict:
@@ -1072,14 +1346,8 @@ class AIService:
         }
     
     def _cache_result(self, key: str, result: Dict) -> None:
-        """Gerencia cache com limpeza automática"""
+        """Gerencia cache com limpeza automática (LRU limitado a cache_max_size)"""
         try:
-            if len(self.response_cache) >= self.cache_max_size:
-                # Remove primeiros 20% dos itens
-                items_to_remove = list(self.response_cache.keys())[:self.cache_max_size // 5]
-                for item_key in items_to_remove:
-                    del self.response_cache[item_key]
-            
             self.response_cache[key] = result
         except Exception as e:
             logger.warning(f"Erro ao cachear: {e}")
@@ -1142,6 +1410,15 @@ class AIService:
                 }
             }
             
+            # Fila de admissão do LLM (profundidade e espera por nível de risco)
+            stats['llm_admission'] = llm_admission.get_statistics()
+            # Geração especulativa (taxa de acerto e tokens desperdiçados)
+            stats['speculation'] = speculative_generator.get_statistics()
+            # Nível de degradação e p95/erros por etapa
+            stats['degradation'] = degradation.get_statistics()
+            # Requisições barradas pelo limite por usuário/IP
+            stats['rate_limit'] = rate_limiter.get_statistics()
+            
             # Estatísticas do RAG avançado
             if self.advanced_rag:
                 try:
@@ -0,0 +1,103 @@
+"""
+Handlers dos jobs em background (registrados na fila durável)
+
+Cada handler recebe o payload (dict) e roda dentro do app context; exceções
+fazem o job ser reenfileirado com backoff.
+"""
+
+import json
+import logging
+
+from app import db
+from app.services.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+
+@job_queue.task('diary_analysis', priority=10, max_attempts=3)
+def analyze_diary_entry(payload):
+    """Análise da entrada do diário com IA (sentimento, temas, indicadores de risco)"""
+    from app import ai_service
+    from app.models import DiaryEntry
+
+    entry = db.session.get(DiaryEntry, payload['entry_id'])
+    if entry is None or not ai_service or not hasattr(ai_service, 'analyze_diary_entry'):
+        return {'skipped': True}
+    analysis = ai_service.analyze_diary_entry(entry.content)
+    if not analysis:
+        return {'skipped': True}
+    entry.sentiment_score = analysis.get('sentiment_score', entry.sentiment_score)
+    entry.emotions = json.dumps(analysis.get('themes', []))
+    entry.risk_factors = json.dumps(analysis.get('risk_indicators', []))
+    entry.save()
+    return {'entry_id': entry.id, 'sentiment_score': entry.sentiment_score}
+
+
+@job_queue.task('training_ingestion', priority=5, max_attempts=3, timeout=1800)
+def ingest_training_data(payload):
+    """Extração, chunking e embeddings de um dado de treinamento"""
+    from app.services.document_ingestion import document_ingestion
+
+    result = document_ingestion.ingest(payload['training_data_id'])
+    if not result.get('success', True) and result.get('error') != 'Treinamento não encontrado':
+        raise RuntimeError(result.get('error'))
+    return result
+
+
+@job_queue.task('conversation_embeddings', priority=0, max_attempts=5)
+def embed_conversation(payload):
+    """Embeddings das mensagens do usuário de uma sessão encerrada (busca vetorial do RAG)"""
+    from app.models import ChatMessage, ChatMessageType
+    from app.services.training_service import AITrainingService, message_risk_level
+
+    messages = ChatMessage.query.filter_by(
+        session_id=payload['session_id'],
+        message_type=ChatMessageType.USER
+    ).order_by(ChatMessage.created_at).all()
+    # Mensagens já indexadas não são gravadas de novo (job reexecutado)
+    indexed = {
+        row[0] for row in db.session.execute(db.text("""
+            SELECT chat_message_id FROM conversation_embeddings
+            WHERE chat_message_id = ANY(:ids)
+        """), {'ids': [m.id for m in messages]})
+    } if messages else set()
+    pending = [
+        {
+            'message_id': msg.id,
+            'text': msg.content,
+            'risk_level': message_risk_level(msg),
+            'sentiment_score': msg.sentiment_score
+        }
+        for msg in messages if msg.id not in indexed and msg.content
+    ]
+    stored = AITrainingService().store_conversation_embeddings(pending, raise_errors=True)
+    if stored < len(pending):
+        # Embedding falhou para parte das mensagens: o job volta para a fila com backoff
+        raise RuntimeError(f"{len(pending) - stored} de {len(pending)} embeddings não gerados")
+    return {'session_id': payload['session_id'], 'stored': stored}
+
+
+@job_queue.task('finetuning_dataset', priority=-5, max_attempts=2, timeout=1800)
+def build_finetuning_dataset(payload):
+    """Gera e grava em arquivo um dataset de fine-tuning"""
+    from app import ai_service
+
+    result = ai_service.create_finetuning_dataset(
+        payload.get('dataset_type', 'hybrid'),
+        payload.get('format_type', 'openai_chat'),
+        payload.get('max_samples', 1000)
+    )
+    if result.get('error'):
+        raise RuntimeError(result['error'])
+    saved = ai_service.save_finetuning_dataset(result, payload.get('file_path'))
+    if not saved.get('success'):
+        raise RuntimeError(saved.get('error'))
+    return dict(saved, metadata=result.get('metadata'))
+
+
+@job_queue.task('conversation_summary', priority=3, max_attempts=3)
+def summarize_conversation(payload):
+    """Resumo contínuo: condensa as mensagens antigas de uma sessão longa"""
+    from app.services.conversation_summary import conversation_summarizer
+
+    return conversation_summarizer.summarize(payload['session_id'])
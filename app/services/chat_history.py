@@ -0,0 +1,98 @@
+"""
+Paginação por cursor (keyset) e GET condicional do histórico de mensagens
+
+Os clientes fazem polling do histórico o tempo todo; por isso:
+- As páginas usam cursor sobre (created_at, id) em vez de OFFSET: o custo
+  não cresce com a posição e o índice idx_chat_messages_session_created
+  (session_id, created_at) delimita a faixa. O id desempata mensagens da
+  mesma transação (created_at = NOW() da transação)
+- O ETag vem de message_count e last_activity da sessão (mais os parâmetros
+  da página): um polling sem novidade é respondido com 304 após uma única
+  consulta de colunas, sem carregar objetos do ORM
+"""
+
+import base64
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import request
+from sqlalchemy import select, tuple_
+
+from app import db
+from app.models import ChatMessage, ChatSession
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Levanta ValueError para cursor inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+
+def session_version(session_id: int, user_id: int):
+    """(id, message_count, last_activity, started_at) da sessão do usuário, sem hidratar o ORM"""
+    return db.session.execute(
+        select(ChatSession.id, ChatSession.message_count, ChatSession.last_activity, ChatSession.started_at)
+        .where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+    ).first()
+
+
+def history_etag(version, *page_params) -> str:
+    """Muda quando chega mensagem nova (message_count/last_activity) ou muda a página pedida"""
+    last_activity = version.last_activity.timestamp() if version.last_activity else 0
+    page = zlib.crc32(repr(page_params).encode())
+    return f"chat-{version.id}-{version.message_count or 0}-{last_activity:.6f}-{page:08x}"
+
+
+def not_modified(etag: str) -> bool:
+    return request.if_none_match.contains(etag)
+
+
+def fetch_page(session_id: int, before: Optional[str] = None, after: Optional[str] = None,
+               limit: int = 50) -> Dict:
+    """
+    Página de mensagens em ordem cronológica
+
+    - sem cursor: as `limit` mais recentes
+    - before: as anteriores ao cursor (rolar para cima)
+    - after: as posteriores ao cursor (polling de mensagens novas)
+
+    Returns:
+        {'messages', 'has_more' (há mais na direção pedida), 'before_cursor', 'after_cursor'}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    key = tuple_(ChatMessage.created_at, ChatMessage.id)
+    query = ChatMessage.query.filter(ChatMessage.session_id == session_id)
+    if after:
+        created_at, message_id = decode_cursor(after)
+        # created_at >= ... delimita a faixa no índice; a tupla desempata pelo id
+        query = query.filter(ChatMessage.created_at >= created_at, key > (created_at, message_id))
+        rows = query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            query = query.filter(ChatMessage.created_at <= created_at, key < (created_at, message_id))
+        rows = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+
+    messages: List[Dict] = [msg.to_dict() for msg in rows]
+    return {
+        'messages': messages,
+        'has_more': has_more,
+        'before_cursor': encode_cursor(rows[0].created_at, rows[0].id) if rows else before,
+        'after_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if rows else after
+    }
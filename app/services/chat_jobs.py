@@ -0,0 +1,135 @@
+"""
+Jobs de geração de resposta do chat (modo assíncrono de /api/chat/send)
+
+A requisição grava a mensagem do usuário e o veredito de risco, enfileira a
+geração e responde 202; a resposta da IA é obtida por polling ou SSE.
+- Pool de threads limitado (CHAT_JOB_WORKERS): o worker web fica livre
+  enquanto o LLM responde
+- Turnos da mesma sessão são gerados em ordem (trava por sessão)
+- Jobs concluídos expiram após CHAT_JOB_TTL segundos
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_ERROR = 'error'
+
+
+class ChatJob:
+    """Estado de uma geração enfileirada"""
+
+    def __init__(self, user_id: int, session_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.session_id = session_id
+        self.status = JOB_QUEUED
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        data = {'job_id': self.id, 'status': self.status, 'session_id': self.session_id}
+        if self.status == JOB_DONE:
+            data.update(self.result or {})
+        elif self.status == JOB_ERROR:
+            data.update(success=False, error=self.error)
+        return data
+
+
+class ChatJobRegistry:
+    """Executa e acompanha as gerações em background"""
+
+    def __init__(self, workers: Optional[int] = None, ttl: Optional[int] = None, maxsize: int = 10000):
+        self.workers = workers or int(os.getenv('CHAT_JOB_WORKERS', '8'))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chat-job')
+        self._jobs = TTLCache(maxsize=maxsize, ttl=ttl or int(os.getenv('CHAT_JOB_TTL', '600')))
+        self._session_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'total_seconds': 0.0}
+
+    def _session_lock(self, session_id: int) -> threading.Lock:
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.Lock()
+            return lock
+
+    def submit(self, app, user_id: int, session_id: int, fn: Callable[[], Dict]) -> ChatJob:
+        """
+        Enfileira fn (executada dentro do app context) e devolve o job
+
+        Args:
+            app: Aplicação Flask real (current_app._get_current_object())
+            fn: Função sem argumentos que devolve o payload da resposta
+        """
+        job = ChatJob(user_id, session_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            self.stats['submitted'] += 1
+        self._executor.submit(self._run, app, job, fn)
+        return job
+
+    def _run(self, app, job: ChatJob, fn: Callable[[], Dict]) -> None:
+        started = time.perf_counter()
+        try:
+            with self._session_lock(job.session_id):
+                job.status = JOB_RUNNING
+                with app.app_context():
+                    try:
+                        job.result = fn()
+                        job.status = JOB_DONE
+                    except Exception as e:
+                        from app import db
+                        db.session.rollback()
+                        job.error = f'Erro interno: {e}'
+                        job.status = JOB_ERROR
+                        logger.error(f"Erro no job de chat {job.id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stats['completed' if job.status == JOB_DONE else 'failed'] += 1
+                self.stats['total_seconds'] += elapsed
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[ChatJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            finished = self.stats['completed'] + self.stats['failed']
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            return {
+                'workers': self.workers,
+                'submitted': self.stats['submitted'],
+                'completed': self.stats['completed'],
+                'failed': self.stats['failed'],
+                'pending': pending,
+                'avg_seconds': round(self.stats['total_seconds'] / finished, 3) if finished else 0
+            }
+
+
+# Instância global
+chat_jobs = ChatJobRegistry()
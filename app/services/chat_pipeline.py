@@ -0,0 +1,509 @@
+"""
+Pipeline de um turno do chat com IA
+
+Dividido em duas etapas para permitir geração assíncrona:
+- prepare_turn: análise de risco, gravação da mensagem do usuário, triagem e
+  histórico (rápido, executado na requisição)
+- generate_reply: RAG + LLM, correções da resposta e gravação da mensagem da
+  IA (lento, pode rodar num job em background); agenerate_reply é a versão
+  assíncrona, usada por /api/chat/send-async
+- send_crisis_reply: caminho rápido do risco crítico; grava a resposta de crise
+  pré-computada e a resposta personalizada vira continuação em background
+
+Nos níveis low/moderate a resposta é gerada especulativamente (speculation.py)
+enquanto a análise de sentimento do LLM roda; generate_reply reaproveita o
+rascunho se o risco não escalou.
+
+Todas as etapas respeitam o prazo do turno (deadline.py): RAG e sentimento do
+LLM são pulados quando falta tempo e as chamadas externas usam o tempo restante.
+"""
+
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app import db
+from app.models import ChatMessage, ChatMessageType, ChatSession
+from app.services.conversation_summary import conversation_summarizer
+from app.services.deadline import Deadline
+from app.services.degradation import degradation
+from app.services.history_cache import recent_turns_cache
+from app.services.speculation import Draft, speculative_generator
+
+RISK_ORDER = {'low': 1, 'moderate': 2, 'high': 3, 'critical': 4}
+
+EXPLICIT_HELP_KEYWORDS = [
+    'quero ajuda', 'preciso de ajuda', 'quero atendimento', 'quero falar com um profissional',
+    'preciso de atendimento', 'preciso falar com alguém', 'quero suporte', 'me encaminhe', 'me encaminhar', 'encaminhamento', 'quero conversar com profissional'
+]
+
+
+@dataclass
+class ChatTurn:
+    """Dados de um turno já persistido, suficientes para gerar a resposta"""
+    session_id: int
+    user_id: int
+    user_name: str
+    message_content: str
+    detected_risk_level: str = 'low'
+    user_asked_for_help: bool = False
+    triage_log_id: Optional[int] = None
+    user_message_id: Optional[int] = None
+    user_message_timestamp: Optional[str] = None
+    history: List[Dict] = field(default_factory=list)
+    sentiment_deferred: bool = False  # Análise do LLM adiada (caminho rápido de crise)
+    draft: Optional[Draft] = field(default=None, repr=False)  # Resposta especulativa aproveitável
+    deadline: Optional[Deadline] = field(default=None, repr=False)  # Prazo do turno (criado na requisição)
+
+    @property
+    def requires_triage(self) -> bool:
+        return self.detected_risk_level in ['high', 'critical'] or self.user_asked_for_help
+
+    def risk_assessment(self) -> Dict:
+        return {
+            'risk_level': self.detected_risk_level,
+            'requires_triage': self.requires_triage,
+            'triage_id': self.triage_log_id
+        }
+
+
+def _ai():
+    """ai_service global (criado em create_app)"""
+    try:
+        from app import ai_service, AI_AVAILABLE
+    except ImportError:
+        return None, False
+    return ai_service, AI_AVAILABLE
+
+
+def prepare_turn(chat_session: ChatSession, user, message_content: str,
+                 deadline: Optional[Deadline] = None) -> ChatTurn:
+    """
+    Analisa o risco, grava a mensagem do usuário e aciona a triagem se preciso
+
+    A mensagem do usuário é commitada antes da análise de sentimento pelo LLM:
+    nenhuma transação fica aberta (segurando uma conexão do pool) durante a
+    chamada ao provedor. Sentimento, risco e triagem ficam só em flush; o
+    commit fica a cargo de quem chama. O deadline segue no ChatTurn para
+    generate_reply.
+    """
+    ai_service, ai_available = _ai()
+    llm_available = bool(ai_available and ai_service and ai_service.openai_client)
+    user_name = getattr(user, 'first_name', '') or 'amigo'
+    user_asked_for_help = any(kw in message_content.lower() for kw in EXPLICIT_HELP_KEYWORDS)
+    # Nível de risco por padrões (local, instantâneo)
+    pattern_risk_level = ai_service.assess_risk_level(message_content) if ai_service else 'low'
+
+    # Adicionar mensagem do usuário
+    user_message = chat_session.add_message(
+        content=message_content,
+        message_type=ChatMessageType.USER,
+        sender_id=user.id
+    )
+    db.session.flush()
+
+    # --- Correção 2: Memória contextual ---
+    # Últimos K turnos (+ a mensagem atual) do cache write-through; o restante está no resumo da sessão
+    history_list = recent_turns_cache.get_history(chat_session, current_message=user_message)
+    db.session.commit()
+
+    # Análise de sentimento e risco
+    sentiment_analysis = None
+    detected_risk_level = 'low'
+    sentiment_deferred = False
+    draft = None
+    # Risco crítico por padrões (local) não espera o LLM: a análise é adiada
+    if pattern_risk_level == 'critical':
+        detected_risk_level = 'critical'
+        sentiment_deferred = llm_available
+    elif llm_available and (not degradation.use_llm_sentiment(pattern_risk_level)
+                            or (deadline is not None and not deadline.allows('sentiment'))):
+        # Degradação ou prazo curto: sentimento por regras, sem chamada ao LLM
+        detected_risk_level = pattern_risk_level
+        sentiment_analysis = dict(
+            ai_service._basic_sentiment_analysis(message_content),
+            risk_level=pattern_risk_level,
+            requires_attention=pattern_risk_level in ['high', 'critical'],
+            timestamp=datetime.now(timezone.utc).isoformat()
+        )
+    elif llm_available:
+        # Especulação: a resposta já começa com o risco por padrões
+        if (not user_asked_for_help and speculative_generator.should_speculate(pattern_risk_level)
+                and degradation.use_llm_reply(pattern_risk_level)):
+            draft = speculative_generator.start(
+                current_app._get_current_object(),
+                ai_service.generate_response,
+                pattern_risk_level,
+                user_message=message_content,
+                user_context=build_user_context(user_name, chat_session),
+                conversation_history=history_list,
+                deadline=deadline
+            )
+        sentiment_started = time.perf_counter()
+        try:
+            sentiment_analysis = ai_service.analyze_with_risk_assessment(message_content, deadline=deadline)
+            detected_risk_level = sentiment_analysis.get('risk_level', 'low')
+            degradation.record('sentiment', time.perf_counter() - sentiment_started,
+                               ok='error' not in sentiment_analysis)
+        except Exception as e:
+            degradation.record('sentiment', time.perf_counter() - sentiment_started, ok=False)
+            detected_risk_level = pattern_risk_level
+        draft = speculative_generator.resolve(draft, detected_risk_level)
+
+    if sentiment_analysis:
+        user_message.sentiment_score = sentiment_analysis.get('score')
+        user_message.risk_indicators = json.dumps({
+            'risk_level': detected_risk_level,
+            'emotion': sentiment_analysis.get('emotion'),
+            'intensity': sentiment_analysis.get('intensity'),
+            'confidence': sentiment_analysis.get('confidence'),
+            'requires_attention': sentiment_analysis.get('requires_attention', False),
+            'timestamp': sentiment_analysis.get('timestamp')
+        }, ensure_ascii=False)
+
+    # Atualizar o maior nível de risco detectado
+    if chat_session.initial_risk_level is None:
+        chat_session.initial_risk_level = detected_risk_level
+    else:
+        current_level = RISK_ORDER.get(chat_session.initial_risk_level, 1)
+        new_level = RISK_ORDER.get(detected_risk_level, 1)
+        if new_level > current_level:
+            chat_session.initial_risk_level = detected_risk_level
+
+    # --- Correção 1: Encaminhamento por risco OU pedido explícito de ajuda ---
+    triage_log = None
+    triage_reason = None
+    triage_level = None
+    # Só aciona triagem automática para risco alto/crítico, ou por pedido explícito
+    if detected_risk_level in ['high', 'critical']:
+        triage_level = detected_risk_level
+        triage_reason = f'Triagem iniciada por risco {detected_risk_level}.'
+    elif user_asked_for_help:
+        triage_level = 'low'
+        triage_reason = 'Triagem iniciada por pedido explícito do usuário.'
+    # Só cria log e marca contexto se ainda não foi chamado nesta sessão
+    if triage_level and not getattr(chat_session, 'triage_triggered', False):
+        from app.models.triage import TriageLog, RiskLevel
+        risk_enum_map = {
+            'low': RiskLevel.LOW,
+            'moderate': RiskLevel.MODERATE,
+            'high': RiskLevel.HIGH,
+            'critical': RiskLevel.CRITICAL
+        }
+        try:
+            triage_log = TriageLog(
+                user_id=user.id,
+                chat_session_id=chat_session.id,
+                risk_level=risk_enum_map.get(triage_level, RiskLevel.MODERATE),
+                confidence_score=sentiment_analysis.get('confidence', 0.5) if sentiment_analysis else 0.5,
+                trigger_content=message_content[:500],
+                context_type='chat_message',
+                suicidal_ideation='suicidal_ideation' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
+                self_harm_risk='self_harm' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
+                severe_depression='severe_depression' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
+                anxiety_disorder='anxiety_panic' in str(sentiment_analysis.get('triggers', [])) if sentiment_analysis else False,
+                triage_status='initiated'
+            )
+            triage_log.emotional_state = sentiment_analysis.get('emotion', 'Análise em andamento') if sentiment_analysis else 'A avaliar'
+            triage_log.notes = triage_reason
+            db.session.add(triage_log)
+            db.session.flush()
+            chat_session.triage_triggered = True
+            chat_session.triage_status = 'initiated'
+            db.session.flush()
+        except Exception as e:
+            triage_log = None
+    # Se triagem já foi chamada (ou recusada/completada), nunca perder o contexto
+    # (Não sobrescrever triage_triggered/triage_status se já existe)
+
+    return ChatTurn(
+        session_id=chat_session.id,
+        user_id=user.id,
+        user_name=user_name,
+        message_content=message_content,
+        detected_risk_level=detected_risk_level,
+        user_asked_for_help=user_asked_for_help,
+        triage_log_id=triage_log.id if triage_log else None,
+        user_message_id=user_message.id,
+        user_message_timestamp=user_message.created_at.isoformat(),
+        history=history_list,
+        sentiment_deferred=sentiment_deferred,
+        draft=draft,
+        deadline=deadline
+    )
+
+
+def build_user_context(user_name: str, chat_session: ChatSession) -> Dict:
+    """Contexto do usuário e da triagem passado ao generate_response"""
+    return {
+        'name': user_name,
+        'session_id': chat_session.id,
+        'triage_triggered': getattr(chat_session, 'triage_triggered', False),
+        'triage_status': getattr(chat_session, 'triage_status', None),
+        'triage_declined_reason': getattr(chat_session, 'triage_declined_reason', None),
+        'conversation_summary': getattr(chat_session, 'summary', None)
+    }
+
+
+def send_crisis_reply(turn: ChatTurn, locale: Optional[str] = None) -> Dict:
+    """
+    Grava e devolve a resposta de crise pré-computada (sem RAG nem LLM)
+
+    Faz commit. O payload tem o mesmo formato de generate_reply.
+    """
+    from app.services.crisis_reply import build_crisis_reply
+
+    chat_session = db.session.get(ChatSession, turn.session_id)
+    content = build_crisis_reply(turn.user_name, locale)
+    ai_message = chat_session.add_message(content=content, message_type=ChatMessageType.AI)
+    db.session.commit()
+    print(f"[CRISE] Resposta imediata enviada na sessão {turn.session_id}")
+    return _response_payload(turn, content, ai_message.created_at.isoformat())
+
+
+def _response_payload(turn: ChatTurn, content: Optional[str], timestamp: Optional[str]) -> Dict:
+    return {
+        'success': True,
+        'user_message': {
+            'content': turn.message_content,
+            'timestamp': turn.user_message_timestamp,
+            'sender_type': 'user'
+        },
+        'ai_response': {
+            'content': content,
+            'timestamp': timestamp,
+            'sender_type': 'ai'
+        } if content else None,
+        'risk_assessment': turn.risk_assessment()
+    }
+
+
+def _store_deferred_sentiment(turn: ChatTurn, ai_service) -> None:
+    """Análise do LLM adiada no caminho rápido: só enriquece a mensagem (risco não baixa)"""
+    try:
+        analysis = ai_service.analyze_with_risk_assessment(turn.message_content, deadline=turn.deadline)
+    except Exception as e:
+        print(f"[CRISE] Análise adiada falhou: {e}")
+        return
+    user_message = db.session.get(ChatMessage, turn.user_message_id)
+    if user_message is None:
+        return
+    user_message.sentiment_score = analysis.get('score')
+    user_message.risk_indicators = json.dumps({
+        'risk_level': turn.detected_risk_level,
+        'emotion': analysis.get('emotion'),
+        'intensity': analysis.get('intensity'),
+        'confidence': analysis.get('confidence'),
+        'requires_attention': True,
+        'timestamp': analysis.get('timestamp')
+    }, ensure_ascii=False)
+
+
+# --- Correção 3: Respostas menos genéricas ---
+def _get_varied_response(risk, user_name, last_user_message):
+    # Respostas curtas e acolhedoras
+    if risk == 'critical':
+        return f"{user_name}, sua segurança é prioridade. Recomendo buscar ajuda profissional agora. CVV: 188. Estou aqui para te ouvir."  # 2 frases
+    elif risk == 'high':
+        return f"{user_name}, entendo que está difícil. Falar com um profissional pode ajudar. Quer conversar mais sobre isso?"  # 2 frases
+    elif risk == 'moderate':
+        return f"{user_name}, vejo que está passando por desafios. O que tem te ajudado? Conte comigo."  # 2 frases
+    else:
+        return f"Olá {user_name}! Como você está?"  # 1 frase
+
+
+# --- Correção 4: Reconhecimento de perguntas objetivas ---
+def _check_objective_question(message, history):
+    # Exemplo: quantas vezes fui encaminhado para triagem
+    # Contar encaminhamentos reais para triagem (mensagens da IA que sugerem/provocam encaminhamento)
+    triage_keywords = ['encaminhei para triagem', 'triagem emergencial', 'profissional de saúde', 'CVV', 'SAMU', 'encaminhar para ajuda profissional']
+    triage_count = 0
+    for msg in history:
+        if msg['message_type'] == 'ai' and any(kw in msg['content'].lower() for kw in triage_keywords):
+            triage_count += 1
+    if 'quantas vezes' in message and 'triagem' in message:
+        return f"Você foi encaminhado para triagem {triage_count} vez(es) nesta conversa."  # resposta direta
+    if 'número' in message and 'triagem' in message:
+        return f"Foram {triage_count} encaminhamentos para triagem."  # resposta direta
+    # Recuperar último relato de problema do usuário
+    if 'qual era o meu problema' in message:
+        problem_keywords = ['terminei', 'perdi', 'morreu', 'sofrendo', 'ansioso', 'depressão', 'solidão', 'relacionamento', 'triste', 'doente', 'demitido', 'separação', 'divórcio', 'abandono', 'medo', 'pânico', 'quero me machucar', 'quero morrer']
+        for msg in reversed(history):
+            if msg['message_type'] == 'user' and any(kw in msg['content'].lower() for kw in problem_keywords):
+                return f"Seu relato mais recente foi: '{msg['content']}'. Se quiser falar mais sobre isso, estou aqui para te ouvir."
+        # fallback: última mensagem longa do usuário
+        for msg in reversed(history):
+            if msg['message_type'] == 'user' and len(msg['content']) > 10:
+                return f"Você relatou: '{msg['content']}.'"
+    return None
+
+
+# --- Correção 5: Empatia situacional ---
+def _get_situational_empathy(message):
+    if 'relacionamento' in message or 'sozinho' in message:
+        return "Sinto muito pelo término. Sentir-se sozinho é normal, mas você não está só. Conte comigo."  # 2 frases
+    return None
+
+
+# --- Correção 6: Explorar sentimento do usuário ---
+def _explore_feelings(message):
+    return "Como você está se sentindo?"  # 1 frase
+
+
+def _llm_reply_enabled(turn: ChatTurn, ai_service, ai_available: bool) -> bool:
+    # IA disponível (sob degradação, risco low fica sem resposta do LLM)
+    return bool(ai_available and ai_service and ai_service.openai_client
+                and degradation.use_llm_reply(turn.detected_risk_level))
+
+
+def _reply_request(turn: ChatTurn, chat_session: ChatSession) -> Dict:
+    """Argumentos de generate_response/agenerate_response para o turno"""
+    return {
+        'user_message': turn.message_content,
+        'risk_level': turn.detected_risk_level,
+        'user_context': build_user_context(turn.user_name, chat_session),
+        'conversation_history': turn.history,
+        'deadline': turn.deadline
+    }
+
+
+def _reply_text(ai_response: Dict, reply_started: float, follow_up: bool = False) -> Optional[str]:
+    is_fallback = ai_response.get('source') == 'fallback'
+    degradation.record('llm_reply', time.perf_counter() - reply_started, ok=not is_fallback)
+    if follow_up and is_fallback:
+        # Provedores falharam: a continuação da crise não repete o texto fixo
+        return None
+    return ai_response['message']
+
+
+def _load_reply_session(turn: ChatTurn, ai_service, llm_enabled: bool) -> Tuple[ChatSession, Optional[Dict]]:
+    """
+    Sessão e argumentos da chamada ao LLM; commita antes de devolver
+
+    O turno chega com sentimento/triagem em flush: o commit fecha a transação
+    para que a conexão volte ao pool enquanto o provedor responde.
+    """
+    chat_session = db.session.get(ChatSession, turn.session_id)
+    if turn.sentiment_deferred and ai_service:
+        _store_deferred_sentiment(turn, ai_service)
+    request = _reply_request(turn, chat_session) if llm_enabled and turn.draft is None else None
+    db.session.commit()
+    return chat_session, request
+
+
+def generate_reply(turn: ChatTurn, follow_up: bool = False) -> Dict:
+    """
+    Gera, grava e devolve a resposta da IA para um turno preparado
+
+    Requer app context (pode rodar fora da requisição). Faz commit.
+    Com follow_up=True (continuação da resposta de crise) só a resposta do LLM
+    é gravada; sem ela, ai_response vem None em vez de repetir o fallback.
+    """
+    ai_service, ai_available = _ai()
+    llm_enabled = _llm_reply_enabled(turn, ai_service, ai_available)
+    chat_session, request = _load_reply_session(turn, ai_service, llm_enabled)
+
+    response_text = None
+    if llm_enabled:
+        reply_started = time.perf_counter()
+        try:
+            if turn.draft is not None:
+                # Rascunho especulativo aprovado: risco não escalou
+                ai_response = turn.draft.future.result(
+                    timeout=turn.deadline.remaining() if turn.deadline else None)
+            else:
+                ai_response = ai_service.generate_response(**request)
+            response_text = _reply_text(ai_response, reply_started, follow_up)
+        except Exception:
+            degradation.record('llm_reply', time.perf_counter() - reply_started, ok=False)
+
+    return _finalize_reply(turn, chat_session, ai_service, response_text, follow_up)
+
+
+async def agenerate_reply(turn: ChatTurn, follow_up: bool = False) -> Dict:
+    """
+    Versão assíncrona de generate_reply (mesmo payload)
+
+    A espera pelo LLM não ocupa thread: usa o cliente assíncrono do OpenAI (ou
+    aguarda o rascunho especulativo). Banco e correções rodam em threads, com o
+    mesmo app context.
+    """
+    ai_service, ai_available = _ai()
+    llm_enabled = _llm_reply_enabled(turn, ai_service, ai_available)
+    chat_session, request = await asyncio.to_thread(_load_reply_session, turn, ai_service, llm_enabled)
+
+    response_text = None
+    if llm_enabled:
+        reply_started = time.perf_counter()
+        try:
+            if turn.draft is not None:
+                ai_response = await asyncio.wait_for(
+                    asyncio.wrap_future(turn.draft.future),
+                    timeout=turn.deadline.remaining() if turn.deadline else None)
+            else:
+                ai_response = await ai_service.agenerate_response(**request)
+            response_text = _reply_text(ai_response, reply_started, follow_up)
+        except Exception:
+            degradation.record('llm_reply', time.perf_counter() - reply_started, ok=False)
+
+    return await asyncio.to_thread(_finalize_reply, turn, chat_session, ai_service, response_text, follow_up)
+
+
+def _finalize_reply(turn: ChatTurn, chat_session: ChatSession, ai_service,
+                    response_text: Optional[str], follow_up: bool) -> Dict:
+    """Correções da resposta, gravação da mensagem da IA e commit"""
+    message_content = turn.message_content
+    objective_answer = _check_objective_question(message_content.lower(), turn.history)
+    situational_empathy = _get_situational_empathy(message_content.lower())
+    varied_response = _get_varied_response(turn.detected_risk_level, turn.user_name, message_content)
+    feelings_question = _explore_feelings(message_content)
+
+    # Montar resposta final considerando correções
+    if follow_up:
+        # A resposta de crise já cobriu encaminhamento e contatos
+        if not response_text:
+            db.session.commit()
+            return _response_payload(turn, None, None)
+        frases = response_text.split('.')
+        final_response = '.'.join(frases[:3]).strip()
+        if not final_response.endswith('.'):
+            final_response += '.'
+    # Se o usuário pediu ajuda explicitamente, resposta de encaminhamento
+    elif turn.user_asked_for_help:
+        final_response = (
+            f"Zé, percebo que você pediu ajuda. Sua segurança é prioridade. Vou te encaminhar para triagem profissional agora.\n"
+            "🆘 Precisa de Ajuda Imediata? Estes contatos estão disponíveis 24 horas:\n"
+            "CVV - Centro de Valorização da Vida\n📞 188\nApoio emocional gratuito 24h\nSAMU\n📞 192\nEmergências médicas\n🏥 Quero Falar com um Profissional\n💬 Continuar Conversando Aqui"
+        )
+    elif ai_service and degradation.use_static_reply(turn.detected_risk_level) and not objective_answer:
+        # Degradação máxima: respostas estáticas para risco low
+        final_response = random.choice(ai_service.prompt_manager.get_fallback_responses(
+            turn.detected_risk_level, {'name': turn.user_name}
+        ))
+    else:
+        final_response = objective_answer or situational_empathy or varied_response
+        # Adicionar pergunta sobre sentimentos se não for pergunta objetiva
+        if not objective_answer:
+            final_response += ' ' + feelings_question
+        # Se IA respondeu, priorizar resposta da IA (mas limitar tamanho)
+        if response_text:
+            frases = response_text.split('.')
+            final_response = '.'.join(frases[:3]).strip()
+            if not final_response.endswith('.'):
+                final_response += '.'
+
+    ai_message = chat_session.add_message(
+        content=final_response,
+        message_type=ChatMessageType.AI
+    )
+    db.session.commit()
+    # Conversa longa: condensa as mensagens antigas no resumo em background
+    conversation_summarizer.schedule_if_needed(chat_session)
+
+    return _response_payload(turn, final_response, ai_message.created_at.isoformat())
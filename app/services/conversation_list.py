@@ -0,0 +1,143 @@
+"""
+Lista de conversas do usuário (barra lateral do chat)
+
+- Uma única consulta de colunas em chat_sessions, com a prévia desnormalizada
+  (last_message_preview/last_message_at, mantidas por ChatSession.add_message)
+  e paginação por cursor sobre (created_at, id) no índice
+  idx_chat_sessions_user_created
+- Cache curto por usuário; qualquer escrita commitada numa ChatSession do
+  usuário (mensagem nova, sessão criada, encerrada ou excluída) invalida as
+  páginas dele. Em outros workers a página vive no máximo o TTL
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import ChatSession
+from app.services.chat_history import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 50
+
+_CHANGED_USERS = 'conversation_list_changed_users'
+
+
+class ConversationListCache:
+    """Páginas da lista de conversas por usuário, invalidadas no commit"""
+
+    def __init__(self, ttl: Optional[int] = None, max_users: int = 5000, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('CONVERSATION_LIST_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self._pages = TTLCache(maxsize=max_users, ttl=ttl or int(os.getenv('CONVERSATION_LIST_CACHE_TTL', '30')))
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id: int, page_key) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            page = self._pages.get(user_id, {}).get(page_key)
+            self.stats['hits' if page is not None else 'misses'] += 1
+            return page
+
+    def set(self, user_id: int, page_key, page: Dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            pages = self._pages.get(user_id)
+            if pages is None:
+                pages = self._pages[user_id] = {}
+            pages[page_key] = page
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            if self._pages.pop(user_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, enabled=self.enabled, users=len(self._pages))
+
+
+# Instância global
+conversation_list_cache = ConversationListCache()
+
+
+def _conversation(row) -> Dict:
+    created_at = row.created_at
+    return {
+        'id': row.id,
+        'title': row.title or f"Conversa {created_at.strftime('%d/%m/%Y')}",
+        'created_at': created_at.isoformat(),
+        'status': row.status.value if hasattr(row.status, 'value') else row.status,
+        'message_count': row.message_count,
+        'last_message': row.last_message_preview or 'Conversa iniciada',
+        'last_message_at': row.last_message_at.isoformat() if row.last_message_at else None
+    }
+
+
+def list_conversations(user_id: int, before: Optional[str] = None, limit: int = MAX_PAGE_SIZE) -> Dict:
+    """
+    Conversas mais recentes primeiro
+
+    Returns:
+        {'conversations', 'has_more', 'next_cursor'} (next_cursor vai em `before` na próxima página)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    page_key = (before, limit)
+    cached = conversation_list_cache.get(user_id, page_key)
+    if cached is not None:
+        return cached
+
+    query = select(
+        ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.status,
+        ChatSession.message_count, ChatSession.last_message_preview, ChatSession.last_message_at
+    ).where(ChatSession.user_id == user_id)
+    if before:
+        created_at, session_id = decode_cursor(before)
+        query = query.where(ChatSession.created_at <= created_at,
+                            tuple_(ChatSession.created_at, ChatSession.id) < (created_at, session_id))
+    rows = db.session.execute(
+        query.order_by(ChatSession.created_at.desc(), ChatSession.id.desc()).limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    page = {
+        'conversations': [_conversation(row) for row in rows],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    }
+    conversation_list_cache.set(user_id, page_key, page)
+    return page
+
+
+# === INVALIDAÇÃO (eventos da sessão do SQLAlchemy) ===
+
+@event.listens_for(Session, 'after_flush')
+def _capture_changed_sessions(db_session, flush_context):
+    changed = {obj.user_id for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted)
+               if isinstance(obj, ChatSession)}
+    if changed:
+        db_session.info.setdefault(_CHANGED_USERS, set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(db_session):
+    for user_id in db_session.info.pop(_CHANGED_USERS, ()):
+        conversation_list_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changed(db_session, previous_transaction):
+    if not previous_transaction.nested:
+        db_session.info.pop(_CHANGED_USERS, None)
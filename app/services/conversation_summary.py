@@ -0,0 +1,158 @@
+"""
+Resumo contínuo (rolling summary) das conversas do chat com IA
+
+O prompt recebe o resumo gravado em ChatSession.summary mais os últimos
+CHAT_HISTORY_TURNS turnos, então o tamanho do prompt não cresce com a conversa.
+Assim que as mensagens ainda não resumidas passam da janela recente mais
+CHAT_SUMMARY_MARGIN_TURNS turnos, um job em background condensa as que saíram
+da janela no resumo, junto com o resumo anterior. A margem é pequena para
+que nenhuma mensagem fique muito tempo fora do prompt e fora do resumo.
+
+Um único job por sessão: summary_requested_at marca o pedido pendente e só
+é limpo quando o resumo é gravado. Se o job pular (resumo vazio) ou morrer,
+um novo pedido só sai depois de CHAT_SUMMARY_RETRY_SECONDS.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, text, update
+
+from app import db
+from app.models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_dict(msg: ChatMessage) -> Dict:
+    """Formato do histórico usado no pipeline e no prompt"""
+    return {
+        'content': msg.content,
+        'message_type': msg.message_type.value if hasattr(msg.message_type, 'value') else msg.message_type,
+        'created_at': msg.created_at.isoformat()
+    }
+
+
+class ConversationSummarizer:
+    """Janela recente do histórico e condensação das mensagens antigas"""
+
+    def __init__(self, history_turns: Optional[int] = None, margin_turns: Optional[int] = None,
+                 retry_seconds: Optional[int] = None):
+        self.history_turns = history_turns or int(os.getenv('CHAT_HISTORY_TURNS', '4'))
+        self.margin_turns = margin_turns or int(os.getenv('CHAT_SUMMARY_MARGIN_TURNS', '1'))
+        self.retry_seconds = retry_seconds or int(os.getenv('CHAT_SUMMARY_RETRY_SECONDS', '600'))
+        self.stats = {'scheduled': 0, 'already_requested': 0, 'summarized': 0, 'skipped': 0, 'conflicts': 0}
+
+    @property
+    def window_messages(self) -> int:
+        # Um turno = mensagem do usuário + resposta da IA
+        return self.history_turns * 2
+
+    def recent_history(self, session_id: int, extra: int = 1) -> List[Dict]:
+        """
+        Últimas mensagens da sessão em ordem cronológica
+
+        `extra` inclui a mensagem do turno atual, já gravada (flush) antes da consulta.
+        """
+        recent = db.session.query(ChatMessage).filter_by(
+            session_id=session_id
+        ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(self.window_messages + extra).all()
+        return [message_to_dict(msg) for msg in reversed(recent)]
+
+    def needs_summary(self, chat_session: ChatSession) -> bool:
+        unsummarized = (chat_session.message_count or 0) - (chat_session.summary_message_count or 0)
+        # Mensagens que já saíram da janela recente e ainda não estão no resumo
+        return unsummarized - self.window_messages >= self.margin_turns * 2
+
+    def schedule_if_needed(self, chat_session: ChatSession) -> bool:
+        """Enfileira o job de resumo quando a sessão passou do limite (após o commit do turno)"""
+        if not self.needs_summary(chat_session):
+            return False
+        try:
+            # Marca o pedido só se não houver outro pendente (ou recente, após um job pulado)
+            now = datetime.now(timezone.utc)
+            claimed = db.session.execute(
+                update(ChatSession).where(
+                    ChatSession.id == chat_session.id,
+                    or_(ChatSession.summary_requested_at.is_(None),
+                        ChatSession.summary_requested_at < now - timedelta(seconds=self.retry_seconds))
+                ).values(summary_requested_at=now),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                self.stats['already_requested'] += 1
+                return False
+            from app.services.job_queue import job_queue
+            job_queue.enqueue('conversation_summary', {'session_id': chat_session.id}, commit=False)
+            db.session.commit()
+            self.stats['scheduled'] += 1
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao agendar resumo da sessão {chat_session.id}: {e}")
+            return False
+
+    def summarize(self, session_id: int) -> Dict:
+        """
+        Condensa as mensagens anteriores à janela recente no resumo da sessão
+
+        Idempotente: um job repetido ou concorrente não resume duas vezes a
+        mesma faixa (UPDATE condicionado ao summary_until_id lido).
+        """
+        from app import ai_service
+
+        chat_session = db.session.get(ChatSession, session_id)
+        if chat_session is None:
+            return {'skipped': True}
+        previous_until = chat_session.summary_until_id
+        pending = db.session.query(ChatMessage).filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > (previous_until or 0)
+        ).order_by(ChatMessage.created_at, ChatMessage.id).all()
+        to_condense = pending[:-self.window_messages] if len(pending) > self.window_messages else []
+        if len(to_condense) < self.margin_turns * 2:
+            self.stats['skipped'] += 1
+            return {'skipped': True, 'pending': len(pending)}
+
+        summary = ai_service.summarize_conversation(
+            chat_session.summary, [message_to_dict(msg) for msg in to_condense]
+        ) if ai_service else None
+        if not summary:
+            # summary_requested_at fica marcado: novo pedido só após retry_seconds
+            self.stats['skipped'] += 1
+            return {'skipped': True, 'reason': 'resumo vazio'}
+
+        updated = db.session.execute(text("""
+            UPDATE chat_sessions
+            SET summary = :summary,
+                summary_until_id = :until_id,
+                summary_message_count = COALESCE(summary_message_count, 0) + :condensed,
+                summary_updated_at = NOW(),
+                summary_requested_at = NULL
+            WHERE id = :session_id AND summary_until_id IS NOT DISTINCT FROM :previous_until
+        """), {
+            'summary': summary,
+            'until_id': to_condense[-1].id,
+            'condensed': len(to_condense),
+            'session_id': session_id,
+            'previous_until': previous_until
+        }).rowcount
+        db.session.commit()
+        if not updated:
+            # Outro job já avançou o resumo desta sessão
+            self.stats['conflicts'] += 1
+            return {'skipped': True, 'reason': 'resumo já atualizado'}
+        self.stats['summarized'] += 1
+        print(f"[RESUMO] Sessão {session_id}: {len(to_condense)} mensagens condensadas ({len(summary)} caracteres)")
+        return {'session_id': session_id, 'condensed': len(to_condense), 'summary_length': len(summary)}
+
+    def get_statistics(self) -> Dict:
+        return dict(self.stats, history_turns=self.history_turns, margin_turns=self.margin_turns,
+                    retry_seconds=self.retry_seconds)
+
+
+# Instância global
+conversation_summarizer = ConversationSummarizer()
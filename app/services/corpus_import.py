@@ -0,0 +1,299 @@
+"""
+Importação em massa do corpus de treinamento (guias do CVV, manuais clínicos etc.)
+
+- Aceita um diretório ou um arquivo .zip
+- Extrai e divide os documentos em trechos num pool de processos
+- Cria os TrainingData em lote e indexa os trechos para o RAG
+- Mantém um manifesto JSON com o status de cada arquivo: reexecuções pulam
+  os arquivos já concluídos (o manifesto é gravado de forma atômica)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app
+
+from app import db
+from app.services.document_ingestion import DocumentIngestionService, EXTRACTORS, chunk_segments, extract_segments
+from app.services.embedding_service import content_hash
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 do arquivo, lido em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def safe_extract(archive: zipfile.ZipFile, target: str) -> None:
+    """Extrai o zip recusando membros que escapariam de target (caminhos absolutos ou com ../)"""
+    target = os.path.realpath(target)
+    for name in archive.namelist():
+        destination = os.path.realpath(os.path.join(target, name))
+        if destination != target and not destination.startswith(target + os.sep):
+            raise ValueError(f"Caminho inválido no arquivo zip: {name}")
+    archive.extractall(target)
+
+
+def parse_document(file_path: str, file_type: str, chunk_size: int, overlap: int) -> Dict:
+    """
+    Extrai, divide e deduplica um documento (executado nos processos do pool)
+
+    Não acessa o banco: devolve apenas dados serializáveis para o processo principal.
+    """
+    started = time.perf_counter()
+    try:
+        chunks, seen, duplicates, pages = [], set(), 0, 0
+        for page, chunk in chunk_segments(extract_segments(file_path, file_type), chunk_size, overlap):
+            pages = max(pages, page or 0)
+            digest = content_hash(chunk)
+            if digest in seen:
+                duplicates += 1
+                continue
+            seen.add(digest)
+            chunks.append((page, chunk))
+        return {
+            'path': file_path,
+            'sha256': file_sha256(file_path),
+            'chunks': chunks,
+            'duplicates': duplicates,
+            'pages': pages,
+            'seconds': time.perf_counter() - started
+        }
+    except Exception as e:
+        return {'path': file_path, 'error': f"{type(e).__name__}: {e}"}
+
+
+class CorpusImporter:
+    """Importa um diretório/zip de documentos como dados de treinamento aprovados"""
+
+    def __init__(self, submitted_by: int, workers: Optional[int] = None,
+                 group_size: int = 20, ingestion: Optional[DocumentIngestionService] = None,
+                 echo: Callable[[str], None] = print):
+        self.submitted_by = submitted_by
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.group_size = group_size
+        self.ingestion = ingestion or DocumentIngestionService()
+        self.echo = echo
+
+    # === MANIFESTO ===
+
+    @staticmethod
+    def load_manifest(manifest_path: str, source: str) -> Dict:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as handle:
+                return json.load(handle)
+        return {'version': MANIFEST_VERSION, 'source': source, 'files': {}}
+
+    @staticmethod
+    def save_manifest(manifest: Dict, manifest_path: str) -> None:
+        """Grava em arquivo temporário e substitui (nunca deixa o manifesto pela metade)"""
+        manifest['updated_at'] = datetime.utcnow().isoformat()
+        directory = os.path.dirname(os.path.abspath(manifest_path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.manifest-', suffix='.json', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    # === DESCOBERTA ===
+
+    @staticmethod
+    def discover(root: str) -> Dict[str, str]:
+        """Arquivos suportados sob root: caminho relativo -> caminho absoluto"""
+        found = {}
+        for directory, _, names in os.walk(root):
+            for name in sorted(names):
+                extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+                if extension in EXTRACTORS:
+                    path = os.path.join(directory, name)
+                    found[os.path.relpath(path, root)] = path
+        return found
+
+    # === IMPORTAÇÃO ===
+
+    def run(self, source: str, manifest_path: Optional[str] = None) -> Dict:
+        """
+        Importa todos os documentos de `source` (diretório ou .zip)
+
+        Returns:
+            Resumo com arquivos concluídos, pulados, com erro e taxa de arquivos/s
+        """
+        source = os.path.abspath(source)
+        manifest_path = manifest_path or f"{source.rstrip(os.sep)}.manifest.json"
+        manifest = self.load_manifest(manifest_path, source)
+
+        extracted_dir = None
+        root = source
+        if zipfile.is_zipfile(source):
+            extracted_dir = tempfile.mkdtemp(prefix='corpus-')
+            root = extracted_dir
+
+        try:
+            if extracted_dir:
+                with zipfile.ZipFile(source) as archive:
+                    safe_extract(archive, extracted_dir)
+            return self._import_files(root, manifest, manifest_path)
+        finally:
+            if extracted_dir:
+                shutil.rmtree(extracted_dir, ignore_errors=True)
+
+    def _import_files(self, root: str, manifest: Dict, manifest_path: str) -> Dict:
+        files = self.discover(root)
+        entries = manifest['files']
+        pending = {rel: path for rel, path in files.items() if entries.get(rel, {}).get('status') != 'done'}
+        summary = {'total': len(files), 'skipped': len(files) - len(pending), 'done': 0,
+                   'duplicates': 0, 'errors': 0, 'chunks': 0, 'stored': 0}
+        self.echo(f"📂 {len(files)} arquivos encontrados | {summary['skipped']} já importados | {len(pending)} a processar")
+        if not pending:
+            return dict(summary, files_per_second=0)
+
+        # Arquivos já importados (por conteúdo) não geram novos TrainingData
+        known_hashes = {e['sha256']: rel for rel, e in entries.items() if e.get('status') == 'done' and e.get('sha256')}
+        relative = {path: rel for rel, path in pending.items()}
+        started = time.perf_counter()
+        processed = 0
+        group: List[Dict] = []
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(parse_document, path, rel.rsplit('.', 1)[-1],
+                            self.ingestion.chunk_size, self.ingestion.overlap)
+                for rel, path in pending.items()
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                result['relative'] = relative[result['path']]
+                processed += 1
+
+                if 'error' in result:
+                    summary['errors'] += 1
+                    entries[result['relative']] = {'status': 'error', 'error': result['error'],
+                                                   'updated_at': datetime.utcnow().isoformat()}
+                    logger.warning(f"Falha ao ler {result['relative']}: {result['error']}")
+                elif result['sha256'] in known_hashes:
+                    summary['duplicates'] += 1
+                    entries[result['relative']] = {'status': 'done', 'sha256': result['sha256'],
+                                                   'duplicate_of': known_hashes[result['sha256']],
+                                                   'updated_at': datetime.utcnow().isoformat()}
+                else:
+                    known_hashes[result['sha256']] = result['relative']
+                    group.append(result)
+
+                if len(group) >= self.group_size:
+                    self._store_group(group, entries, summary)
+                    group = []
+                    self.save_manifest(manifest, manifest_path)
+                    self._report(processed, len(pending), started)
+
+            if group:
+                self._store_group(group, entries, summary)
+        self.save_manifest(manifest, manifest_path)
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else 0
+        self._report(processed, len(pending), started)
+        return dict(summary, seconds=round(elapsed, 1), files_per_second=round(rate, 2))
+
+    def _store_group(self, group: List[Dict], entries: Dict, summary: Dict) -> None:
+        """
+        Cria os TrainingData do grupo com um único commit e indexa os trechos
+
+        Se a indexação de um arquivo falha, o TrainingData (com os trechos já
+        gravados) e a cópia do arquivo são removidos: a reexecução cria o
+        registro de novo em vez de deixar um órfão aprovado sem trechos.
+        """
+        from app.models import TrainingData, TrainingDataStatus, TrainingDataType
+
+        upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'training')
+        os.makedirs(upload_dir, exist_ok=True)
+
+        stored_group, records = [], []
+        for result in group:
+            filename = os.path.basename(result['relative'])
+            file_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{filename}")
+            try:
+                shutil.copyfile(result['path'], file_path)
+            except OSError as e:
+                self._mark_error(result, entries, summary, e)
+                continue
+            stored_group.append(result)
+            records.append(TrainingData(
+                title=os.path.splitext(filename)[0].replace('_', ' ')[:200],
+                description=f"Importado em lote de {result['relative']}",
+                submitted_by=self.submitted_by,
+                data_type=TrainingDataType.FILE,
+                file_name=filename,
+                file_path=file_path,
+                file_size=os.path.getsize(file_path),
+                file_type=filename.rsplit('.', 1)[-1].lower(),
+                status=TrainingDataStatus.APPROVED,
+                validation_score=1.0,
+                validation_notes="✅ APROVADO AUTOMATICAMENTE\n\nImportação em lote do corpus de treinamento."
+            ))
+        db.session.add_all(records)
+        db.session.commit()
+
+        for result, record in zip(stored_group, records):
+            stats = {'chunks': 0, 'duplicates': result['duplicates'], 'stored': 0, 'segments': result['pages']}
+            try:
+                self.ingestion.index_chunks(record, result['chunks'], stats)
+                stats['chunks'] += result['duplicates']
+                record.status = TrainingDataStatus.PROCESSED
+                record.processed_at = datetime.utcnow()
+                record.processing_logs = (
+                    f"[{datetime.utcnow().strftime('%H:%M:%S')}] Importação em lote: {stats['segments']} páginas/seções, "
+                    f"{stats['chunks']} trechos, {stats['duplicates']} duplicados, {stats['stored']} indexados\n"
+                )
+                db.session.commit()
+                summary['done'] += 1
+                summary['chunks'] += stats['chunks']
+                summary['stored'] += stats['stored']
+                entries[result['relative']] = {
+                    'status': 'done', 'sha256': result['sha256'], 'training_data_id': record.id,
+                    'chunks': stats['chunks'], 'stored': stats['stored'],
+                    'updated_at': datetime.utcnow().isoformat()
+                }
+            except Exception as e:
+                db.session.rollback()
+                self._discard_record(record)
+                self._mark_error(result, entries, summary, e)
+
+    def _discard_record(self, record) -> None:
+        """Remove o TrainingData de uma importação que falhou (trechos saem em cascata)"""
+        try:
+            db.session.delete(record)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao remover TrainingData {record.id} da importação com falha: {e}")
+            return
+        if record.file_path and os.path.exists(record.file_path):
+            os.remove(record.file_path)
+
+    @staticmethod
+    def _mark_error(result: Dict, entries: Dict, summary: Dict, error: Exception) -> None:
+        summary['errors'] += 1
+        entries[result['relative']] = {'status': 'error', 'sha256': result['sha256'], 'error': str(error),
+                                       'updated_at': datetime.utcnow().isoformat()}
+        logger.error(f"Erro ao indexar {result['relative']}: {error}")
+
+    def _report(self, processed: int, total: int, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else 0
+        self.echo(f"   {processed}/{total} arquivos | {rate:.2f} arquivos/s | {elapsed:.0f}s")
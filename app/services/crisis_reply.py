@@ -0,0 +1,46 @@
+"""
+Resposta de crise pré-computada (caminho rápido para risco crítico)
+
+Mensagem de segurança fixa e localizada, devolvida logo após o veredito de
+risco, sem depender de RAG nem de um provedor de LLM. A resposta
+personalizada da IA chega depois, como continuação em background.
+"""
+
+from typing import Optional
+
+DEFAULT_LOCALE = 'pt'
+
+CRISIS_REPLIES = {
+    'pt': (
+        "{prefix}sua segurança é a prioridade agora. Você não está sozinho(a).\n"
+        "🆘 Precisa de Ajuda Imediata? Estes contatos estão disponíveis 24 horas:\n"
+        "CVV - Centro de Valorização da Vida\n📞 188\nApoio emocional gratuito 24h\n"
+        "SAMU\n📞 192\nEmergências médicas\n"
+        "Se estiver em perigo imediato, ligue 192 ou vá ao pronto-socorro mais próximo."
+    ),
+    'en': (
+        "{prefix}your safety is the priority right now. You are not alone.\n"
+        "🆘 Need help right now? These contacts are available 24 hours a day:\n"
+        "CVV - Centro de Valorização da Vida\n📞 188\nFree emotional support 24h\n"
+        "SAMU\n📞 192\nMedical emergencies\n"
+        "If you are in immediate danger, call 192 or go to the nearest emergency room."
+    ),
+    'es': (
+        "{prefix}tu seguridad es la prioridad ahora. No estás solo(a).\n"
+        "🆘 ¿Necesitas ayuda inmediata? Estos contactos están disponibles las 24 horas:\n"
+        "CVV - Centro de Valorização da Vida\n📞 188\nApoyo emocional gratuito 24h\n"
+        "SAMU\n📞 192\nEmergencias médicas\n"
+        "Si estás en peligro inmediato, llama al 192 o ve a la sala de emergencias más cercana."
+    ),
+}
+
+SUPPORTED_LOCALES = list(CRISIS_REPLIES)
+
+
+def build_crisis_reply(user_name: Optional[str] = None, locale: Optional[str] = None) -> str:
+    """Mensagem de crise no idioma pedido (português quando não suportado)"""
+    template = CRISIS_REPLIES.get((locale or DEFAULT_LOCALE)[:2].lower(), CRISIS_REPLIES[DEFAULT_LOCALE])
+    first_name = (user_name or '').split()[0] if user_name else ''
+    prefix = f"{first_name}, " if first_name and first_name != 'amigo' else ''
+    reply = template.format(prefix=prefix)
+    return reply[0].upper() + reply[1:]
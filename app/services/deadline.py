@@ -0,0 +1,135 @@
+"""
+Prazo (deadline) de um turno do chat
+
+Criado em api_chat_send com o orçamento do turno (CHAT_TURN_BUDGET_SECONDS) e
+repassado a todas as etapas:
+- consultas do RAG rodam num SAVEPOINT com SET LOCAL statement_timeout igual
+  ao tempo restante (um cancelamento não aborta a transação do turno)
+- chamadas ao OpenAI/Gemini e a espera na fila do LLM recebem timeout
+  derivado do tempo restante
+- etapas opcionais (RAG, sentimento do LLM) são puladas quando o tempo
+  restante fica abaixo do mínimo de cada uma
+
+O prazo ativo também fica num contextvar (current_deadline) para as consultas
+internas do RAG, que não recebem o objeto por parâmetro.
+"""
+
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Tempo restante mínimo (s) para iniciar cada etapa opcional
+DEFAULT_STAGE_MINIMUMS = 'rag=2,sentiment=3'
+
+_current = contextvars.ContextVar('chat_turn_deadline', default=None)
+
+
+def parse_minimums(spec: str) -> Dict[str, float]:
+    """'rag=2,sentiment=3' -> {'rag': 2.0, 'sentiment': 3.0}"""
+    minimums = {}
+    for item in spec.split(','):
+        if '=' in item:
+            stage, seconds = item.split('=', 1)
+            minimums[stage.strip()] = float(seconds)
+    return minimums
+
+
+class DeadlineExceeded(Exception):
+    """Orçamento do turno esgotado antes de uma etapa"""
+
+
+class Deadline:
+    """Orçamento de tempo de um turno, consultado por todas as etapas"""
+
+    def __init__(self, budget: float, stage_minimums: Optional[Dict[str, float]] = None,
+                 reserve: float = 0.5, clock=time.monotonic):
+        self.budget = budget
+        # Folga para gravar a resposta depois da última chamada externa
+        self.reserve = reserve
+        self.stage_minimums = parse_minimums(DEFAULT_STAGE_MINIMUMS)
+        self.stage_minimums.update(stage_minimums or parse_minimums(os.getenv('CHAT_DEADLINE_MIN_SECONDS', '')))
+        self._clock = clock
+        self.expires_at = clock() + budget
+        self.skipped = []
+
+    @classmethod
+    def for_chat_turn(cls, budget: Optional[float] = None) -> 'Deadline':
+        return cls(budget or float(os.getenv('CHAT_TURN_BUDGET_SECONDS', '25')))
+
+    def remaining(self) -> float:
+        return max(self.expires_at - self._clock(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, stage: str) -> bool:
+        """Há tempo para a etapa opcional? Registra a etapa pulada"""
+        if self.remaining() >= self.stage_minimums.get(stage, 0.0):
+            return True
+        self.skipped.append(stage)
+        print(f"[PRAZO] Etapa '{stage}' pulada: restam {self.remaining():.1f}s de {self.budget:.0f}s")
+        return False
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout (s) para uma chamada externa; levanta DeadlineExceeded sem tempo útil"""
+        seconds = self.remaining() - self.reserve
+        if cap is not None:
+            seconds = min(seconds, cap)
+        if seconds <= 0:
+            raise DeadlineExceeded(f"Prazo do turno ({self.budget:.0f}s) esgotado")
+        return seconds
+
+    def statement_timeout_ms(self) -> int:
+        return max(int(self.timeout() * 1000), 1)
+
+    @contextmanager
+    def statement_timeout(self, session):
+        """
+        Executa o bloco num SAVEPOINT com statement_timeout = tempo restante
+
+        Se a consulta for cancelada, o rollback do SAVEPOINT desfaz o erro e o
+        próprio SET LOCAL, e a transação do turno continua válida.
+        """
+        with session.begin_nested():
+            session.execute(text(f"SET LOCAL statement_timeout = {self.statement_timeout_ms()}"))
+            yield
+            session.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+
+    @contextmanager
+    def activate(self):
+        """Torna este prazo o current_deadline() da thread/contexto atual"""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def to_dict(self) -> Dict:
+        return {
+            'budget_s': self.budget,
+            'remaining_s': round(self.remaining(), 3),
+            'skipped_stages': list(self.skipped)
+        }
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def activate(deadline: Optional[Deadline]):
+    """deadline.activate(), ou nada se não houver prazo"""
+    return deadline.activate() if deadline is not None else nullcontext()
+
+
+def statement_timeout(session):
+    """Limita as consultas do bloco ao prazo ativo (sem prazo, não faz nada)"""
+    deadline = current_deadline()
+    return deadline.statement_timeout(session) if deadline is not None else nullcontext()
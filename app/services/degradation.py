@@ -0,0 +1,189 @@
+"""
+Controlador de degradação gradual do pipeline do chat
+
+Acompanha a latência p95 e a taxa de erro (janela móvel) das etapas do
+pipeline e desce/sobe de nível automaticamente:
+
+0. full            - pipeline completo
+1. no_rag          - sem RAG
+2. rule_sentiment  - + análise de sentimento por regras em vez do LLM
+3. llm_moderate    - + resposta do LLM só para risco moderate ou maior
+4. static_low      - + respostas estáticas (AIPromptManager) para risco low
+
+Os níveis nunca se aplicam a high/critical: crise recebe sempre o pipeline
+completo. Desce um nível por vez (com intervalo mínimo) quando alguma etapa
+estoura o limite e sobe um nível depois de um período saudável.
+
+A recuperação não depende de chegarem amostras: nos níveis 3-4 o tráfego
+low deixa de passar pelo LLM e a etapa pode ficar sem medições. Por isso o
+nível também é reavaliado na leitura (no máximo uma vez por segundo), e
+uma janela vazia conta como saudável.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ['full', 'no_rag', 'rule_sentiment', 'llm_moderate', 'static_low']
+CRISIS_LEVELS = ('high', 'critical')
+
+DEFAULT_P95_LIMITS = 'rag=1500,sentiment=4000,llm_reply=8000'
+
+# Intervalo mínimo (s) entre reavaliações feitas na leitura do nível
+READ_EVALUATION_INTERVAL = 1.0
+
+
+def parse_limits(spec: str) -> Dict[str, float]:
+    """'rag=800,llm_reply=6000' -> {'rag': 800.0, 'llm_reply': 6000.0} (ms)"""
+    limits = {}
+    for item in spec.split(','):
+        if '=' in item:
+            stage, value = item.split('=', 1)
+            limits[stage.strip()] = float(value)
+    return limits
+
+
+def _p95(values) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class DegradationController:
+    """Nível de degradação atual e política por etapa"""
+
+    def __init__(self, p95_limits: Optional[Dict[str, float]] = None, max_error_rate: Optional[float] = None,
+                 window: Optional[float] = None, min_samples: Optional[int] = None,
+                 cooldown: Optional[float] = None, recovery: Optional[float] = None,
+                 enabled: Optional[bool] = None, clock=time.monotonic):
+        if enabled is None:
+            enabled = os.getenv('DEGRADATION_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self.p95_limits = p95_limits or parse_limits(os.getenv('DEGRADATION_P95_MS', DEFAULT_P95_LIMITS))
+        self.max_error_rate = max_error_rate if max_error_rate is not None else float(os.getenv('DEGRADATION_MAX_ERROR_RATE', '0.2'))
+        self.window = window or float(os.getenv('DEGRADATION_WINDOW', '60'))
+        self.min_samples = min_samples or int(os.getenv('DEGRADATION_MIN_SAMPLES', '10'))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv('DEGRADATION_COOLDOWN', '30'))
+        self.recovery = recovery if recovery is not None else float(os.getenv('DEGRADATION_RECOVERY', '120'))
+        forced = os.getenv('DEGRADATION_FORCE_LEVEL')
+        self.forced_level = int(forced) if forced not in (None, '') else None
+        self._clock = clock
+        # Reentrante: get_statistics lê o nível com o lock já adquirido
+        self._lock = threading.RLock()
+        self._samples = {stage: deque(maxlen=1000) for stage in self.p95_limits}
+        self._level = 0
+        self._changed_at = float('-inf')  # Primeira descida não espera o intervalo
+        self._healthy_since = clock()
+        self._evaluated_at = float('-inf')
+        self.transitions = deque(maxlen=20)
+
+    # === NÍVEL ===
+
+    @property
+    def level(self) -> int:
+        if self.forced_level is not None:
+            return self.forced_level
+        if not self.enabled:
+            return 0
+        if self._level > 0:
+            self._evaluate_on_read()
+        return self._level
+
+    def _evaluate_on_read(self) -> None:
+        """Sem amostras novas o nível ficaria preso: reavalia para permitir a recuperação"""
+        now = self._clock()
+        if now - self._evaluated_at < READ_EVALUATION_INTERVAL:
+            return
+        with self._lock:
+            self._evaluate(now)
+
+    @property
+    def level_name(self) -> str:
+        return LEVELS[min(self.level, len(LEVELS) - 1)]
+
+    # === POLÍTICA (crise nunca é degradada) ===
+
+    def use_rag(self, risk_level: str) -> bool:
+        return self.level < 1 or risk_level in CRISIS_LEVELS
+
+    def use_llm_sentiment(self, risk_level: str) -> bool:
+        return self.level < 2 or risk_level in CRISIS_LEVELS
+
+    def use_llm_reply(self, risk_level: str) -> bool:
+        return self.level < 3 or risk_level != 'low'
+
+    def use_static_reply(self, risk_level: str) -> bool:
+        return self.level >= 4 and risk_level == 'low'
+
+    # === MEDIÇÃO ===
+
+    def record(self, stage: str, seconds: float, ok: bool = True) -> None:
+        """Registra a duração de uma etapa e reavalia o nível"""
+        if stage not in self._samples:
+            return
+        now = self._clock()
+        with self._lock:
+            self._samples[stage].append((now, seconds * 1000, ok))
+            self._evaluate(now)
+
+    def _window_stats(self, now: float) -> Dict[str, Dict]:
+        stats = {}
+        for stage, samples in self._samples.items():
+            while samples and now - samples[0][0] > self.window:
+                samples.popleft()
+            latencies = [latency for _, latency, _ in samples]
+            errors = sum(1 for _, _, ok in samples if not ok)
+            stats[stage] = {
+                'samples': len(samples),
+                'p95_ms': round(_p95(latencies), 1),
+                'error_rate': round(errors / len(samples), 3) if samples else 0.0,
+                'p95_limit_ms': self.p95_limits[stage]
+            }
+        return stats
+
+    def _evaluate(self, now: float) -> None:
+        self._evaluated_at = now
+        stats = self._window_stats(now)
+        breached = [
+            stage for stage, s in stats.items()
+            if s['samples'] >= self.min_samples
+            and (s['p95_ms'] > s['p95_limit_ms'] or s['error_rate'] > self.max_error_rate)
+        ]
+        if breached:
+            self._healthy_since = now
+            if self._level < len(LEVELS) - 1 and now - self._changed_at >= self.cooldown:
+                self._change(self._level + 1, now, f"limite excedido em {', '.join(breached)}")
+        elif self._level > 0 and now - self._healthy_since >= self.recovery and now - self._changed_at >= self.cooldown:
+            self._healthy_since = now
+            self._change(self._level - 1, now, 'etapas dentro dos limites')
+
+    def _change(self, level: int, now: float, reason: str) -> None:
+        previous = LEVELS[self._level]
+        self._level = level
+        self._changed_at = now
+        # Amostras do nível anterior não valem para o novo
+        for samples in self._samples.values():
+            samples.clear()
+        self.transitions.append({'from': previous, 'to': LEVELS[level], 'reason': reason, 'at': time.time()})
+        print(f"[DEGRADAÇÃO] {previous} -> {LEVELS[level]} ({reason})")
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'level': self.level,
+                'level_name': self.level_name,
+                'forced': self.forced_level is not None,
+                'stages': self._window_stats(self._clock()),
+                'transitions': list(self.transitions)
+            }
+
+
+# Instância global
+degradation = DegradationController()
@@ -0,0 +1,314 @@
+"""
+Pipeline de ingestão dos documentos de treinamento
+
+- Lê PDF página a página (PyPDF2), DOCX (python-docx), ODT (odfpy) e TXT em blocos
+- Divide o texto em trechos com sobreposição, sem carregar o documento inteiro
+- Deduplica trechos pelo hash do conteúdo (no documento e no banco)
+- Gera embeddings em lote e grava os trechos em training_chunks para o RAG
+- Registra o progresso em TrainingData.processing_logs
+- Executa em background: uploads grandes não bloqueiam o worker web
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import bindparam, func, text
+
+from app import db
+from app.services.embedding_service import content_hash, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# (página ou seção de origem, texto)
+Segment = Tuple[Optional[int], str]
+
+
+# === EXTRAÇÃO DE TEXTO ===
+
+def iter_pdf_pages(file_path: str) -> Iterator[Segment]:
+    """Extrai o texto de um PDF uma página por vez"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    for number, page in enumerate(reader.pages, 1):
+        yield number, page.extract_text() or ''
+
+
+def iter_docx_sections(file_path: str, section_chars: int = 4000) -> Iterator[Segment]:
+    """Extrai parágrafos de um DOCX agrupados em seções de ~section_chars"""
+    from docx import Document
+    document = Document(file_path)
+    yield from _group_paragraphs((p.text for p in document.paragraphs), section_chars)
+
+
+def iter_odt_sections(file_path: str, section_chars: int = 4000) -> Iterator[Segment]:
+    """Extrai parágrafos de um ODT agrupados em seções de ~section_chars"""
+    from odf import teletype
+    from odf.opendocument import load
+    from odf.text import P
+    document = load(file_path)
+    yield from _group_paragraphs(
+        (teletype.extractText(p) for p in document.getElementsByType(P)), section_chars
+    )
+
+
+def iter_txt_blocks(file_path: str, block_chars: int = 64 * 1024) -> Iterator[Segment]:
+    """Lê um arquivo de texto em blocos"""
+    with open(file_path, encoding='utf-8', errors='replace') as handle:
+        number = 0
+        while True:
+            block = handle.read(block_chars)
+            if not block:
+                break
+            number += 1
+            yield number, block
+
+
+def _group_paragraphs(paragraphs: Iterable[str], section_chars: int) -> Iterator[Segment]:
+    section, size, number = [], 0, 1
+    for paragraph in paragraphs:
+        if not paragraph or not paragraph.strip():
+            continue
+        section.append(paragraph)
+        size += len(paragraph)
+        if size >= section_chars:
+            yield number, '\n'.join(section)
+            section, size, number = [], 0, number + 1
+    if section:
+        yield number, '\n'.join(section)
+
+
+EXTRACTORS = {
+    'pdf': iter_pdf_pages,
+    'docx': iter_docx_sections,
+    # .doc binário (Word 97-2003) não é lido pelo python-docx; funciona apenas
+    # quando o arquivo é na verdade um DOCX com extensão antiga
+    'doc': iter_docx_sections,
+    'odt': iter_odt_sections,
+    'txt': iter_txt_blocks
+}
+
+
+def extract_segments(file_path: str, file_type: str) -> Iterator[Segment]:
+    """Seleciona o extrator pelo tipo do arquivo"""
+    extractor = EXTRACTORS.get((file_type or '').lower())
+    if extractor is None:
+        raise ValueError(f"Tipo de arquivo não suportado para ingestão: {file_type}")
+    return extractor(file_path)
+
+
+# === CHUNKING ===
+
+def chunk_segments(segments: Iterable[Segment], chunk_size: int = 1000,
+                   overlap: int = 200) -> Iterator[Segment]:
+    """
+    Divide o fluxo de segmentos em trechos de até chunk_size caracteres
+
+    Cada trecho repete os últimos `overlap` caracteres do anterior (cortados em
+    espaço) para não perder contexto na fronteira. A página informada é a de
+    onde o trecho começa.
+    """
+    overlap = min(overlap, chunk_size // 2)
+    buffer, buffer_page = '', None
+    for page, segment in segments:
+        segment = normalize_text(segment)
+        if not segment:
+            continue
+        if not buffer:
+            buffer_page = page
+        buffer = f"{buffer} {segment}" if buffer else segment
+        while len(buffer) >= chunk_size:
+            cut = buffer.rfind(' ', chunk_size // 2, chunk_size)
+            if cut <= 0:
+                cut = chunk_size
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield buffer_page, chunk
+            tail_start = buffer.find(' ', max(cut - overlap, 0), cut)
+            buffer = buffer[tail_start if tail_start != -1 else cut:].strip()
+            buffer_page = page
+    if buffer.strip():
+        yield buffer_page, buffer.strip()
+
+
+# === SERVIÇO ===
+
+class DocumentIngestionService:
+    """Ingestão de dados de treinamento em background"""
+
+    def __init__(self, chunk_size: Optional[int] = None, overlap: Optional[int] = None,
+                 batch_size: Optional[int] = None, workers: Optional[int] = None,
+                 embedding_service=None):
+        self.chunk_size = chunk_size or int(os.getenv('INGESTION_CHUNK_SIZE', '1000'))
+        self.overlap = overlap if overlap is not None else int(os.getenv('INGESTION_CHUNK_OVERLAP', '200'))
+        self.batch_size = batch_size or int(os.getenv('INGESTION_BATCH_SIZE', '64'))
+        self.workers = workers or int(os.getenv('INGESTION_WORKERS', '1'))
+        self._embedding_service = embedding_service
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_progress = set()
+
+    @property
+    def embedding_service(self):
+        """EmbeddingService criado sob demanda"""
+        if self._embedding_service is None:
+            from app.services.embedding_service import EmbeddingService, create_embedding_provider
+            self._embedding_service = EmbeddingService(provider=create_embedding_provider())
+        return self._embedding_service
+
+    def submit(self, training_data_id: int) -> Optional[Future]:
+        """Agenda a ingestão em background (ignora se o item já está em processamento)"""
+        with self._lock:
+            if training_data_id in self._in_progress:
+                return None
+            self._in_progress.add(training_data_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingestion')
+        app = current_app._get_current_object()
+        print(f"[INGESTÃO] Treinamento {training_data_id} agendado")
+        return self._executor.submit(self._run_in_context, app, training_data_id)
+
+    def _run_in_context(self, app, training_data_id: int) -> Dict:
+        try:
+            with app.app_context():
+                return self.ingest(training_data_id)
+        finally:
+            with self._lock:
+                self._in_progress.discard(training_data_id)
+
+    def ingest(self, training_data_id: int) -> Dict:
+        """
+        Processa um dado de treinamento de forma síncrona (requer app context)
+
+        Returns:
+            Dict com contagem de trechos gerados, duplicados e gravados
+        """
+        from app.models import TrainingData
+
+        training_data = db.session.get(TrainingData, training_data_id)
+        if training_data is None:
+            return {'success': False, 'error': 'Treinamento não encontrado'}
+
+        stats = {'chunks': 0, 'duplicates': 0, 'stored': 0, 'segments': 0}
+        started = datetime.utcnow()
+        training_data.processing_logs = ''
+        self._log(training_data, f"Ingestão iniciada ({training_data.data_type.value})")
+
+        try:
+            # Reprocessamento: substitui os trechos anteriores deste item
+            db.session.execute(
+                text("DELETE FROM training_chunks WHERE training_data_id = :id"),
+                {'id': training_data.id}
+            )
+            db.session.commit()
+
+            segments = self._segments_for(training_data, stats)
+            self.index_chunks(training_data, chunk_segments(segments, self.chunk_size, self.overlap), stats)
+
+            elapsed = (datetime.utcnow() - started).total_seconds()
+            self._log(
+                training_data,
+                f"Concluído: {stats['segments']} páginas/seções, {stats['chunks']} trechos, "
+                f"{stats['duplicates']} duplicados, {stats['stored']} indexados em {elapsed:.1f}s"
+            )
+            training_data.mark_as_processed()
+            print(f"[INGESTÃO] Treinamento {training_data.id}: {stats['stored']} trechos indexados em {elapsed:.1f}s")
+            return dict(stats, success=True)
+
+        except Exception as e:
+            logger.error(f"Erro na ingestão do treinamento {training_data_id}: {e}")
+            db.session.rollback()
+            training_data = db.session.get(TrainingData, training_data_id)
+            if training_data is not None:
+                self._log(training_data, f"ERRO: {e}")
+            return dict(stats, success=False, error=str(e))
+
+    def index_chunks(self, training_data, chunks: Iterable[Segment], stats: Dict) -> Dict:
+        """Deduplica, embedda e grava os trechos em lotes de batch_size"""
+        batch: List[Dict] = []
+        seen = set()
+        for page, chunk in chunks:
+            stats['chunks'] += 1
+            digest = content_hash(chunk)
+            if digest in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(digest)
+            batch.append({'chunk_index': stats['chunks'] - 1, 'page': page,
+                          'content': chunk, 'content_hash': digest})
+            if len(batch) >= self.batch_size:
+                self._store_batch(training_data, batch, stats)
+                batch = []
+        if batch:
+            self._store_batch(training_data, batch, stats)
+        return stats
+
+    def _segments_for(self, training_data, stats: Dict) -> Iterator[Segment]:
+        """Segmentos do conteúdo de texto ou do arquivo enviado"""
+        if training_data.content:
+            stats['segments'] += 1
+            yield 1, training_data.content
+        if training_data.file_path:
+            for page, segment in extract_segments(training_data.file_path, training_data.file_type):
+                stats['segments'] += 1
+                if stats['segments'] % 25 == 0:
+                    self._log(training_data, f"{stats['segments']} páginas/seções lidas, {stats['stored']} trechos indexados")
+                yield page, segment
+
+    def _store_batch(self, training_data, batch: List[Dict], stats: Dict) -> None:
+        """
+        Remove trechos já indexados, gera embeddings do lote e grava com um upsert
+
+        Trechos gravados sem embedding (falha no provedor) não contam como já
+        indexados: são embeddados de novo e o upsert preenche o vetor. O total
+        gravado vem do RETURNING, não do tamanho do lote.
+        """
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models import TrainingChunk
+
+        existing = db.session.execute(
+            text("""
+                SELECT content_hash FROM training_chunks
+                WHERE content_hash IN :hashes AND embedding IS NOT NULL
+            """).bindparams(bindparam('hashes', expanding=True)),
+            {'hashes': [item['content_hash'] for item in batch]}
+        ).scalars().all()
+        if existing:
+            existing = set(existing)
+            stats['duplicates'] += len(existing)
+            batch = [item for item in batch if item['content_hash'] not in existing]
+        if not batch:
+            return
+
+        embeddings = self.embedding_service.embed_texts([item['content'] for item in batch])
+        rows = [
+            dict(item, training_data_id=training_data.id, embedding=embedding)
+            for item, embedding in zip(batch, embeddings)
+        ]
+        chunks = TrainingChunk.__table__
+        stmt = insert(chunks)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[chunks.c.content_hash],
+            set_={'embedding': stmt.excluded.embedding, 'updated_at': func.now()},
+            where=chunks.c.embedding.is_(None) & stmt.excluded.embedding.isnot(None)
+        ).returning(chunks.c.id)
+        stored = len(db.session.execute(stmt, rows).all())
+        db.session.commit()
+        stats['stored'] += stored
+        # Indexados por outra ingestão entre a consulta e o insert
+        stats['duplicates'] += len(rows) - stored
+
+    def _log(self, training_data, message: str) -> None:
+        """Acrescenta uma linha de progresso em processing_logs e grava"""
+        line = f"[{datetime.utcnow().strftime('%H:%M:%S')}] {message}"
+        training_data.processing_logs = f"{training_data.processing_logs or ''}{line}\n"
+        db.session.commit()
+        logger.info(f"Ingestão {training_data.id}: {message}")
+
+
+# Instância global do serviço
+document_ingestion = DocumentIngestionService()
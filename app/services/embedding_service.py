@@ -0,0 +1,284 @@
+"""
+Serviço de embeddings em lote com deduplicação e cache persistente
+
+- Normaliza e deduplica textos pelo SHA-256 antes de chamar o provedor
+- Agrupa as chamadas até o limite de entradas por requisição do provedor
+- Mantém cache em memória (LRU) e tabela persistente hash -> vetor
+- Grava novos vetores com inserts em lote e reporta throughput
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+from cachetools import LRUCache
+from sqlalchemy import insert, select
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza texto para deduplicação (Unicode NFC + espaços colapsados)"""
+    if not text:
+        return ''
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 do texto normalizado"""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def vector_to_bytes(vector: List[float]) -> bytes:
+    """Serializa vetor como float32 (formato da tabela embedding_cache)"""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def bytes_to_vector(data: bytes) -> List[float]:
+    """Desserializa vetor float32"""
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+def vector_to_pg(vector: List[float]) -> str:
+    """Converte vetor para o literal aceito pelo pgvector"""
+    return '[' + ','.join(map(str, vector)) + ']'
+
+
+class OpenAIEmbeddingProvider:
+    """Provedor de embeddings via API da OpenAI"""
+
+    name = 'openai'
+    max_batch_size = 2048  # Limite de entradas por requisição da API
+
+    def __init__(self, client=None, model: str = 'text-embedding-ada-002', dimensions: int = 1536):
+        if client is None:
+            import openai
+            client = openai
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings para um lote de textos (uma única requisição)"""
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        # A API devolve os itens com índice; garantir a ordem de entrada
+        data = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in data]
+
+
+def create_embedding_provider(name: Optional[str] = None, client=None):
+    """
+    Cria o provedor configurado em EMBEDDING_PROVIDER ('openai' ou 'local')
+
+    Vetores de provedores diferentes não são comparáveis: ao trocar de provedor,
+    gere novamente os embeddings armazenados. Por isso 'local' sem
+    torch/transformers instalados levanta ImportError em vez de recorrer à
+    OpenAI: misturaria vetores incomparáveis nas mesmas colunas e enviaria o
+    texto a terceiros numa implantação que escolheu o modelo local.
+    """
+    name = (name or os.getenv('EMBEDDING_PROVIDER', 'openai')).lower()
+    if name == 'local':
+        from app.services.local_embedding_provider import LocalEmbeddingProvider
+        pad_to = os.getenv('LOCAL_EMBEDDING_PAD_TO', '1536')
+        return LocalEmbeddingProvider(pad_to=int(pad_to) if pad_to else None)
+    if name != 'openai':
+        raise ValueError(f"Provedor de embeddings não suportado: {name}")
+    return OpenAIEmbeddingProvider(client, os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-ada-002'))
+
+
+class EmbeddingService:
+    """
+    Pipeline de embeddings com lote, deduplicação e cache endereçado por conteúdo
+    """
+
+    def __init__(self, provider=None, batch_size: Optional[int] = None,
+                 use_db_cache: bool = True, memory_cache_size: Optional[int] = None):
+        self.provider = provider or OpenAIEmbeddingProvider()
+        configured_batch = batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', self.provider.max_batch_size))
+        self.batch_size = max(1, min(configured_batch, self.provider.max_batch_size))
+        self.use_db_cache = use_db_cache
+        self.memory_cache = LRUCache(maxsize=memory_cache_size or int(os.getenv('EMBEDDING_MEMORY_CACHE_SIZE', '5000')))
+        self._lock = threading.Lock()
+        self.stats = {
+            'texts_requested': 0,
+            'unique_texts': 0,
+            'memory_hits': 0,
+            'db_hits': 0,
+            'embedded': 0,
+            'provider_calls': 0,
+            'provider_errors': 0,
+            'provider_seconds': 0.0,
+            'total_seconds': 0.0
+        }
+
+    @property
+    def model_key(self) -> str:
+        """Identificador do modelo usado como parte da chave do cache"""
+        return f"{self.provider.name}:{self.provider.model}"
+
+    def embed_text(self, text: str) -> Optional[List[float]]:
+        """Gera (ou recupera do cache) o embedding de um único texto"""
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Gera embeddings para vários textos
+
+        Textos iguais (após normalização) são enviados ao provedor uma única vez.
+        A ordem do resultado corresponde à entrada; textos vazios ou que falharam
+        retornam None.
+        """
+        started = time.perf_counter()
+        hashes = [content_hash(t) if t and t.strip() else None for t in texts]
+
+        # Deduplicar preservando a ordem de primeira ocorrência
+        unique: Dict[str, str] = {}
+        for text, digest in zip(texts, hashes):
+            if digest and digest not in unique:
+                unique[digest] = normalize_text(text)
+
+        vectors: Dict[str, List[float]] = {}
+        memory_hits = 0
+        with self._lock:
+            for digest in unique:
+                cached = self.memory_cache.get(digest)
+                if cached is not None:
+                    vectors[digest] = cached
+                    memory_hits += 1
+
+        missing = [d for d in unique if d not in vectors]
+        db_hits = 0
+        if missing and self.use_db_cache:
+            found = self._load_from_db(missing)
+            db_hits = len(found)
+            vectors.update(found)
+            self._remember(found)
+            missing = [d for d in missing if d not in found]
+
+        embedded = {}
+        if missing:
+            embedded = self._embed_missing(missing, unique)
+            vectors.update(embedded)
+            self._remember(embedded)
+            if embedded and self.use_db_cache:
+                self._store_in_db(embedded)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['texts_requested'] += len(texts)
+            self.stats['unique_texts'] += len(unique)
+            self.stats['memory_hits'] += memory_hits
+            self.stats['db_hits'] += db_hits
+            self.stats['embedded'] += len(embedded)
+            self.stats['total_seconds'] += elapsed
+
+        if embedded:
+            rate = len(embedded) / elapsed if elapsed > 0 else 0
+            logger.info(
+                f"Embeddings: {len(texts)} textos | {len(unique)} únicos | "
+                f"{memory_hits + db_hits} do cache | {len(embedded)} gerados | {rate:.1f} textos/s"
+            )
+            print(f"[EMBEDDING] {len(embedded)} gerados, {memory_hits + db_hits} do cache em {elapsed:.2f}s ({rate:.1f} textos/s)")
+
+        return [vectors.get(d) if d else None for d in hashes]
+
+    def _embed_missing(self, missing: List[str], unique: Dict[str, str]) -> Dict[str, List[float]]:
+        """Chama o provedor em lotes de até batch_size textos"""
+        result = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            call_started = time.perf_counter()
+            try:
+                batch_vectors = self.provider.embed([unique[d] for d in batch])
+            except Exception as e:
+                logger.error(f"Erro ao gerar lote de embeddings ({len(batch)} textos): {e}")
+                with self._lock:
+                    self.stats['provider_errors'] += 1
+                continue
+            finally:
+                with self._lock:
+                    self.stats['provider_calls'] += 1
+                    self.stats['provider_seconds'] += time.perf_counter() - call_started
+            result.update(zip(batch, batch_vectors))
+        return result
+
+    def _remember(self, vectors: Dict[str, List[float]]) -> None:
+        if not vectors:
+            return
+        with self._lock:
+            for digest, vector in vectors.items():
+                self.memory_cache[digest] = vector
+
+    def _load_from_db(self, digests: List[str]) -> Dict[str, List[float]]:
+        """Busca vetores já persistidos (uma consulta por bloco de 1000 hashes)"""
+        from app.models.embedding import EmbeddingCache
+        found = {}
+        try:
+            for start in range(0, len(digests), 1000):
+                chunk = digests[start:start + 1000]
+                rows = db.session.execute(
+                    select(EmbeddingCache.content_hash, EmbeddingCache.embedding).where(
+                        EmbeddingCache.model == self.model_key,
+                        EmbeddingCache.content_hash.in_(chunk)
+                    )
+                )
+                for digest, data in rows:
+                    found[digest] = bytes_to_vector(data)
+        except Exception as e:
+            logger.warning(f"Cache de embeddings indisponível para leitura: {e}")
+        return found
+
+    def _store_in_db(self, vectors: Dict[str, List[float]]) -> None:
+        """Persiste novos vetores com insert em lote numa transação própria"""
+        from app.models.embedding import EmbeddingCache
+        rows = [
+            {
+                'content_hash': digest,
+                'model': self.model_key,
+                'dimensions': len(vector),
+                'embedding': vector_to_bytes(vector)
+            }
+            for digest, vector in vectors.items()
+        ]
+        try:
+            engine = db.engine
+            if engine.dialect.name == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as pg_insert
+                stmt = pg_insert(EmbeddingCache).on_conflict_do_nothing(
+                    index_elements=['content_hash', 'model']
+                )
+            else:
+                stmt = insert(EmbeddingCache).prefix_with('OR IGNORE') if engine.dialect.name == 'sqlite' \
+                    else insert(EmbeddingCache)
+            # Transação separada: não interfere na sessão de quem chamou
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar cache de embeddings: {e}")
+
+    def get_statistics(self) -> Dict:
+        """Retorna contadores e throughput do pipeline"""
+        with self._lock:
+            stats = dict(self.stats)
+        requested = stats['texts_requested']
+        stats.update({
+            'provider': self.provider.name,
+            'model': self.provider.model,
+            'batch_size': self.batch_size,
+            'memory_cache_size': len(self.memory_cache),
+            'cache_hit_rate': round((stats['memory_hits'] + stats['db_hits']) / max(stats['unique_texts'], 1), 3),
+            'dedup_ratio': round(1 - stats['unique_texts'] / requested, 3) if requested else 0,
+            'texts_per_second': round(requested / stats['total_seconds'], 1) if stats['total_seconds'] else 0,
+            'embeddings_per_second': round(stats['embedded'] / stats['provider_seconds'], 1) if stats['provider_seconds'] else 0
+        })
+        return stats
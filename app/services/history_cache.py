@@ -0,0 +1,193 @@
+"""
+Cache write-through dos últimos turnos de cada sessão de chat ativa
+
+Evita a consulta de histórico em chat_messages a cada turno:
+- ChatSession.add_message registra a mensagem na sessão do SQLAlchemy; o
+  after_flush captura (id, conteúdo, tipo, data) e o after_commit anexa ao
+  cache. Rollback descarta o que estava pendente
+- Cada entrada guarda as últimas CHAT_HISTORY_TURNS * 2 mensagens como
+  tuplas compactas e o message_count da sessão na última mensagem; se o
+  contador não bater (mensagem gravada por outro worker), a entrada é
+  recarregada do banco
+- Encerramento (mudança de status) ou exclusão da sessão invalida a entrada
+"""
+
+import logging
+import os
+import threading
+from collections import deque, namedtuple
+from typing import Dict, List, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CachedMessage = namedtuple('CachedMessage', 'content message_type created_at')
+
+_PENDING = 'recent_turns_pending'
+_READY = 'recent_turns_ready'
+
+
+class _Entry:
+    __slots__ = ('messages', 'message_count')
+
+    def __init__(self, messages, message_count: int, maxlen: int):
+        self.messages = deque(messages, maxlen=maxlen)
+        self.message_count = message_count
+
+
+def _message_type(message) -> str:
+    return message.message_type.value if hasattr(message.message_type, 'value') else message.message_type
+
+
+class RecentTurnsCache:
+    """Últimas mensagens por sessão, atualizadas no commit"""
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl: Optional[int] = None,
+                 window_messages: Optional[int] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('CHAT_HISTORY_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self._window_messages = window_messages
+        self._entries = TTLCache(
+            maxsize=max_sessions or int(os.getenv('CHAT_HISTORY_CACHE_SESSIONS', '5000')),
+            ttl=ttl or int(os.getenv('CHAT_HISTORY_CACHE_TTL', '3600'))
+        )
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'appends': 0, 'stale': 0, 'invalidations': 0}
+
+    @property
+    def window_messages(self) -> int:
+        if self._window_messages is None:
+            from app.services.conversation_summary import conversation_summarizer
+            return conversation_summarizer.window_messages
+        return self._window_messages
+
+    # === LEITURA ===
+
+    def get_history(self, chat_session, current_message=None) -> List[Dict]:
+        """
+        Histórico recente no formato do pipeline, com a mensagem atual (ainda não commitada) no fim
+
+        Sem entrada válida, consulta o banco uma vez e guarda o resultado.
+        """
+        pending = 1 if current_message is not None else 0
+        committed_count = (chat_session.message_count or 0) - pending
+        with self._lock:
+            entry = self._entries.get(chat_session.id) if self.enabled else None
+            if entry is not None and entry.message_count == committed_count:
+                self.stats['hits'] += 1
+                history = [message._asdict() for message in entry.messages]
+            else:
+                if entry is not None:
+                    self.stats['stale'] += 1
+                self.stats['misses'] += 1
+                history = None
+        if history is None:
+            history = self._load(chat_session.id, current_message, committed_count)
+        if current_message is not None:
+            history.append(self._to_tuple(current_message)._asdict())
+        return history
+
+    def _load(self, session_id: int, current_message, committed_count: int) -> List[Dict]:
+        from app.services.conversation_summary import conversation_summarizer
+        history = conversation_summarizer.recent_history(session_id, extra=1 if current_message is not None else 0)
+        if current_message is not None and history:
+            history = history[:-1]  # A mensagem atual entra no cache só no commit
+        history = history[-self.window_messages:] if self.window_messages else []
+        if self.enabled:
+            with self._lock:
+                self._entries[session_id] = _Entry(
+                    (CachedMessage(m['content'], m['message_type'], m['created_at']) for m in history),
+                    committed_count, self.window_messages
+                )
+        return history
+
+    @staticmethod
+    def _to_tuple(message) -> CachedMessage:
+        created_at = message.created_at.isoformat() if message.created_at else None
+        return CachedMessage(message.content, _message_type(message), created_at)
+
+    # === ESCRITA (write-through) ===
+
+    def stage(self, db_session, message, message_count: int) -> None:
+        """Chamado por ChatSession.add_message: a mensagem entra no cache se o commit ocorrer"""
+        if self.enabled:
+            db_session.info.setdefault(_PENDING, []).append((message, message_count))
+
+    def append(self, session_id: int, message: CachedMessage, message_count: int) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                if message_count == 1:
+                    # Primeira mensagem da sessão: histórico completo conhecido
+                    self._entries[session_id] = _Entry([message], 1, self.window_messages)
+                    self.stats['appends'] += 1
+                return
+            if entry.message_count != message_count - 1:
+                # Buraco na sequência (outro worker gravou): recarrega na próxima leitura
+                self._entries.pop(session_id, None)
+                self.stats['stale'] += 1
+                return
+            entry.messages.append(message)
+            entry.message_count = message_count
+            self.stats['appends'] += 1
+
+    def invalidate(self, session_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(session_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                sessions=len(self._entries),
+                hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else 0.0
+            )
+
+
+# Instância global
+recent_turns_cache = RecentTurnsCache()
+
+
+# === EVENTOS DA SESSÃO DO SQLALCHEMY ===
+
+@event.listens_for(Session, 'after_flush')
+def _capture_flushed(db_session, flush_context):
+    """Captura os valores gravados (id/created_at já preenchidos) antes de expirarem no commit"""
+    from app.models import ChatSession
+
+    ready = db_session.info.setdefault(_READY, [])
+    for message, message_count in db_session.info.pop(_PENDING, []):
+        if message.id is not None:
+            ready.append(('append', message.session_id, recent_turns_cache._to_tuple(message), message_count))
+    for obj in db_session.deleted:
+        if isinstance(obj, ChatSession):
+            ready.append(('invalidate', obj.id, None, None))
+    for obj in db_session.dirty:
+        if isinstance(obj, ChatSession) and inspect(obj).attrs.status.history.has_changes():
+            # Sessão encerrada (ou reaberta): não vale manter a janela em memória
+            ready.append(('invalidate', obj.id, None, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(db_session):
+    for action, session_id, message, message_count in db_session.info.pop(_READY, []):
+        if action == 'append':
+            recent_turns_cache.append(session_id, message, message_count)
+        else:
+            recent_turns_cache.invalidate(session_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(db_session, previous_transaction):
+    if previous_transaction.nested:
+        # Rollback de SAVEPOINT (ex.: consulta do RAG cancelada): o turno continua
+        return
+    db_session.info.pop(_PENDING, None)
+    db_session.info.pop(_READY, None)
@@ -0,0 +1,355 @@
+"""
+Recuperação híbrida (léxica + vetorial) para o SimpleRAG
+
+- Retriever léxico: full-text search do PostgreSQL (índice GIN em português)
+- Retriever vetorial: pgvector sobre conversation_embeddings e training_chunks
+- Os dois rodam em paralelo dentro de um orçamento de latência; se um deles
+  falhar ou estourar o tempo, o resultado do outro é usado sozinho
+- Fusão por Reciprocal Rank Fusion, reforço por avaliação e recência e
+  diversificação MMR para que os exemplos injetados não sejam quase iguais
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.services.deadline import current_deadline
+from app.services.retrieval_state import merge_candidates
+
+logger = logging.getLogger(__name__)
+
+
+# === FUNÇÕES DE RANQUEAMENTO ===
+
+def candidate_key(candidate: Dict):
+    """Identidade de um candidato entre retrievers diferentes"""
+    return (candidate.get('source', 'exchange'), candidate.get('source_id') or candidate.get('user_message'))
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict]], k: int = 60,
+                           key_fn: Callable[[Dict], object] = candidate_key) -> List[Dict]:
+    """
+    Funde listas ranqueadas: score = soma de 1 / (k + posição)
+
+    Candidatos presentes em mais de uma lista somam contribuições; o dicionário
+    da primeira ocorrência é mantido e recebe 'rrf_score' e 'retrievers'.
+    """
+    fused: Dict[object, Dict] = {}
+    for ranked in ranked_lists:
+        for position, candidate in enumerate(ranked, 1):
+            key = key_fn(candidate)
+            entry = fused.get(key)
+            if entry is None:
+                entry = dict(candidate)
+                entry['rrf_score'] = 0.0
+                entry['retrievers'] = []
+                fused[key] = entry
+            entry['rrf_score'] += 1.0 / (k + position)
+            retriever = candidate.get('retriever')
+            if retriever and retriever not in entry['retrievers']:
+                entry['retrievers'].append(retriever)
+    return sorted(fused.values(), key=lambda c: c['rrf_score'], reverse=True)
+
+
+def apply_boosts(candidates: List[Dict], rating_weight: float = 0.3,
+                 recency_weight: float = 0.2, half_life_days: float = 30.0,
+                 now: Optional[datetime] = None) -> List[Dict]:
+    """Reforça o score fundido pela avaliação do usuário e pela recência"""
+    now = now or datetime.now(timezone.utc)
+    for candidate in candidates:
+        score = candidate.get('rrf_score', 0.0)
+        rating = candidate.get('user_rating') or 3
+        score *= 1 + rating_weight * (rating - 3) / 2
+
+        created_at = candidate.get('created_at')
+        if isinstance(created_at, datetime):
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            age_days = max((now - created_at).total_seconds() / 86400, 0)
+            score *= 1 + recency_weight * math.exp(-age_days / half_life_days)
+
+        candidate['relevance_score'] = score
+    return sorted(candidates, key=lambda c: c['relevance_score'], reverse=True)
+
+
+def token_similarity(a: Dict, b: Dict) -> float:
+    """Similaridade de Jaccard entre os textos de dois candidatos"""
+    tokens_a = set(f"{a.get('user_message', '')} {a.get('ai_response', '')}".lower().split())
+    tokens_b = set(f"{b.get('user_message', '')} {b.get('ai_response', '')}".lower().split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def mmr_select(candidates: List[Dict], limit: int, lambda_: float = 0.7,
+               similarity_fn: Callable[[Dict, Dict], float] = token_similarity) -> List[Dict]:
+    """
+    Maximal Marginal Relevance: equilibra relevância e diversidade
+
+    Escolhe iterativamente o candidato que maximiza
+    lambda * relevância - (1 - lambda) * maior similaridade com os já escolhidos.
+    """
+    if len(candidates) <= 1 or limit <= 0:
+        return candidates[:limit]
+    top_score = max(c.get('relevance_score', 0.0) for c in candidates) or 1.0
+    remaining = list(candidates)
+    selected: List[Dict] = []
+    while remaining and len(selected) < limit:
+        best, best_value = None, None
+        for candidate in remaining:
+            relevance = candidate.get('relevance_score', 0.0) / top_score
+            redundancy = max((similarity_fn(candidate, s) for s in selected), default=0.0)
+            value = lambda_ * relevance - (1 - lambda_) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = candidate, value
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+# === RETRIEVER HÍBRIDO ===
+
+# Par (mensagem do usuário, próxima resposta da IA) via LATERAL - uma resposta por mensagem
+_EXCHANGE_SELECT = """
+    cm_user.id as source_id,
+    cm_user.content as user_message,
+    cm_ai.content as ai_response,
+    cs.user_rating,
+    cs.initial_risk_level,
+    cm_ai.created_at
+"""
+
+_NEXT_AI_REPLY = """
+    JOIN LATERAL (
+        SELECT content, created_at FROM chat_messages
+        WHERE session_id = cm_user.session_id
+            AND message_type = 'AI'
+            AND id > cm_user.id
+        ORDER BY id
+        LIMIT 1
+    ) cm_ai ON TRUE
+"""
+
+
+class HybridRetriever:
+    """Executa os retrievers léxico e vetorial em paralelo e funde os resultados"""
+
+    def __init__(self, embedding_service=None, budget_ms: Optional[int] = None,
+                 rrf_k: Optional[int] = None, candidates_per_retriever: int = 20,
+                 mmr_lambda: float = 0.7):
+        self._embedding_service = embedding_service
+        self.budget_ms = budget_ms or int(os.getenv('RAG_HYBRID_BUDGET_MS', '400'))
+        self.rrf_k = rrf_k or int(os.getenv('RAG_RRF_K', '60'))
+        self.candidates_per_retriever = candidates_per_retriever
+        self.mmr_lambda = mmr_lambda
+        # Similaridade mínima com o turno anterior para reaproveitar a busca vetorial
+        self.drift_threshold = float(os.getenv('RAG_DRIFT_THRESHOLD', '0.9'))
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rag-hybrid')
+        self._lock = threading.Lock()
+        self.stats = {
+            'lookups': 0,
+            'hybrid': 0,
+            'degraded_lexical_only': 0,
+            'degraded_vector_only': 0,
+            'empty': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'lexical_skipped': 0,
+            'vector_skipped': 0,
+            'last_latency_ms': 0.0
+        }
+
+    @property
+    def embedding_service(self):
+        """EmbeddingService criado sob demanda (reaproveita o cache por hash)"""
+        if self._embedding_service is None:
+            from app.services.embedding_service import EmbeddingService, create_embedding_provider
+            self._embedding_service = EmbeddingService(provider=create_embedding_provider())
+        return self._embedding_service
+
+    def retrieve(self, user_message: str, keywords: List[str], limit: int = 3,
+                 state=None) -> List[Dict]:
+        """
+        Busca híbrida com orçamento de latência
+
+        Com `state` (SessionRetrievalState), a busca é incremental: o retriever
+        léxico consulta só as palavras-chave novas e o vetorial só roda quando o
+        embedding se afasta do turno anterior; os candidatos são unidos aos
+        anteriores e reranqueados.
+
+        Returns:
+            Até `limit` candidatos diversificados, com relevance_score
+        """
+        started = time.perf_counter()
+        app = current_app._get_current_object()
+        budget = self.budget_ms / 1000.0
+        turn_deadline = current_deadline()
+        if turn_deadline is not None:
+            # O orçamento do híbrido nunca passa do prazo do turno do chat
+            budget = min(budget, turn_deadline.remaining())
+        deadline = started + budget
+
+        lexical_keywords = state.new_keywords(keywords) if state is not None else keywords
+        futures = {
+            self._executor.submit(self._run_in_context, app, self.vector_search, user_message, deadline, state): 'vector'
+        }
+        if lexical_keywords or state is None:
+            futures[self._executor.submit(
+                self._run_in_context, app, self.lexical_search, lexical_keywords, deadline)] = 'lexical'
+        else:
+            self._count('lexical_skipped')
+        done, not_done = wait(futures, timeout=budget)
+
+        results = {}
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.warning(f"Retriever {name} falhou: {e}")
+                self._count('errors')
+        for future in not_done:
+            future.cancel()
+            logger.warning(f"Retriever {futures[future]} excedeu o orçamento de {self.budget_ms}ms")
+            self._count('timeouts')
+
+        lexical = results.get('lexical') or []
+        vector = results.get('vector') or []
+        if state is not None:
+            if 'lexical' in results:
+                state.keywords.update(lexical_keywords)
+            lexical = merge_candidates(state.lexical, lexical, candidate_key, 'lexical_rank',
+                                       self.candidates_per_retriever * 2)
+            state.lexical = lexical
+            if 'vector' in results and results['vector'] is None:
+                # Sem drift: reaproveita o ranking vetorial do turno anterior
+                vector = state.vector
+                self._count('vector_skipped')
+            elif vector:
+                state.vector = vector
+
+        if lexical and vector:
+            self._count('hybrid')
+        elif lexical:
+            self._count('degraded_lexical_only')
+        elif vector:
+            self._count('degraded_vector_only')
+        else:
+            self._count('empty')
+
+        fused = reciprocal_rank_fusion([r for r in (lexical, vector) if r], k=self.rrf_k)
+        boosted = apply_boosts(fused)
+        selected = mmr_select(boosted, limit, lambda_=self.mmr_lambda)
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats['lookups'] += 1
+            self.stats['last_latency_ms'] = round(latency_ms, 1)
+        print(f"[RAG] Híbrido: {len(lexical)} léxicos + {len(vector)} vetoriais -> {len(selected)} em {latency_ms:.0f}ms")
+        return selected
+
+    def _run_in_context(self, app, fn, *args):
+        """Executa um retriever em thread própria com app context (sessão própria)"""
+        with app.app_context():
+            return fn(*args)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _set_statement_timeout(self, db, deadline: float) -> None:
+        """Limita a consulta ao tempo restante do orçamento (SET LOCAL vale só nesta transação)"""
+        remaining_ms = max(int((deadline - time.perf_counter()) * 1000), 1)
+        db.session.execute(text(f"SET LOCAL statement_timeout = {remaining_ms}"))
+
+    def lexical_search(self, keywords: List[str], deadline: float) -> List[Dict]:
+        """Full-text search (to_tsvector português) sobre mensagens de usuários"""
+        from app import db
+        terms = [k for k in keywords if len(k) > 3 and k.isalpha()]
+        if not terms:
+            return []
+        self._set_statement_timeout(db, deadline)
+        query = text(f"""
+            SELECT {_EXCHANGE_SELECT},
+                ts_rank_cd(to_tsvector('portuguese', cm_user.content), q.query) as lexical_rank
+            FROM chat_messages cm_user
+            CROSS JOIN to_tsquery('portuguese', :tsquery) q(query)
+            JOIN chat_sessions cs ON cs.id = cm_user.session_id
+            {_NEXT_AI_REPLY}
+            WHERE cm_user.message_type = 'USER'
+                AND to_tsvector('portuguese', cm_user.content) @@ q.query
+                AND LENGTH(cm_user.content) > 10
+                AND LENGTH(cm_ai.content) > 20
+            ORDER BY lexical_rank DESC
+            LIMIT :limit
+        """)
+        rows = db.session.execute(query, {
+            'tsquery': ' | '.join(terms),
+            'limit': self.candidates_per_retriever
+        })
+        return [dict(row._mapping, source='exchange', retriever='lexical') for row in rows]
+
+    def vector_search(self, user_message: str, deadline: float, state=None) -> Optional[List[Dict]]:
+        """
+        Busca por similaridade (cosseno) em trocas e trechos de treinamento
+
+        Retorna None quando o estado da sessão indica que não houve drift
+        (a consulta anterior continua válida).
+        """
+        from app import db
+        from app.services.embedding_service import vector_to_pg
+        embedding = self.embedding_service.embed_text(user_message)
+        if not embedding:
+            return []
+        if state is not None:
+            if not state.has_drifted(embedding, self.drift_threshold):
+                return None
+        self._set_statement_timeout(db, deadline)
+        params = {'embedding': vector_to_pg(embedding), 'limit': self.candidates_per_retriever}
+
+        exchanges = db.session.execute(text(f"""
+            SELECT {_EXCHANGE_SELECT},
+                ce.embedding <=> CAST(:embedding AS vector) as distance
+            FROM conversation_embeddings ce
+            JOIN chat_messages cm_user ON cm_user.id = ce.chat_message_id
+            JOIN chat_sessions cs ON cs.id = cm_user.session_id
+            {_NEXT_AI_REPLY}
+            ORDER BY ce.embedding <=> CAST(:embedding AS vector)
+            LIMIT :limit
+        """), params)
+        candidates = [dict(row._mapping, source='exchange', retriever='vector') for row in exchanges]
+
+        training = db.session.execute(text("""
+            SELECT tc.id as source_id,
+                td.title as user_message,
+                LEFT(tc.content, 600) as ai_response,
+                ROUND(COALESCE(td.validation_score, 1.0) * 5) as user_rating,
+                NULL as initial_risk_level,
+                td.created_at,
+                tc.embedding <=> CAST(:embedding AS vector) as distance
+            FROM training_chunks tc
+            JOIN training_data td ON td.id = tc.training_data_id
+            WHERE tc.embedding IS NOT NULL
+                AND td.status IN ('APPROVED', 'PROCESSED')
+            ORDER BY tc.embedding <=> CAST(:embedding AS vector)
+            LIMIT :limit
+        """), params)
+        candidates.extend(dict(row._mapping, source='training', retriever='vector') for row in training)
+
+        candidates.sort(key=lambda c: c['distance'])
+        if state is not None and candidates:
+            state.embedding = embedding
+        return candidates[:self.candidates_per_retriever]
+
+    def get_statistics(self) -> Dict:
+        """Contadores de uso e de degradação"""
+        with self._lock:
+            return dict(self.stats, budget_ms=self.budget_ms, rrf_k=self.rrf_k)
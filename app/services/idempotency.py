@@ -0,0 +1,269 @@
+"""
+Requisições idempotentes pelo header Idempotency-Key
+
+Clientes móveis repetem /api/chat/send em redes instáveis; sem isso cada
+repetição grava outra ChatMessage e paga outra chamada ao LLM.
+- A primeira requisição com a chave reivindica a linha (usuário, chave) em
+  idempotency_keys (constraint única) e grava a resposta ao terminar
+- Repetições concluídas recebem a resposta gravada (Idempotent-Replayed: true)
+- Repetições concorrentes esperam a requisição em andamento (single-flight:
+  Event no processo, polling da linha entre processos) e recebem a mesma resposta
+- A mesma chave com outro corpo é rejeitada (422); respostas 5xx não são
+  gravadas, para que a repetição tente de novo
+- As chaves expiram após IDEMPOTENCY_TTL segundos
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+from flask import current_app, jsonify, make_response, request
+from flask_login import current_user
+from sqlalchemy import text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 128
+
+
+def request_fingerprint(body: bytes) -> str:
+    """sha256 do corpo: detecta a mesma chave usada com outra requisição"""
+    return hashlib.sha256(body or b'').hexdigest()
+
+
+class IdempotencyConflict(Exception):
+    """Chave já usada com outro corpo ou outro endpoint"""
+
+
+class IdempotencyInProgress(Exception):
+    """A requisição original ainda não terminou (ou falhou) dentro da espera"""
+
+
+class IdempotencyStore:
+    """Reivindica, espera e reproduz respostas por (usuário, chave)"""
+
+    def __init__(self, ttl: Optional[int] = None, wait_timeout: Optional[float] = None,
+                 enabled: Optional[bool] = None, poll_interval: float = 0.2):
+        if enabled is None:
+            enabled = os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self.ttl = ttl or int(os.getenv('IDEMPOTENCY_TTL', '3600'))
+        self.wait_timeout = wait_timeout or float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '30'))
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple, threading.Event] = {}
+        # Respostas recentes deste processo: replays sem ida ao banco
+        self._local = TTLCache(maxsize=2048, ttl=self.ttl)
+        self.stats = {'executed': 0, 'replayed': 0, 'coalesced': 0, 'conflicts': 0,
+                      'in_progress': 0, 'store_errors': 0}
+
+    def run(self, user_id: int, key: str, endpoint: str, fingerprint: str,
+            execute: Callable[[], Tuple[str, int]]) -> Tuple[str, int, bool]:
+        """
+        Executa `execute` uma única vez por (usuário, chave)
+
+        Returns:
+            (corpo, status HTTP, replayed)
+        """
+        local_key = (user_id, key)
+        with self._lock:
+            event = self._inflight.get(local_key)
+            leader = event is None
+            if leader:
+                event = self._inflight[local_key] = threading.Event()
+
+        if not leader:
+            # Mesma chave em andamento neste processo: espera a original
+            self._count('coalesced')
+            event.wait(self.wait_timeout)
+            return self._replay(user_id, key, endpoint, fingerprint)
+
+        try:
+            cached = self._local.get(local_key)
+            if cached is not None:
+                return self._check_and_replay(cached, endpoint, fingerprint)
+            try:
+                claimed = self._claim(user_id, key, endpoint, fingerprint)
+            except Exception as e:
+                # Tabela indisponível: segue sem idempotência entre processos
+                self._count('store_errors')
+                logger.warning(f"Idempotência indisponível, executando sem gravar: {e}")
+                claimed = None
+            if claimed is False:
+                # Outro processo reivindicou (ou já concluiu) esta chave
+                return self._replay(user_id, key, endpoint, fingerprint)
+
+            try:
+                body, status = execute()
+            except Exception:
+                if claimed:
+                    self._release(user_id, key)
+                raise
+            self._count('executed')
+            if status >= 500:
+                if claimed:
+                    self._release(user_id, key)
+            else:
+                self._local[local_key] = {'endpoint': endpoint, 'request_hash': fingerprint,
+                                          'status': 'done', 'response_status': status, 'response_body': body}
+                if claimed:
+                    self._complete(user_id, key, status, body)
+            return body, status, False
+        finally:
+            with self._lock:
+                self._inflight.pop(local_key, None)
+            event.set()
+
+    # === REPLAY ===
+
+    def _replay(self, user_id: int, key: str, endpoint: str, fingerprint: str) -> Tuple[str, int, bool]:
+        """Espera a resposta da requisição original (polling da linha) e a devolve"""
+        give_up_at = time.monotonic() + self.wait_timeout
+        while True:
+            record = self._local.get((user_id, key))
+            if record is None:
+                try:
+                    record = self._lookup(user_id, key)
+                except Exception as e:
+                    self._count('store_errors')
+                    logger.warning(f"Erro ao consultar chave idempotente ({key}): {e}")
+                    raise IdempotencyInProgress(key)
+            if record is None:
+                # A original falhou e liberou a chave: o cliente deve repetir
+                self._count('in_progress')
+                raise IdempotencyInProgress(key)
+            if record['status'] == 'done' or time.monotonic() >= give_up_at:
+                return self._check_and_replay(record, endpoint, fingerprint)
+            time.sleep(self.poll_interval)
+
+    def _check_and_replay(self, record: Dict, endpoint: str, fingerprint: str) -> Tuple[str, int, bool]:
+        if record['endpoint'] != endpoint or record['request_hash'] != fingerprint:
+            self._count('conflicts')
+            raise IdempotencyConflict(record['endpoint'])
+        if record['status'] != 'done':
+            self._count('in_progress')
+            raise IdempotencyInProgress(record['endpoint'])
+        self._count('replayed')
+        return record['response_body'], record['response_status'], True
+
+    # === BANCO (conexão própria, fora da transação da requisição) ===
+
+    def _claim(self, user_id: int, key: str, endpoint: str, fingerprint: str) -> bool:
+        """INSERT da chave; uma linha expirada é reaproveitada. True = esta requisição é a dona"""
+        with db.engine.begin() as conn:
+            row = conn.execute(text("""
+                INSERT INTO idempotency_keys
+                    (user_id, idempotency_key, endpoint, request_hash, status, created_at, expires_at)
+                VALUES (:user_id, :key, :endpoint, :hash, 'processing', NOW(),
+                        NOW() + make_interval(secs => :ttl))
+                ON CONFLICT (user_id, idempotency_key) DO UPDATE
+                    SET endpoint = EXCLUDED.endpoint,
+                        request_hash = EXCLUDED.request_hash,
+                        status = 'processing',
+                        response_status = NULL,
+                        response_body = NULL,
+                        created_at = NOW(),
+                        expires_at = EXCLUDED.expires_at
+                    WHERE idempotency_keys.expires_at < NOW()
+                RETURNING id
+            """), {'user_id': user_id, 'key': key, 'endpoint': endpoint,
+                   'hash': fingerprint, 'ttl': self.ttl}).first()
+        return row is not None
+
+    def _lookup(self, user_id: int, key: str) -> Optional[Dict]:
+        with db.engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT endpoint, request_hash, status, response_status, response_body
+                FROM idempotency_keys
+                WHERE user_id = :user_id AND idempotency_key = :key AND expires_at >= NOW()
+            """), {'user_id': user_id, 'key': key}).first()
+        return dict(row._mapping) if row else None
+
+    def _complete(self, user_id: int, key: str, status: int, body: str) -> None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text("""
+                    UPDATE idempotency_keys
+                    SET status = 'done', response_status = :status, response_body = :body
+                    WHERE user_id = :user_id AND idempotency_key = :key
+                """), {'user_id': user_id, 'key': key, 'status': status, 'body': body})
+        except Exception as e:
+            self._count('store_errors')
+            logger.error(f"Erro ao gravar resposta idempotente ({key}): {e}")
+
+    def _release(self, user_id: int, key: str) -> None:
+        """Apaga a reivindicação de uma requisição que falhou (a repetição executa de novo)"""
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text("""
+                    DELETE FROM idempotency_keys
+                    WHERE user_id = :user_id AND idempotency_key = :key AND status = 'processing'
+                """), {'user_id': user_id, 'key': key})
+        except Exception as e:
+            self._count('store_errors')
+            logger.error(f"Erro ao liberar chave idempotente ({key}): {e}")
+
+    def purge_expired(self) -> int:
+        """Remove chaves expiradas (chamado pela limpeza periódica do worker)"""
+        deleted = db.session.execute(text("DELETE FROM idempotency_keys WHERE expires_at < NOW()")).rowcount
+        db.session.commit()
+        return deleted
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, enabled=self.enabled, ttl=self.ttl, in_flight=len(self._inflight))
+
+
+# Instância global
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(endpoint: str):
+    """
+    Decorator de rota: aplica Idempotency-Key (opcional) por usuário logado
+
+    Usar abaixo de @login_required. Sem o header a rota roda normalmente.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # ensure_sync: também aceita views async (executadas via asgiref)
+            call_view = current_app.ensure_sync(view)
+            key = request.headers.get('Idempotency-Key', '').strip()
+            if not key or not idempotency_store.enabled:
+                return call_view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'error': 'Idempotency-Key muito longa'}), 400
+
+            def execute():
+                response = make_response(call_view(*args, **kwargs))
+                return response.get_data(as_text=True), response.status_code
+
+            try:
+                body, status, replayed = idempotency_store.run(
+                    current_user.id, key, endpoint, request_fingerprint(request.get_data()), execute)
+            except IdempotencyConflict:
+                return jsonify({'success': False, 'error': 'Idempotency-Key já usada com outra requisição'}), 422
+            except IdempotencyInProgress:
+                response = jsonify({'success': False, 'error': 'Requisição original ainda em andamento'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+
+            response = current_app.response_class(body, status=status, mimetype='application/json')
+            response.headers['Idempotency-Key'] = key
+            if replayed:
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,430 @@
+"""
+Fila de jobs durável no PostgreSQL
+
+Tira do caminho da requisição o trabalho não crítico (análise do diário,
+ingestão de treinamento, embeddings de conversas, datasets de fine-tuning).
+- Tabela `jobs`; workers reivindicam com FOR UPDATE SKIP LOCKED, então vários
+  nós/processos/threads consomem a mesma fila sem infraestrutura extra
+- Prioridade (maior primeiro), novas tentativas com backoff exponencial e
+  visibility timeout: job de um worker que morreu volta para a fila
+- `flask worker` roda workers dedicados; o processo web pode rodar workers
+  embutidos (JOB_EMBEDDED_WORKERS) para implantações de um único serviço.
+  Com workers gevent o padrão é 0: o worker embutido seria um greenlet, e um
+  handler CPU-bound (ingestão de PDF/DOCX, embeddings locais) travaria o hub e
+  todos os turnos do chat daquele processo até o fim do job
+- Com JOB_QUEUE_ENABLED=false os jobs rodam num pool de threads local (sem
+  durabilidade), como antes
+"""
+
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempts: int, base: float = 10.0, cap: float = 3600.0, jitter: float = 0.2) -> float:
+    """Atraso (s) antes da próxima tentativa: base * 2^(tentativas-1), limitado, com jitter"""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * (1 + random.uniform(-jitter, jitter))
+
+
+@dataclass
+class TaskSpec:
+    """Handler registrado para um tipo de job"""
+    name: str
+    handler: Callable[[Dict], Optional[Dict]]
+    priority: int = 0
+    max_attempts: int = 5
+    timeout: int = 300  # Visibility timeout (s)
+
+
+@dataclass
+class ClaimedJob:
+    id: int
+    kind: str
+    payload: Dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """Registro de handlers, enfileiramento e processamento de jobs"""
+
+    def __init__(self, enabled: Optional[bool] = None, visibility_timeout: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_cap: Optional[float] = None):
+        if enabled is None:
+            enabled = os.getenv('JOB_QUEUE_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self.visibility_timeout = visibility_timeout or int(os.getenv('JOB_VISIBILITY_TIMEOUT', '300'))
+        self.backoff_base = backoff_base or float(os.getenv('JOB_BACKOFF_BASE', '10'))
+        self.backoff_cap = backoff_cap or float(os.getenv('JOB_BACKOFF_CAP', '3600'))
+        self.tasks: Dict[str, TaskSpec] = {}
+        self._local_executor = None
+        self._lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'inline': 0}
+
+    # === REGISTRO ===
+
+    def task(self, name: str, priority: int = 0, max_attempts: int = 5, timeout: Optional[int] = None):
+        """Decorator que registra um handler: handler(payload) -> dict opcional"""
+        def decorator(handler):
+            self.tasks[name] = TaskSpec(name, handler, priority, max_attempts,
+                                        timeout or self.visibility_timeout)
+            return handler
+        return decorator
+
+    # === ENFILEIRAMENTO ===
+
+    def enqueue(self, kind: str, payload: Optional[Dict] = None, priority: Optional[int] = None,
+                delay: float = 0, max_attempts: Optional[int] = None, commit: bool = True) -> Optional[int]:
+        """
+        Enfileira um job (requer app context)
+
+        Com commit=False o job entra na transação corrente e só fica visível
+        aos workers quando quem chamou fizer commit.
+
+        Returns:
+            Id do job, ou None quando a fila está desativada (execução local)
+        """
+        spec = self.tasks.get(kind)
+        if spec is None:
+            raise ValueError(f"Tipo de job não registrado: {kind}")
+        payload = payload or {}
+
+        if not self.enabled:
+            self._run_locally(spec, payload)
+            return None
+
+        from app.models import Job
+        job = Job(
+            kind=kind,
+            payload=json.dumps(payload, ensure_ascii=False),
+            priority=spec.priority if priority is None else priority,
+            max_attempts=max_attempts or spec.max_attempts
+        )
+        if delay:
+            job.run_at = db.session.execute(
+                text("SELECT NOW() + make_interval(secs => :delay)"), {'delay': delay}
+            ).scalar()
+        db.session.add(job)
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        with self._lock:
+            self.stats['enqueued'] += 1
+        print(f"[JOBS] {kind} #{job.id} enfileirado")
+        return job.id
+
+    def _run_locally(self, spec: TaskSpec, payload: Dict) -> None:
+        with self._lock:
+            if self._local_executor is None:
+                self._local_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='jobs-local')
+            self.stats['inline'] += 1
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    spec.handler(payload)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erro no job local {spec.name}: {e}")
+
+        self._local_executor.submit(run)
+
+    # === PROCESSAMENTO ===
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[ClaimedJob]:
+        """
+        Reivindica até `limit` jobs elegíveis
+
+        Elegíveis: na fila com run_at vencido, ou em execução com o lock
+        expirado (worker morreu). SKIP LOCKED evita que dois workers peguem o
+        mesmo job e que um espere pelo outro.
+        """
+        rows = db.session.execute(text("""
+            WITH next AS (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND run_at <= NOW())
+                   OR (status = 'running' AND locked_until < NOW())
+                ORDER BY priority DESC, run_at, id
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE jobs j
+            SET status = 'running',
+                attempts = j.attempts + 1,
+                locked_by = :worker_id,
+                locked_until = NOW() + make_interval(secs => :timeout)
+            FROM next
+            WHERE j.id = next.id
+            RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts
+        """), {'limit': limit, 'worker_id': worker_id, 'timeout': self.visibility_timeout}).all()
+        db.session.commit()
+
+        claimed = []
+        for row in rows:
+            spec = self.tasks.get(row.kind)
+            if spec and spec.timeout != self.visibility_timeout:
+                # Timeout específico do tipo (ex.: ingestão de PDFs grandes)
+                db.session.execute(text("""
+                    UPDATE jobs SET locked_until = NOW() + make_interval(secs => :timeout)
+                    WHERE id = :id AND locked_by = :worker_id
+                """), {'id': row.id, 'timeout': spec.timeout, 'worker_id': worker_id})
+                db.session.commit()
+            claimed.append(ClaimedJob(row.id, row.kind, json.loads(row.payload or '{}'),
+                                      row.attempts, row.max_attempts))
+        return claimed
+
+    def process_next(self, worker_id: str) -> bool:
+        """Reivindica e executa um job; False quando a fila está vazia"""
+        jobs = self.claim(worker_id)
+        if not jobs:
+            return False
+        self.execute(jobs[0], worker_id)
+        return True
+
+    def execute(self, job: ClaimedJob, worker_id: str) -> None:
+        spec = self.tasks.get(job.kind)
+        if spec is None:
+            self._fail(job, worker_id, f"Tipo de job não registrado: {job.kind}", final=True)
+            return
+        if job.attempts > job.max_attempts:
+            # Lock expirou depois da última tentativa permitida
+            self._fail(job, worker_id, 'Tentativas esgotadas (visibility timeout)', final=True)
+            return
+
+        started = time.perf_counter()
+        lease = self._hold_lease(job, worker_id, spec.timeout, db.engine)
+        try:
+            result = spec.handler(job.payload)
+        except Exception as e:
+            db.session.rollback()
+            self._fail(job, worker_id, f"{type(e).__name__}: {e}",
+                       final=job.attempts >= job.max_attempts)
+            return
+        finally:
+            lease.set()
+
+        db.session.execute(text("""
+            UPDATE jobs
+            SET status = 'done', result = :result, finished_at = NOW(),
+                locked_until = NULL, last_error = NULL
+            WHERE id = :id AND locked_by = :worker_id
+        """), {'id': job.id, 'worker_id': worker_id,
+               'result': json.dumps(result, ensure_ascii=False, default=str) if result is not None else None})
+        db.session.commit()
+        with self._lock:
+            self.stats['completed'] += 1
+        print(f"[JOBS] {job.kind} #{job.id} concluído em {time.perf_counter() - started:.2f}s")
+
+    def _hold_lease(self, job: ClaimedJob, worker_id: str, timeout: float, engine) -> threading.Event:
+        """
+        Renova locked_until a cada timeout/3 enquanto o handler roda
+
+        Sem isso, um job longo (ingestão, dataset) que passasse do visibility
+        timeout seria reivindicado e executado de novo por outro worker. O lock
+        só expira de fato quando o worker morre. Retorna o Event que encerra
+        a renovação.
+        """
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(timeout / 3):
+                try:
+                    self._renew_lease(engine, job.id, worker_id, timeout)
+                except Exception as e:
+                    logger.warning(f"Falha ao renovar o lock do job #{job.id}: {e}")
+
+        threading.Thread(target=renew, name=f'job-lease-{job.id}', daemon=True).start()
+        return stop
+
+    def _renew_lease(self, engine, job_id: int, worker_id: str, timeout: float) -> None:
+        # Conexão própria: a sessão do handler pode estar no meio de uma transação
+        with engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE jobs SET locked_until = NOW() + make_interval(secs => :timeout)
+                WHERE id = :id AND locked_by = :worker_id AND status = 'running'
+            """), {'id': job_id, 'worker_id': worker_id, 'timeout': timeout})
+
+    def _fail(self, job: ClaimedJob, worker_id: str, error: str, final: bool) -> None:
+        if final:
+            db.session.execute(text("""
+                UPDATE jobs
+                SET status = 'failed', last_error = :error, finished_at = NOW(), locked_until = NULL
+                WHERE id = :id AND locked_by = :worker_id
+            """), {'id': job.id, 'worker_id': worker_id, 'error': error})
+        else:
+            db.session.execute(text("""
+                UPDATE jobs
+                SET status = 'queued', last_error = :error, locked_until = NULL, locked_by = NULL,
+                    run_at = NOW() + make_interval(secs => :delay)
+                WHERE id = :id AND locked_by = :worker_id
+            """), {'id': job.id, 'worker_id': worker_id, 'error': error,
+                   'delay': backoff_delay(job.attempts, self.backoff_base, self.backoff_cap)})
+        db.session.commit()
+        with self._lock:
+            self.stats['failed' if final else 'retried'] += 1
+        logger.warning(f"Job {job.kind} #{job.id} falhou (tentativa {job.attempts}/{job.max_attempts}): {error}")
+
+    def purge(self, older_than_days: int = 7) -> int:
+        """Remove jobs concluídos antigos"""
+        deleted = db.session.execute(text("""
+            DELETE FROM jobs
+            WHERE status = 'done' AND finished_at < NOW() - make_interval(days => :days)
+        """), {'days': older_than_days}).rowcount
+        db.session.commit()
+        return deleted
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        from app.models import Job
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return None
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'attempts': job.attempts,
+            'last_error': job.last_error,
+            'result': json.loads(job.result) if job.result else None,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def get_statistics(self) -> Dict:
+        """Contadores locais e situação da fila no banco"""
+        with self._lock:
+            stats = dict(self.stats, enabled=self.enabled, tasks=sorted(self.tasks))
+        if self.enabled:
+            try:
+                rows = db.session.execute(text("""
+                    SELECT status, COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(run_at))
+                    FROM jobs WHERE status IN ('queued', 'running', 'failed')
+                    GROUP BY status
+                """)).all()
+                stats['queue'] = {status: count for status, count, _ in rows}
+                oldest = next((age for status, _, age in rows if status == 'queued'), None)
+                stats['oldest_queued_seconds'] = round(float(oldest), 1) if oldest is not None else 0
+            except Exception as e:
+                db.session.rollback()
+                stats['queue_error'] = str(e)
+        return stats
+
+
+class JobWorker:
+    """Threads que consomem a fila até receber stop()"""
+
+    def __init__(self, app, queue: Optional[JobQueue] = None, threads: int = 1,
+                 poll_interval: Optional[float] = None, name: Optional[str] = None):
+        self.app = app
+        self.queue = queue or job_queue
+        self.threads = threads
+        self.poll_interval = poll_interval or float(os.getenv('JOB_POLL_INTERVAL', '2'))
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> 'JobWorker':
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._loop, args=(f"{self.name}:{index}",),
+                                      name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[JOBS] {self.threads} worker(s) iniciado(s) em {self.name}")
+        return self
+
+    def run_forever(self) -> None:
+        """Roda em primeiro plano até SIGINT/SIGTERM"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self._stop.set())
+        self.start()
+        last_purge = 0.0
+        while not self._stop.wait(1):
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                try:
+                    with self.app.app_context():
+                        self.queue.purge()
+                        # Chaves de idempotência expiradas (Idempotency-Key)
+                        from app.services.idempotency import idempotency_store
+                        idempotency_store.purge_expired()
+                except Exception as e:
+                    logger.warning(f"Erro ao limpar jobs antigos: {e}")
+        self.stop()
+
+    def stop(self, timeout: float = 30) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self, worker_id: str) -> None:
+        errors = 0
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.queue.process_next(worker_id)
+                errors = 0
+            except Exception as e:
+                # Banco fora do ar ou tabela ainda não migrada: espera crescente
+                errors += 1
+                processed = False
+                if errors == 1 or errors % 30 == 0:
+                    logger.warning(f"Worker {worker_id} sem acesso à fila: {e}")
+            if not processed:
+                wait = self.poll_interval * min(errors + 1, 30)
+                self._stop.wait(wait * random.uniform(0.8, 1.2))
+
+
+def run_worker_process(threads: int) -> None:
+    """Ponto de entrada de um processo worker (multiprocessing com spawn)"""
+    from app import create_app
+    JobWorker(create_app(), threads=threads).run_forever()
+
+
+def _gevent_patched() -> bool:
+    """True quando o processo roda sob gevent (threading substituído por greenlets)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def start_job_workers(app) -> Optional[JobWorker]:
+    """
+    Workers embutidos no processo web (JOB_EMBEDDED_WORKERS; 0 desativa)
+
+    Chamado só por start_background_services (worker do gunicorn), nunca em
+    comandos de CLI: um processo curto poderia reivindicar um job e sair.
+    Sem JOB_EMBEDDED_WORKERS definido: 1 thread, ou nenhuma sob gevent (os
+    jobs ficam para o processo `flask worker`).
+    """
+    threads = app.config.get('JOB_EMBEDDED_WORKERS')
+    if threads is None:
+        threads = 0 if _gevent_patched() else 1
+        if threads == 0 and job_queue.enabled and not app.config.get('TESTING'):
+            logger.warning("Worker gevent: jobs não rodam no processo web; inicie `flask worker`")
+            print("[JOBS] Worker gevent: sem workers embutidos (use o processo `flask worker`)")
+    if app.config.get('TESTING') or not job_queue.enabled or threads <= 0:
+        return None
+    return JobWorker(app, threads=threads).start()
+
+
+# Instância global
+job_queue = JobQueue()
@@ -0,0 +1,248 @@
+"""
+Controle de admissão das chamadas ao LLM por prioridade de risco
+
+Limita as requisições simultâneas ao provedor e organiza a espera numa fila
+de prioridade pelo nível de risco (RiskAnalyzer):
+- critical e high passam na frente e podem usar vagas reservadas
+- com a fila cheia, as mensagens de menor risco são descartadas primeiro
+- cada nível tem um tempo máximo de espera; quem é descartado ou expira
+  recebe LLMAdmissionRejected e o chamador usa a resposta de fallback
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Menor valor = maior prioridade
+RISK_PRIORITY = {'critical': 0, 'high': 1, 'moderate': 2, 'low': 3}
+
+DEFAULT_QUEUE_TIMEOUTS = 'low=5,moderate=10,high=30,critical=60'
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """'low=5,high=30' -> {'low': 5.0, 'high': 30.0}"""
+    timeouts = {}
+    for item in spec.split(','):
+        if '=' in item:
+            level, seconds = item.split('=', 1)
+            timeouts[level.strip()] = float(seconds)
+    return timeouts
+
+
+def _percentile(samples, percentile: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class LLMAdmissionRejected(Exception):
+    """Chamada ao LLM não admitida (fila cheia ou tempo de espera esgotado)"""
+
+    def __init__(self, risk_level: str, reason: str):
+        super().__init__(f"Chamada ao LLM ({risk_level}) não admitida: {reason}")
+        self.risk_level = risk_level
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ('priority', 'risk_level', 'event', 'admitted', 'shed')
+
+    def __init__(self, priority: int, risk_level: str):
+        self.priority = priority
+        self.risk_level = risk_level
+        self.event = threading.Event()
+        self.admitted = False
+        self.shed = False
+
+
+class LLMAdmissionController:
+    """Semáforo com fila de prioridade por nível de risco"""
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                 reserved_slots: Optional[int] = None, timeouts: Optional[Dict[str, float]] = None):
+        self.max_in_flight = max_in_flight or int(os.getenv('LLM_MAX_IN_FLIGHT', '8'))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('LLM_MAX_QUEUE', '32'))
+        # Vagas extras que só high/critical podem ocupar
+        self.reserved_slots = reserved_slots if reserved_slots is not None else int(os.getenv('LLM_RESERVED_SLOTS', '2'))
+        self.timeouts = parse_timeouts(DEFAULT_QUEUE_TIMEOUTS)
+        self.timeouts.update(timeouts or parse_timeouts(os.getenv('LLM_QUEUE_TIMEOUTS', '')))
+        self._lock = threading.Lock()
+        self._heap = []  # (prioridade, ordem de chegada, waiter)
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.stats = {level: {'admitted': 0, 'queued': 0, 'shed': 0, 'timed_out': 0, 'max_wait_ms': 0.0}
+                      for level in RISK_PRIORITY}
+        self._waits = {level: deque(maxlen=500) for level in RISK_PRIORITY}
+        self.max_queue_depth = 0
+
+    @staticmethod
+    def _level(risk_level: Optional[str]) -> str:
+        return risk_level if risk_level in RISK_PRIORITY else 'low'
+
+    def _capacity(self, priority: int) -> int:
+        if priority <= RISK_PRIORITY['high']:
+            return self.max_in_flight + self.reserved_slots
+        return self.max_in_flight
+
+    def queue_timeout(self, risk_level: Optional[str]) -> float:
+        """Espera máxima na fila configurada para o nível de risco"""
+        return self.timeouts.get(self._level(risk_level), 10)
+
+    def acquire(self, risk_level: Optional[str] = 'low', timeout: Optional[float] = None) -> None:
+        """Aguarda uma vaga; levanta LLMAdmissionRejected se descartado ou expirado"""
+        level = self._level(risk_level)
+        priority = RISK_PRIORITY[level]
+        started = time.perf_counter()
+
+        with self._lock:
+            # Entrada direta: há vaga e ninguém de prioridade igual ou maior esperando
+            if self.in_flight < self._capacity(priority) and not self._has_waiter_at_least(priority):
+                self.in_flight += 1
+                self._record_admission(level, 0.0)
+                return
+
+            if len(self._heap) >= self.max_queue:
+                victim = self._lowest_priority_waiter()
+                if victim is None or victim.priority <= priority:
+                    self.stats[level]['shed'] += 1
+                    raise LLMAdmissionRejected(level, 'fila cheia')
+                # Descarta o de menor risco para abrir espaço
+                self._remove(victim)
+                victim.shed = True
+                victim.event.set()
+                self.stats[victim.risk_level]['shed'] += 1
+
+            waiter = _Waiter(priority, level)
+            heapq.heappush(self._heap, (priority, next(self._sequence), waiter))
+            self.stats[level]['queued'] += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._heap))
+
+        wait = timeout if timeout is not None else self.queue_timeout(level)
+        waiter.event.wait(wait)
+
+        with self._lock:
+            if waiter.admitted:
+                self._record_admission(level, (time.perf_counter() - started) * 1000)
+                return
+            if not waiter.shed:
+                self._remove(waiter)
+                self.stats[level]['timed_out'] += 1
+                raise LLMAdmissionRejected(level, f'espera maior que {wait:.0f}s')
+        raise LLMAdmissionRejected(level, 'descartado por prioridade')
+
+    def release(self) -> None:
+        """Libera a vaga e entrega ao próximo da fila (maior risco primeiro)"""
+        with self._lock:
+            self.in_flight -= 1
+            while self._heap:
+                priority, _, waiter = self._heap[0]
+                if self.in_flight >= self._capacity(priority):
+                    break
+                heapq.heappop(self._heap)
+                waiter.admitted = True
+                self.in_flight += 1
+                waiter.event.set()
+
+    @contextmanager
+    def slot(self, risk_level: Optional[str] = 'low', timeout: Optional[float] = None):
+        """Context manager: `with llm_admission.slot('high'): client.chat...`"""
+        self.acquire(risk_level, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, risk_level: Optional[str] = 'low', timeout: Optional[float] = None):
+        """
+        Versão assíncrona de slot(): a espera na fila roda numa thread, sem bloquear o event loop
+
+        Cancelar a tarefa não interrompe a thread, que continua na fila. Se a
+        vaga sair depois que quem esperava desistiu, a própria thread a
+        devolve; se já tinha saído, devolve aqui. O lock torna as duas
+        decisões exclusivas: a vaga é liberada exatamente uma vez.
+        """
+        handoff = threading.Lock()
+        state = {'acquired': False, 'abandoned': False}
+
+        def acquire():
+            self.acquire(risk_level, timeout)
+            with handoff:
+                if not state['abandoned']:
+                    state['acquired'] = True
+                    return
+            self.release()
+
+        try:
+            await asyncio.shield(asyncio.to_thread(acquire))
+        except asyncio.CancelledError:
+            with handoff:
+                state['abandoned'] = True
+                acquired = state['acquired']
+            if acquired:
+                self.release()
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    # === AUXILIARES (chamados com o lock) ===
+
+    def _has_waiter_at_least(self, priority: int) -> bool:
+        return bool(self._heap) and self._heap[0][0] <= priority
+
+    def _lowest_priority_waiter(self) -> Optional[_Waiter]:
+        if not self._heap:
+            return None
+        # Maior prioridade numérica; entre iguais, o mais recente
+        return max(self._heap, key=lambda item: (item[0], item[1]))[2]
+
+    def _remove(self, waiter: _Waiter) -> None:
+        self._heap = [item for item in self._heap if item[2] is not waiter]
+        heapq.heapify(self._heap)
+
+    def _record_admission(self, level: str, wait_ms: float) -> None:
+        stats = self.stats[level]
+        stats['admitted'] += 1
+        stats['max_wait_ms'] = max(stats['max_wait_ms'], round(wait_ms, 1))
+        self._waits[level].append(wait_ms)
+
+    # === MÉTRICAS ===
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            depth = {level: 0 for level in RISK_PRIORITY}
+            for _, _, waiter in self._heap:
+                depth[waiter.risk_level] += 1
+            levels = {}
+            for level, stats in self.stats.items():
+                waits = list(self._waits[level])
+                levels[level] = dict(
+                    stats,
+                    queue_depth=depth[level],
+                    p50_wait_ms=round(_percentile(waits, 0.5), 1),
+                    p95_wait_ms=round(_percentile(waits, 0.95), 1)
+                )
+            return {
+                'max_in_flight': self.max_in_flight,
+                'reserved_slots': self.reserved_slots,
+                'in_flight': self.in_flight,
+                'queue_depth': len(self._heap),
+                'max_queue_depth': self.max_queue_depth,
+                'levels': levels
+            }
+
+
+# Instância global
+llm_admission = LLMAdmissionController()
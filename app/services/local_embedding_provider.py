@@ -0,0 +1,148 @@
+"""
+Provedor local de embeddings (CPU) usando transformers
+
+Roda um modelo pequeno de sentence-embedding sem chamadas externas, útil para
+embeddar o corpus inteiro sem custo por linha e em ambientes sem internet.
+
+- Lotes dinâmicos: textos ordenados por tamanho e agrupados por orçamento de tokens
+- Inferência em pool de threads (o PyTorch libera o GIL nas operações)
+- max_batch_size (quantos textos o EmbeddingService entrega por chamada) sai do
+  orçamento de tokens: cada chamada rende vários lotes para todas as threads.
+  O limite de itens por passada do modelo é max_forward_size
+- Caminho opcional quantizado em int8 (quantização dinâmica das camadas Linear)
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# === DEPENDÊNCIAS OPCIONAIS ===
+try:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    LOCAL_EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    LOCAL_EMBEDDINGS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# Tamanho mínimo (tokens) assumido por texto ao dimensionar a chamada do serviço
+MIN_TEXT_TOKENS = 8
+
+
+def plan_batches(lengths: List[int], max_batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Agrupa índices de textos em lotes dinâmicos
+
+    Os textos são ordenados por tamanho para minimizar padding; um lote fecha quando
+    atinge max_batch_size itens ou quando (maior tamanho x itens) passaria de
+    max_batch_tokens.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current, current_max = [], [], 0
+    for index in order:
+        candidate_max = max(current_max, lengths[index])
+        if current and (len(current) >= max_batch_size or candidate_max * (len(current) + 1) > max_batch_tokens):
+            batches.append(current)
+            current, candidate_max = [], lengths[index]
+        current.append(index)
+        current_max = candidate_max
+    if current:
+        batches.append(current)
+    return batches
+
+
+class LocalEmbeddingProvider:
+    """Provedor de embeddings executado localmente na CPU"""
+
+    name = 'local'
+
+    def __init__(self, model_name: Optional[str] = None, max_forward_size: Optional[int] = None,
+                 max_batch_tokens: Optional[int] = None, workers: Optional[int] = None,
+                 quantize: Optional[bool] = None, max_length: int = 256, pad_to: Optional[int] = None):
+        if not LOCAL_EMBEDDINGS_AVAILABLE:
+            raise ImportError("Embeddings locais requerem torch e transformers instalados")
+
+        self.model = model_name or os.getenv('LOCAL_EMBEDDING_MODEL', DEFAULT_LOCAL_MODEL)
+        self.max_forward_size = max_forward_size or int(os.getenv('LOCAL_EMBEDDING_BATCH_SIZE', '64'))
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv('LOCAL_EMBEDDING_BATCH_TOKENS', '8192'))
+        self.workers = workers or int(os.getenv('LOCAL_EMBEDDING_WORKERS', '2'))
+        # Textos por chamada de embed(): um orçamento de tokens cheio de textos curtos por thread
+        self.max_batch_size = max(self.max_forward_size,
+                                  self.max_batch_tokens // MIN_TEXT_TOKENS * self.workers)
+        if quantize is None:
+            quantize = os.getenv('LOCAL_EMBEDDING_QUANTIZE', 'false').lower() in ['true', 'on', '1']
+        self.quantize = quantize
+        self.max_length = max_length
+        # Preenche com zeros até a dimensão das colunas vector(N) existentes;
+        # zeros extras não alteram a similaridade de cosseno entre vetores locais
+        self.pad_to = pad_to
+        self.dimensions = None
+
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._executor = None
+
+    def _ensure_loaded(self) -> None:
+        """Carrega tokenizer e modelo na primeira utilização"""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+            tokenizer = AutoTokenizer.from_pretrained(self.model)
+            model = AutoModel.from_pretrained(self.model)
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            # Divide os núcleos entre as threads do pool para evitar oversubscription
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+            self.dimensions = model.config.hidden_size
+            self._tokenizer = tokenizer
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='local-embed')
+            self._model = model
+            logger.info(
+                f"Modelo local de embeddings carregado: {self.model} | dim={self.dimensions} | "
+                f"int8={self.quantize} | threads={self.workers}"
+            )
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Inferência de um lote com mean pooling e normalização L2"""
+        encoded = self._tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=self.max_length, return_tensors='pt'
+        )
+        with torch.inference_mode():
+            output = self._model(**encoded)
+        mask = encoded['attention_mask'].unsqueeze(-1).to(output.last_hidden_state.dtype)
+        summed = (output.last_hidden_state * mask).sum(dim=1)
+        pooled = summed / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        vectors = pooled.tolist()
+        if self.pad_to and self.pad_to > len(vectors[0]):
+            padding = [0.0] * (self.pad_to - len(vectors[0]))
+            vectors = [v + padding for v in vectors]
+        return vectors
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings para os textos, na mesma ordem da entrada"""
+        if not texts:
+            return []
+        self._ensure_loaded()
+        lengths = [
+            len(ids) for ids in self._tokenizer(
+                texts, truncation=True, max_length=self.max_length
+            )['input_ids']
+        ]
+        batches = plan_batches(lengths, self.max_forward_size, self.max_batch_tokens)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, vectors in zip(batches, self._executor.map(
+                lambda idx: self._encode([texts[i] for i in idx]), batches)):
+            for index, vector in zip(batch, vectors):
+                results[index] = vector
+        return results
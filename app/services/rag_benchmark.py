@@ -0,0 +1,347 @@
+"""
+Avaliação offline e benchmark de latência do RAG
+
+- Popula o banco local com um corpus sintético rotulado (10k a 5M trocas),
+  gerado no próprio PostgreSQL com generate_series
+- Executa cada backend do SimpleRAG (regex, full-text, vetorial, híbrido)
+  contra um conjunto de consultas rotuladas
+- Reporta hit_rate@k, precision@k, MRR, latência p50/p95/p99 e número de
+  consultas SQL por busca. hit_rate@k é a fração de consultas com ao menos
+  um relevante no top k; não é recall: todas as trocas do tópico são
+  relevantes, e com 10k-5M trocas o recall@k real seria quase zero
+
+Os embeddings do corpus sintético usam um provedor determinístico por hashing
+de palavras (sem chamadas externas); servem para medir custo e escala da busca
+vetorial, não a qualidade semântica de um modelo real.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from itertools import product
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event, text
+
+from app import db
+from app.services.embedding_service import EmbeddingService, vector_to_pg
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_EMAIL = 'rag-benchmark@porvoce.local'
+BENCHMARK_TITLE = 'rag-benchmark'
+
+FEELINGS = ['ansiedade', 'tristeza', 'solidão', 'raiva', 'medo']
+CONTEXTS = ['meu trabalho', 'minha família', 'meu relacionamento', 'a faculdade']
+
+MESSAGE_TEMPLATES = [
+    "Estou sentindo muita {f} por causa de {c}",
+    "A {f} não me deixa em paz, tudo por conta de {c}",
+    "Não sei mais lidar com a {f} que vem de {c}",
+    "Toda semana {c} me traz {f} e não consigo dormir"
+]
+FILLERS = [
+    "e isso está me cansando.", "já não sei o que fazer.", "preciso desabafar com alguém.",
+    "hoje foi um dia difícil.", "tenho chorado bastante.", "parece que nada melhora.",
+    "queria me sentir melhor.", "ninguém percebe como estou.", "não tenho com quem conversar.",
+    "isso começou há alguns meses.", "estou perdendo a vontade de sair.", "tento me distrair mas não funciona."
+]
+QUERY_TEMPLATES = [
+    "como lidar com {f} em {c}?",
+    "sinto {f} quando penso em {c}",
+    "{c} tem me dado muita {f}"
+]
+
+BACKENDS = ['regex', 'fulltext', 'vector', 'hybrid']
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class HashingEmbeddingProvider:
+    """Embeddings determinísticos por hashing de palavras (somente para benchmark)"""
+
+    name = 'hashing'
+    model = 'hashing-bow'
+    max_batch_size = 4096
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+        self._token_vectors: Dict[str, np.ndarray] = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            seed = int(hashlib.sha1(token.encode('utf-8')).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for content in texts:
+            tokens = [t for t in _TOKEN_RE.findall(content.lower()) if len(t) > 3]
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for token in tokens:
+                vector += self._token_vector(token)
+            norm = np.linalg.norm(vector)
+            vectors.append((vector / norm if norm else vector).tolist())
+        return vectors
+
+
+def build_corpus_texts() -> List[Dict]:
+    """Mensagens de usuário do corpus sintético, cada uma com seu tópico (rótulo)"""
+    texts = []
+    for topic, (feeling, context) in enumerate(product(FEELINGS, CONTEXTS)):
+        for template, filler in product(MESSAGE_TEMPLATES, FILLERS):
+            texts.append({
+                'topic': topic,
+                'content': f"{template.format(f=feeling, c=context)} {filler}",
+                'reply': f"Entendo que a {feeling} ligada a {context} pesa muito. "
+                         f"Vamos pensar juntos em pequenos passos para aliviar isso?"
+            })
+    return texts
+
+
+def build_query_set() -> List[Dict]:
+    """Consultas rotuladas: relevantes são as trocas do mesmo tópico"""
+    queries = []
+    for topic, (feeling, context) in enumerate(product(FEELINGS, CONTEXTS)):
+        for template in QUERY_TEMPLATES:
+            queries.append({'topic': topic, 'query': template.format(f=feeling, c=context)})
+    return queries
+
+
+class QueryCounter:
+    """Conta as consultas SQL emitidas (todas as conexões do engine)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+class RAGBenchmark:
+    """Semeia o corpus sintético e mede os backends de recuperação"""
+
+    def __init__(self, echo: Callable[[str], None] = print):
+        self.echo = echo
+        self.texts = build_corpus_texts()
+        self.topic_by_content = {t['content']: t['topic'] for t in self.texts}
+        self.embedding_service = EmbeddingService(provider=HashingEmbeddingProvider(), use_db_cache=False)
+
+    # === CORPUS ===
+
+    def _benchmark_user_id(self) -> int:
+        from werkzeug.security import generate_password_hash
+        from app.models import User, UserRole
+        user = User.query.filter_by(email=BENCHMARK_EMAIL).first()
+        if user is None:
+            user = User(
+                email=BENCHMARK_EMAIL,
+                username='rag_benchmark',
+                password_hash=generate_password_hash(hashlib.sha256(BENCHMARK_EMAIL.encode()).hexdigest()),
+                first_name='RAG',
+                last_name='Benchmark',
+                role=UserRole.CLIENT,
+                terms_accepted=True,
+                privacy_policy_accepted=True,
+                data_processing_consent=True
+            )
+            db.session.add(user)
+            db.session.commit()
+        return user.id
+
+    def reset(self) -> None:
+        """Remove o corpus sintético (sessões do usuário de benchmark)"""
+        user_id = self._benchmark_user_id()
+        params = {'user_id': user_id}
+        db.session.execute(text("""
+            DELETE FROM conversation_embeddings WHERE chat_message_id IN (
+                SELECT cm.id FROM chat_messages cm
+                JOIN chat_sessions cs ON cs.id = cm.session_id
+                WHERE cs.user_id = :user_id
+            )
+        """), params)
+        db.session.execute(text("""
+            DELETE FROM chat_messages WHERE session_id IN (
+                SELECT id FROM chat_sessions WHERE user_id = :user_id
+            )
+        """), params)
+        db.session.execute(text("DELETE FROM chat_sessions WHERE user_id = :user_id"), params)
+        db.session.commit()
+        self.echo('🧹 Corpus sintético removido')
+
+    def seed(self, exchanges: int, per_session: int = 5, chunk_size: int = 100_000,
+             with_embeddings: bool = True) -> Dict:
+        """
+        Gera `exchanges` trocas (mensagem do usuário + resposta da IA)
+
+        Os textos variam entre len(build_corpus_texts()) combinações rotuladas;
+        as linhas são criadas no servidor com generate_series em blocos.
+        """
+        started = time.perf_counter()
+        user_id = self._benchmark_user_id()
+
+        # Tabela auxiliar com os textos (e vetores) únicos do corpus; não é TEMP
+        # porque os commits por bloco podem devolver a conexão ao pool
+        db.session.execute(text("DROP TABLE IF EXISTS bench_texts"))
+        db.session.execute(text("""
+            CREATE UNLOGGED TABLE bench_texts (
+                idx INTEGER PRIMARY KEY, topic INTEGER, content TEXT, reply TEXT, embedding vector(1536)
+            )
+        """))
+        vectors = self.embedding_service.embed_texts([t['content'] for t in self.texts])
+        db.session.execute(
+            text("INSERT INTO bench_texts VALUES (:idx, :topic, :content, :reply, CAST(:embedding AS vector))"),
+            [dict(t, idx=i, embedding=vector_to_pg(v)) for i, (t, v) in enumerate(zip(self.texts, vectors))]
+        )
+
+        total_texts = len(self.texts)
+        for start in range(0, exchanges, chunk_size):
+            end = min(start + chunk_size, exchanges)
+            params = {'user_id': user_id, 'start': start, 'end': end,
+                      'per_session': per_session, 'total_texts': total_texts}
+
+            db.session.execute(text("""
+                INSERT INTO chat_sessions
+                (user_id, title, status, started_at, ended_at, initial_risk_level, user_rating,
+                 message_count, is_anonymized, triage_triggered, uuid, last_activity, created_at, updated_at)
+                SELECT :user_id, 'rag-benchmark', 'COMPLETED', ts, ts, 'low', 1 + (s % 5),
+                    :per_session * 2, FALSE, FALSE, md5('rag-benchmark-' || s), ts, ts, ts
+                FROM (
+                    SELECT s, NOW() - ((s % 180) || ' days')::interval AS ts
+                    FROM generate_series(:start / :per_session, (:end - 1) / :per_session) s
+                ) sessions
+                ON CONFLICT (uuid) DO NOTHING
+            """), params)
+
+            # Mensagem do usuário seguida da resposta da IA (ids crescentes)
+            db.session.execute(text("""
+                INSERT INTO chat_messages
+                (session_id, content, message_type, is_anonymized, created_at, updated_at)
+                SELECT cs.id, CASE WHEN m.ord = 0 THEN bt.content ELSE bt.reply END,
+                    CAST(CASE WHEN m.ord = 0 THEN 'USER' ELSE 'AI' END AS chatmessagetype),
+                    FALSE, cs.started_at, cs.started_at
+                FROM generate_series(:start, :end - 1) g
+                JOIN bench_texts bt ON bt.idx = (g * 7919) % :total_texts
+                JOIN chat_sessions cs ON cs.uuid = md5('rag-benchmark-' || (g / :per_session))
+                CROSS JOIN (VALUES (0), (1)) m(ord)
+                ORDER BY g, m.ord
+            """), params)
+            db.session.commit()
+
+            elapsed = time.perf_counter() - started
+            self.echo(f"   {end:,}/{exchanges:,} trocas | {end / elapsed:,.0f} trocas/s")
+
+        if with_embeddings:
+            db.session.execute(text("""
+                INSERT INTO conversation_embeddings (chat_message_id, embedding, risk_level)
+                SELECT cm.id, bt.embedding, 'low'
+                FROM chat_messages cm
+                JOIN chat_sessions cs ON cs.id = cm.session_id
+                JOIN bench_texts bt ON bt.content = cm.content
+                LEFT JOIN conversation_embeddings ce ON ce.chat_message_id = cm.id
+                WHERE cs.user_id = :user_id AND cm.message_type = 'USER' AND ce.id IS NULL
+            """), {'user_id': user_id})
+            db.session.commit()
+
+        db.session.execute(text("DROP TABLE bench_texts"))
+        db.session.execute(text("ANALYZE chat_sessions; ANALYZE chat_messages; ANALYZE conversation_embeddings"))
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        return {'exchanges': exchanges, 'seconds': round(elapsed, 1),
+                'exchanges_per_second': round(exchanges / elapsed, 1) if elapsed else 0}
+
+    # === AVALIAÇÃO ===
+
+    def _retrievers(self, k: int) -> Dict[str, Callable[[str], List[Dict]]]:
+        from app.services.ai_service import SimpleRAG
+        from app.services.hybrid_retrieval import HybridRetriever
+
+        rag = SimpleRAG()
+        hybrid = HybridRetriever(embedding_service=self.embedding_service, candidates_per_retriever=max(k * 4, 20))
+        far_deadline = lambda: time.perf_counter() + hybrid.budget_ms / 1000.0
+
+        def regex(query):
+            keywords = rag._extract_keywords(query)
+            return rag._rank_conversations(rag._find_similar_conversations(keywords, 'low', k * 2), query)
+
+        def fulltext(query):
+            rows = hybrid.lexical_search(rag._extract_keywords(query), far_deadline())
+            db.session.commit()  # Encerra a transação do SET LOCAL
+            return rows
+
+        def vector(query):
+            rows = hybrid.vector_search(query, far_deadline()) or []
+            db.session.commit()
+            return rows
+
+        def hybrid_search(query):
+            return hybrid.retrieve(query, rag._extract_keywords(query), k)
+
+        return {'regex': regex, 'fulltext': fulltext, 'vector': vector, 'hybrid': hybrid_search}
+
+    def run(self, backends: Optional[List[str]] = None, k: int = 3, repeat: int = 1) -> Dict:
+        """Executa o conjunto de consultas rotuladas em cada backend"""
+        queries = build_query_set()
+        retrievers = self._retrievers(k)
+        report = {}
+        for name in backends or BACKENDS:
+            retrieve = retrievers[name]
+            latencies, hits, precisions, reciprocal_ranks = [], 0, [], []
+            errors = 0
+            with QueryCounter(db.engine) as counter:
+                for _ in range(repeat):
+                    for item in queries:
+                        started = time.perf_counter()
+                        try:
+                            results = retrieve(item['query'])[:k]
+                        except Exception as e:
+                            logger.warning(f"Backend {name} falhou: {e}")
+                            db.session.rollback()
+                            errors += 1
+                            results = []
+                        latencies.append((time.perf_counter() - started) * 1000)
+
+                        relevant = [self.topic_by_content.get(r.get('user_message')) == item['topic'] for r in results]
+                        hits += any(relevant)
+                        precisions.append(sum(relevant) / k)
+                        first = next((i for i, ok in enumerate(relevant, 1) if ok), None)
+                        reciprocal_ranks.append(1 / first if first else 0.0)
+
+            lookups = len(latencies)
+            report[name] = {
+                'lookups': lookups,
+                'errors': errors,
+                f'hit_rate@{k}': round(hits / lookups, 3),
+                f'precision@{k}': round(float(np.mean(precisions)), 3),
+                'mrr': round(float(np.mean(reciprocal_ranks)), 3),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+                'queries_per_lookup': round(counter.count / lookups, 2)
+            }
+            self.echo(f"   {name}: {report[name]}")
+        return report
+
+    def corpus_size(self) -> int:
+        """Trocas do corpus sintético atualmente no banco"""
+        return db.session.execute(text("""
+            SELECT COUNT(*) FROM chat_messages cm
+            JOIN chat_sessions cs ON cs.id = cm.session_id
+            WHERE cs.title = :title AND cm.message_type = 'USER'
+        """), {'title': BENCHMARK_TITLE}).scalar() or 0
@@ -0,0 +1,226 @@
+"""
+Aquecimento e snapshots persistentes dos caches do SimpleRAG
+
+- Aquecimento no boot: executa as assinaturas de consulta mais frequentes das
+  mensagens recentes, para que os primeiros usuários após um deploy não paguem
+  o caminho lento
+- Snapshots periódicos dos caches em arquivo local (grava em temporário e
+  substitui de forma atômica)
+- Carregamento sob demanda: o snapshot é lido em background no boot e a
+  primeira busca só espera se a leitura ainda não terminou
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Caches do SimpleRAG incluídos no snapshot
+SNAPSHOT_CACHES = ('cache', 'training_cache', 'signature_cache')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo não serializável no snapshot: {type(value).__name__}")
+
+
+def _decode(obj):
+    if '__datetime__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+class RAGSnapshotManager:
+    """Persiste e restaura os caches de um SimpleRAG"""
+
+    def __init__(self, rag, path: str, interval: Optional[int] = None, max_age: Optional[int] = None):
+        self.rag = rag
+        self.path = path
+        self.interval = interval or int(os.getenv('RAG_SNAPSHOT_INTERVAL', '300'))
+        self.max_age = max_age or int(os.getenv('RAG_SNAPSHOT_MAX_AGE', '86400'))
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._saved_writes = 0
+        self._stop = threading.Event()
+        self.stats = {'loaded_entries': 0, 'saved_entries': 0, 'snapshots': 0,
+                      'warmed_signatures': 0, 'last_snapshot_at': None}
+        rag.snapshot_manager = self
+
+    # === CARREGAMENTO ===
+
+    def ensure_loaded(self) -> None:
+        """Garante que o snapshot foi aplicado (rápido depois da primeira vez)"""
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
+            try:
+                self._load()
+            except Exception as e:
+                logger.warning(f"Snapshot do RAG ignorado: {e}")
+            finally:
+                self._loaded.set()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        age = time.time() - os.path.getmtime(self.path)
+        if age > self.max_age:
+            logger.info(f"Snapshot do RAG com {age / 3600:.1f}h ignorado (máximo {self.max_age / 3600:.1f}h)")
+            return
+        with open(self.path, encoding='utf-8') as handle:
+            snapshot = json.load(handle, object_hook=_decode)
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('retrieval_mode') != self.rag.retrieval_mode:
+            return
+
+        loaded = 0
+        for name in SNAPSHOT_CACHES:
+            target = getattr(self.rag, name)
+            for key, value in snapshot.get('caches', {}).get(name, {}).items():
+                if key not in target:
+                    target[key] = value
+                    loaded += 1
+        self._saved_writes = self.rag.cache_writes
+        self.stats['loaded_entries'] = loaded
+        print(f"[RAG] Snapshot carregado: {loaded} entradas ({age:.0f}s)")
+
+    # === GRAVAÇÃO ===
+
+    def save(self, force: bool = False) -> bool:
+        """Grava o snapshot se houve novas entradas desde a última gravação"""
+        writes = self.rag.cache_writes
+        if not force and writes == self._saved_writes:
+            return False
+        caches = {name: dict(getattr(self.rag, name).items()) for name in SNAPSHOT_CACHES}
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'retrieval_mode': self.rag.retrieval_mode,
+            'created_at': datetime.now(timezone.utc),
+            'caches': caches
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.rag-snapshot-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                json.dump(snapshot, handle, default=_encode, ensure_ascii=False)
+            # Substituição atômica: leitores nunca veem um arquivo pela metade
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._saved_writes = writes
+        self.stats['snapshots'] += 1
+        self.stats['saved_entries'] = sum(len(c) for c in caches.values())
+        self.stats['last_snapshot_at'] = snapshot['created_at'].isoformat()
+        logger.info(f"Snapshot do RAG gravado: {self.stats['saved_entries']} entradas")
+        return True
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning(f"Erro ao gravar snapshot do RAG: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning(f"Erro ao gravar snapshot final do RAG: {e}")
+
+    # === AQUECIMENTO ===
+
+    def warm_up(self, signatures: Optional[int] = None, days: Optional[int] = None,
+                sample: int = 5000) -> int:
+        """
+        Executa as assinaturas de consulta mais frequentes das mensagens recentes
+
+        Requer app context. Retorna o número de assinaturas aquecidas.
+        """
+        from app import db
+
+        signatures = signatures or int(os.getenv('RAG_WARMUP_SIGNATURES', '50'))
+        days = days or int(os.getenv('RAG_WARMUP_DAYS', '7'))
+        rows = db.session.execute(text("""
+            SELECT cm.content, COALESCE(cs.initial_risk_level, 'low') as risk_level
+            FROM chat_messages cm
+            JOIN chat_sessions cs ON cs.id = cm.session_id
+            WHERE cm.message_type = 'USER'
+                AND cm.created_at >= NOW() - make_interval(days => :days)
+            ORDER BY cm.id DESC
+            LIMIT :sample
+        """), {'days': days, 'sample': sample}).all()
+        db.session.rollback()
+
+        counts = Counter()
+        representative: Dict[str, tuple] = {}
+        for content, risk_level in rows:
+            keywords = self.rag._extract_keywords(content)
+            if not keywords:
+                continue
+            signature = self.rag.query_signature(keywords, 6)
+            counts[signature] += 1
+            # Mensagem mais recente de cada assinatura (rows vem do mais novo ao mais antigo)
+            representative.setdefault(signature, (content, risk_level))
+
+        warmed = 0
+        for signature, _ in counts.most_common(signatures):
+            content, risk_level = representative[signature]
+            if risk_level not in ('low', 'moderate', 'high', 'critical'):
+                risk_level = 'low'
+            self.rag.get_relevant_context(content, risk_level, 3)
+            warmed += 1
+        self.stats['warmed_signatures'] += warmed
+        return warmed
+
+    def get_statistics(self) -> Dict:
+        return dict(self.stats, path=self.path, loaded=self._loaded.is_set(), interval=self.interval)
+
+
+def start_rag_warmup(app, rag) -> Optional[RAGSnapshotManager]:
+    """
+    Configura snapshot + aquecimento do RAG no boot (em background)
+
+    Carrega o snapshot, aquece pelas assinaturas mais frequentes e passa a
+    gravar snapshots periódicos; nada disso bloqueia a inicialização.
+    """
+    if not app.config.get('RAG_WARMUP_ENABLED', True) or app.config.get('TESTING'):
+        return None
+
+    path = app.config.get('RAG_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'rag_snapshot.json')
+    manager = RAGSnapshotManager(rag, path)
+
+    def run():
+        started = time.perf_counter()
+        manager.ensure_loaded()
+        try:
+            with app.app_context():
+                warmed = manager.warm_up()
+            print(f"[RAG] Aquecimento concluído: {warmed} assinaturas em {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            logger.warning(f"Aquecimento do RAG falhou: {e}")
+        manager._snapshot_loop()
+
+    threading.Thread(target=run, name='rag-warmup', daemon=True).start()
+    atexit.register(manager.stop)
+    return manager
@@ -0,0 +1,281 @@
+"""
+Limite de requisições por token bucket, por usuário e por IP
+
+Protege as rotas que chamam o LLM (cota do provedor) de clientes em loop:
+- Cada regra é um balde de `capacity` fichas reabastecido ao longo de
+  `period` segundos (spec 'user=20/60,ip=60/60'); cada requisição gasta uma
+- Balde vazio: 429 com Retry-After (segundos até a próxima ficha)
+- Backend 'memory' (padrão, por processo, poucos microssegundos por
+  checagem) ou 'sqlite' (arquivo local compartilhado pelos workers do host)
+- Erro no backend não bloqueia a requisição (fail open)
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from flask import current_app, jsonify, make_response, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+# Limites padrão por grupo de rotas (sobrescritos por RATE_LIMIT_<GRUPO>)
+DEFAULT_LIMITS = {
+    'chat_send': 'user=20/60,ip=60/60',
+    'training_test': 'user=10/60,ip=30/60',
+    'diary_analysis': 'user=10/300,ip=30/300',
+}
+
+# Baldes parados há mais que isso estão cheios de novo: podem ser descartados
+BUCKET_IDLE_TTL = 3600
+
+
+class RateRule(namedtuple('RateRule', 'scope capacity period')):
+    """Balde de `capacity` fichas, reabastecido por completo em `period` segundos"""
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining retry_after')
+
+
+def parse_rules(spec: str) -> List[RateRule]:
+    """'user=20/60,ip=60/60' -> [RateRule('user', 20, 60.0), RateRule('ip', 60, 60.0)]"""
+    rules = []
+    for item in spec.split(','):
+        if '=' not in item or '/' not in item:
+            continue
+        scope, limit = item.split('=', 1)
+        capacity, period = limit.split('/', 1)
+        rules.append(RateRule(scope.strip(), int(capacity), float(period)))
+    return rules
+
+
+class MemoryBackend:
+    """Baldes no processo (cada worker tem os seus)"""
+
+    def __init__(self, max_keys: int = 100000):
+        self._buckets = TTLCache(maxsize=max_keys, ttl=BUCKET_IDLE_TTL)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: RateRule, now: float, cost: float = 1) -> Tuple[bool, float]:
+        """Gasta `cost` fichas se houver. Returns: (permitido, fichas restantes)"""
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens = rule.capacity
+            else:
+                tokens = min(rule.capacity, state[0] + max(0.0, now - state[1]) * rule.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+                self._buckets[key] = (tokens, now)
+            return allowed, tokens
+
+    def refund(self, key: str, rule: RateRule, now: float, cost: float = 1) -> None:
+        """Devolve fichas gastas por uma requisição que outro balde negou"""
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                return
+            tokens = min(rule.capacity, state[0] + max(0.0, now - state[1]) * rule.rate)
+            self._buckets[key] = (min(rule.capacity, tokens + cost), now)
+
+
+class SQLiteBackend:
+    """
+    Baldes num arquivo SQLite local, compartilhado pelos workers do mesmo host
+
+    Uma única instrução (UPSERT ... RETURNING) reabastece e gasta a ficha de
+    forma atômica; a negação faz um SELECT a mais para calcular o Retry-After.
+    """
+
+    PURGE_EVERY = 10000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Perder baldes num crash é aceitável
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rule: RateRule, now: float, cost: float = 1) -> Tuple[bool, float]:
+        conn = self._connection()
+        params = {'key': key, 'capacity': rule.capacity, 'rate': rule.rate, 'now': now, 'cost': cost}
+        row = conn.execute("""
+            INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (:key, :capacity - :cost, :now)
+            ON CONFLICT (key) DO UPDATE
+                SET tokens = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) - :cost,
+                    updated_at = :now
+                WHERE MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :cost
+            RETURNING tokens
+        """, params).fetchone()
+        self._calls += 1
+        if self._calls % self.PURGE_EVERY == 0:
+            self.purge(now)
+        if row is not None:
+            return True, row[0]
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+        tokens = min(rule.capacity, row[0] + max(0.0, now - row[1]) * rule.rate) if row else rule.capacity
+        return False, tokens
+
+    def refund(self, key: str, rule: RateRule, now: float, cost: float = 1) -> None:
+        self._connection().execute("""
+            UPDATE rate_buckets
+            SET tokens = MIN(:capacity, MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) + :cost),
+                updated_at = :now
+            WHERE key = :key
+        """, {'key': key, 'capacity': rule.capacity, 'rate': rule.rate, 'now': now, 'cost': cost})
+
+    def purge(self, now: float) -> int:
+        """Remove baldes parados há mais de BUCKET_IDLE_TTL (já estariam cheios)"""
+        return self._connection().execute(
+            "DELETE FROM rate_buckets WHERE updated_at < ?", (now - BUCKET_IDLE_TTL,)
+        ).rowcount
+
+
+class RateLimiter:
+    """Aplica as regras de um grupo de rotas às identidades da requisição"""
+
+    def __init__(self, backend=None, enabled: Optional[bool] = None, clock=time.time):
+        if enabled is None:
+            enabled = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self.clock = clock
+        self._backend = backend
+        self._rules: Dict[str, List[RateRule]] = {}
+        self.stats = {'allowed': 0, 'limited': 0, 'backend_errors': 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if os.getenv('RATE_LIMIT_BACKEND', 'memory').lower() == 'sqlite':
+                path = os.getenv('RATE_LIMIT_SQLITE_PATH') or os.path.join(
+                    tempfile.gettempdir(), 'porvoce_rate_limit.sqlite3')
+                self._backend = SQLiteBackend(path)
+            else:
+                self._backend = MemoryBackend()
+        return self._backend
+
+    def rules_for(self, name: str) -> List[RateRule]:
+        rules = self._rules.get(name)
+        if rules is None:
+            spec = os.getenv(f'RATE_LIMIT_{name.upper()}', DEFAULT_LIMITS.get(name, ''))
+            rules = self._rules[name] = parse_rules(spec)
+        return rules
+
+    def check(self, name: str, identities: Dict[str, str]) -> RateLimitResult:
+        """
+        Gasta uma ficha de cada balde aplicável (ex.: usuário e IP)
+
+        Para no primeiro balde vazio e devolve as fichas já gastas nos anteriores:
+        usuários atrás de um IP compartilhado saturado (NAT) não esvaziam o
+        próprio balde a cada nova tentativa negada. `remaining` é o menor saldo
+        entre os baldes.
+        """
+        now = self.clock()
+        limit = remaining = None
+        taken = []
+        for rule in self.rules_for(name):
+            identity = identities.get(rule.scope)
+            if identity is None:
+                continue
+            key = f'{name}:{rule.scope}:{identity}'
+            try:
+                allowed, tokens = self.backend.take(key, rule, now)
+            except Exception as e:
+                self.stats['backend_errors'] += 1
+                logger.warning(f"Rate limit indisponível ({name}): {e}")
+                continue
+            if not allowed:
+                self.stats['limited'] += 1
+                self._refund(name, taken, now)
+                return RateLimitResult(False, rule.capacity, 0, (1 - tokens) / rule.rate)
+            taken.append((key, rule))
+            if remaining is None or tokens < remaining:
+                limit, remaining = rule.capacity, int(tokens)
+        self.stats['allowed'] += 1
+        return RateLimitResult(True, limit, remaining, 0.0)
+
+    def _refund(self, name: str, taken: List[Tuple[str, RateRule]], now: float) -> None:
+        for key, rule in taken:
+            try:
+                self.backend.refund(key, rule, now)
+            except Exception as e:
+                self.stats['backend_errors'] += 1
+                logger.warning(f"Rate limit indisponível ({name}): {e}")
+
+    def get_statistics(self) -> Dict:
+        return dict(self.stats, enabled=self.enabled, backend=type(self.backend).__name__)
+
+
+# Instância global
+rate_limiter = RateLimiter()
+
+
+def client_ip() -> str:
+    """IP do cliente: último X-Forwarded-For (acrescentado pelo proxy do Render, não forjável)"""
+    route = request.access_route
+    return route[-1] if route else (request.remote_addr or 'unknown')
+
+
+def rate_limited(name: str):
+    """
+    Decorator de rota: token bucket por usuário logado e por IP
+
+    Usar abaixo de @login_required e acima de @idempotent (um 429 não pode
+    ficar gravado como resposta da Idempotency-Key).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            call_view = current_app.ensure_sync(view)
+            if not rate_limiter.enabled:
+                return call_view(*args, **kwargs)
+            identities = {'ip': client_ip()}
+            if current_user.is_authenticated:
+                identities['user'] = str(current_user.id)
+            result = rate_limiter.check(name, identities)
+            if not result.allowed:
+                retry_after = max(1, math.ceil(result.retry_after))
+                response = jsonify({
+                    'success': False,
+                    'error': 'Muitas requisições. Tente novamente em instantes.',
+                    'retry_after': retry_after
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                response.headers['X-RateLimit-Limit'] = str(result.limit)
+                response.headers['X-RateLimit-Remaining'] = '0'
+                return response
+            response = make_response(call_view(*args, **kwargs))
+            if result.limit is not None:
+                response.headers['X-RateLimit-Limit'] = str(result.limit)
+                response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+            return response
+        return wrapper
+    return decorator
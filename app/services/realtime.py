@@ -0,0 +1,269 @@
+"""
+Canal de eventos em tempo real do chat 1a1 (voluntário-cliente)
+
+Substitui o polling das mensagens e do status da sessão por Server-Sent Events:
+- EventBroker: pub/sub no processo; cada conexão SSE assina o canal da
+  sessão (chat1a1:<id>) e recebe mensagens novas, mudanças de status
+  (espera -> aceita -> encerrada) e eventos de digitação
+- Eventos de dados (mensagem, status) são publicados só depois do commit
+  (publish_on_commit); digitação é efêmera e vai direto
+- PostgresBridge: com vários workers, a publicação vai por NOTIFY e cada
+  processo repassa aos seus assinantes o que recebe no LISTEN
+  (REALTIME_PG_BRIDGE=auto liga quando WEB_CONCURRENCY > 1)
+- Na reconexão o cliente manda Last-Event-ID (id da última mensagem) e
+  recebe as que perdeu numa única consulta
+"""
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'porvoce_realtime'
+NOTIFY_MAX_BYTES = 7900  # Limite do payload do NOTIFY é 8000 bytes
+
+_PENDING_EVENTS = 'realtime_pending_events'
+
+
+def session_channel(session_id: int) -> str:
+    return f'chat1a1:{session_id}'
+
+
+class Subscription:
+    """Fila de eventos de uma conexão SSE"""
+
+    def __init__(self, broker: 'EventBroker', channel: str, maxsize: int = 256):
+        self.broker = broker
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item: Dict) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fanout dos eventos para as conexões deste processo"""
+
+    def __init__(self, bridge_enabled: Optional[bool] = None):
+        if bridge_enabled is None:
+            setting = os.getenv('REALTIME_PG_BRIDGE', 'auto').lower()
+            if setting == 'auto':
+                bridge_enabled = int(os.getenv('WEB_CONCURRENCY', '1')) > 1
+            else:
+                bridge_enabled = setting in ['true', 'on', '1']
+        self.bridge_enabled = bridge_enabled
+        self.bridge: Optional['PostgresBridge'] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'published': 0, 'delivered': 0, 'dropped': 0, 'notify_errors': 0}
+
+    # === ASSINATURA ===
+
+    def subscribe(self, channel: str, app=None) -> Subscription:
+        if self.bridge_enabled and app is not None:
+            self.ensure_bridge(app)
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    # === PUBLICAÇÃO ===
+
+    def publish(self, channel: str, event_type: str, data: Dict, event_id: Optional[int] = None) -> None:
+        """Publica para todos os processos (NOTIFY) ou só para este"""
+        item = {'channel': channel, 'event': event_type, 'id': event_id, 'data': data}
+        self.stats['published'] += 1
+        if self.bridge_enabled:
+            try:
+                notify(item)
+                return
+            except Exception as e:
+                self.stats['notify_errors'] += 1
+                logger.warning(f"NOTIFY falhou, entregando só neste processo: {e}")
+        self.deliver(item)
+
+    def publish_on_commit(self, db_session, channel: str, event_type: str, data: Dict,
+                          event_id: Optional[int] = None) -> None:
+        """Publica quando a transação for commitada (descartado no rollback)"""
+        db_session.info.setdefault(_PENDING_EVENTS, []).append((channel, event_type, data, event_id))
+
+    def deliver(self, item: Dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscriptions.get(item['channel'], ()))
+        for subscription in subscribers:
+            if subscription.put(item):
+                self.stats['delivered'] += 1
+            else:
+                # Conexão lenta com a fila cheia: o cliente se ressincroniza pelo since-id
+                self.stats['dropped'] += 1
+                subscription.put({'channel': item['channel'], 'event': 'resync', 'id': None, 'data': {}})
+
+    # === PONTE ENTRE PROCESSOS ===
+
+    def ensure_bridge(self, app) -> None:
+        with self._lock:
+            if self.bridge is None:
+                self.bridge = PostgresBridge(self, app)
+                self.bridge.start()
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            channels = len(self._subscriptions)
+            connections = sum(len(subscribers) for subscribers in self._subscriptions.values())
+        return dict(self.stats, bridge_enabled=self.bridge_enabled, channels=channels, connections=connections)
+
+
+def notify(item: Dict) -> None:
+    """pg_notify numa conexão própria (já fora da transação da requisição)"""
+    from app import db
+
+    payload = json.dumps(item, ensure_ascii=False, default=str)
+    if len(payload.encode()) > NOTIFY_MAX_BYTES:
+        # Mensagem grande demais para o NOTIFY: os clientes buscam pelo since-id
+        payload = json.dumps({'channel': item['channel'], 'event': 'resync', 'id': None, 'data': {}})
+    with db.engine.begin() as conn:
+        conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                     {'channel': NOTIFY_CHANNEL, 'payload': payload})
+
+
+class PostgresBridge:
+    """LISTEN numa conexão dedicada; cada NOTIFY vira deliver() no broker local"""
+
+    def __init__(self, broker: EventBroker, app, poll_timeout: float = 5.0):
+        self.broker = broker
+        self.app = app
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name='realtime-listen', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                backoff = 1
+            except Exception as e:
+                logger.warning(f"LISTEN do tempo real caiu, reconectando em {backoff}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _listen(self) -> None:
+        from app import db
+
+        with self.app.app_context():
+            fairy = db.engine.raw_connection()
+        fairy.detach()  # Conexão fica fora do pool enquanto escuta
+        conn = fairy.dbapi_connection
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            print(f"[REALTIME] Escutando NOTIFY em {NOTIFY_CHANNEL}")
+            while not self._stop.is_set():
+                if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    try:
+                        self.broker.deliver(json.loads(notification.payload))
+                    except (ValueError, KeyError) as e:
+                        logger.warning(f"NOTIFY inválido ignorado: {e}")
+        finally:
+            conn.close()
+
+
+# Instância global
+event_broker = EventBroker()
+
+
+def format_sse(item: Dict) -> str:
+    lines = []
+    if item.get('id') is not None:
+        lines.append(f"id: {item['id']}")
+    lines.append(f"event: {item['event']}")
+    lines.append(f"data: {json.dumps(item['data'], ensure_ascii=False, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(subscription: Subscription, backlog, last_id: int = 0,
+                  heartbeat: float = 15, max_seconds: Optional[float] = None):
+    """
+    Gerador SSE: mensagens perdidas (backlog) e depois os eventos do canal
+
+    Não usa o banco nem o contexto da requisição. Mensagens com id já enviado
+    (publicadas entre a assinatura e o backlog) são ignoradas.
+    """
+    max_seconds = max_seconds or float(os.getenv('REALTIME_STREAM_MAX_SECONDS', '300'))
+    give_up_at = time.monotonic() + max_seconds
+    try:
+        yield 'retry: 3000\n\n'
+        for item in backlog:
+            if item['event'] == 'message':
+                last_id = max(last_id, item['id'])
+            yield format_sse(item)
+        while time.monotonic() < give_up_at:
+            item = subscription.get(timeout=heartbeat)
+            if item is None:
+                # Heartbeat mantém a conexão atrás de proxies e detecta cliente desconectado
+                yield ': keep-alive\n\n'
+                continue
+            if item['event'] == 'message' and item['id'] is not None:
+                if item['id'] <= last_id:
+                    continue
+                last_id = item['id']
+            yield format_sse(item)
+        # Conexões longas são recicladas: o EventSource reconecta com Last-Event-ID
+    finally:
+        subscription.close()
+
+
+# === PUBLICAÇÃO NO COMMIT (eventos da sessão do SQLAlchemy) ===
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(db_session):
+    for channel, event_type, data, event_id in db_session.info.pop(_PENDING_EVENTS, []):
+        try:
+            event_broker.publish(channel, event_type, data, event_id)
+        except Exception as e:
+            logger.error(f"Erro ao publicar evento {event_type} em {channel}: {e}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_events(db_session, previous_transaction):
+    if not previous_transaction.nested:
+        db_session.info.pop(_PENDING_EVENTS, None)
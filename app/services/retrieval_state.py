@@ -0,0 +1,113 @@
+"""
+Estado de recuperação por sessão de chat (RAG incremental)
+
+Numa mesma conversa as palavras-chave mudam pouco de um turno para o outro.
+Cada sessão guarda o último conjunto de candidatos com seus scores; no turno
+seguinte só são consultadas as palavras-chave novas e a busca vetorial só é
+refeita quando o embedding da mensagem se afasta do anterior (drift).
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from cachetools import TTLCache
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Similaridade de cosseno entre dois vetores"""
+    va, vb = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(va) * np.linalg.norm(vb))
+    return float(va @ vb) / norm if norm else 0.0
+
+
+def merge_candidates(existing: List[Dict], new: List[Dict], key_fn: Callable[[Dict], object],
+                     score_key: Optional[str] = None, limit: int = 50,
+                     newest_first: bool = False) -> List[Dict]:
+    """
+    Une candidatos anteriores e novos sem duplicar
+
+    Os novos substituem os anteriores de mesma chave (scores atualizados). Com
+    score_key, a lista é reordenada por esse score (maior primeiro). Sem score,
+    newest_first põe os novos na frente: ao cortar em limit saem os mais
+    antigos, não os resultados do turno atual.
+    """
+    if newest_first:
+        merged: Dict[object, Dict] = {key_fn(c): c for c in new}
+        for candidate in existing:
+            merged.setdefault(key_fn(candidate), candidate)
+    else:
+        merged = {key_fn(c): c for c in existing}
+        for candidate in new:
+            merged[key_fn(candidate)] = candidate
+    result = list(merged.values())
+    if score_key:
+        result.sort(key=lambda c: c.get(score_key) or 0, reverse=True)
+    return result[:limit]
+
+
+@dataclass
+class SessionRetrievalState:
+    """Candidatos e sinais de consulta acumulados numa sessão"""
+    keywords: Set[str] = field(default_factory=set)
+    embedding: Optional[List[float]] = None  # Âncora para detectar drift
+    candidates: List[Dict] = field(default_factory=list)  # Modo regex
+    lexical: List[Dict] = field(default_factory=list)  # Modo híbrido, por retriever
+    vector: List[Dict] = field(default_factory=list)
+    turns: int = 0
+
+    def new_keywords(self, keywords: Iterable[str]) -> List[str]:
+        """Palavras-chave ainda não consultadas nesta sessão"""
+        return [k for k in keywords if k not in self.keywords]
+
+    def has_drifted(self, embedding: Optional[List[float]], threshold: float) -> bool:
+        """Verdadeiro quando a busca vetorial precisa ser refeita"""
+        if embedding is None:
+            return False
+        if self.embedding is None or not self.vector:
+            return True
+        return cosine_similarity(self.embedding, embedding) < threshold
+
+
+class RetrievalStateStore:
+    """Estados por sessão com expiração por inatividade"""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[int] = None):
+        self._states = TTLCache(
+            maxsize=maxsize or int(os.getenv('RAG_SESSION_STATE_SIZE', '1000')),
+            ttl=ttl or int(os.getenv('RAG_SESSION_STATE_TTL', '1800'))
+        )
+        self._lock = threading.Lock()
+        self.stats = {
+            'turns': 0,
+            'full_lookups': 0,
+            'lexical_skipped': 0,
+            'vector_skipped': 0,
+            'keywords_queried': 0,
+            'keywords_reused': 0
+        }
+
+    def get(self, session_id) -> SessionRetrievalState:
+        """Estado da sessão (criado no primeiro turno)"""
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = SessionRetrievalState()
+            # Reinserir renova o TTL a cada turno
+            self._states[session_id] = state
+            return state
+
+    def drop(self, session_id) -> None:
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def record(self, **counters) -> None:
+        with self._lock:
+            for key, value in counters.items():
+                self.stats[key] += value
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, active_sessions=len(self._states))
@@ -0,0 +1,69 @@
+"""
+Cache seguro para acesso concorrente (threads do gthread ou greenlets do gevent)
+
+dict/LRUCache/TTLCache do cachetools não são thread-safe: com vários turnos
+simultâneos no mesmo worker, uma escrita durante a iteração ou a expulsão de
+itens corrompe o cache. SafeCache envolve qualquer mapeamento com um RLock
+(que o monkey patch do gevent torna cooperativo).
+"""
+
+import threading
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+MISSING = object()
+
+
+class SafeCache:
+    """Mapeamento protegido por lock, com a interface usada pelos caches do RAG e do AIService"""
+
+    def __init__(self, data: Optional[MutableMapping] = None):
+        self._data = data if data is not None else {}
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def __getitem__(self, key) -> Any:
+        with self._lock:
+            return self._data[key]
+
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+
+    def __delitem__(self, key) -> None:
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __iter__(self) -> Iterator:
+        # Itera sobre uma cópia das chaves: escritas concorrentes não quebram o laço
+        return iter(self.keys())
+
+    def keys(self) -> List:
+        with self._lock:
+            return list(self._data.keys())
+
+    def items(self) -> List[Tuple]:
+        with self._lock:
+            return list(self._data.items())
+
+    def pop(self, key, default=None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self._data.items())
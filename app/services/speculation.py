@@ -0,0 +1,113 @@
+"""
+Geração especulativa da resposta em paralelo com a análise de risco
+
+A resposta do LLM começa a ser gerada com o nível de risco por padrões
+(RiskAnalyzer) enquanto a análise de sentimento do LLM ainda roda. Quando o
+veredito final sai:
+- mesmo nível (ou menor): o rascunho é aproveitado (acerto)
+- nível escalou: o rascunho é descartado e a resposta é gerada de novo com o
+  prompt do nível correto (erro); os tokens gastos no rascunho são contados
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RISK_ORDER = {'low': 1, 'moderate': 2, 'high': 3, 'critical': 4}
+
+
+@dataclass
+class Draft:
+    """Resposta gerada especulativamente"""
+    future: Future
+    risk_level: str
+    started_at: float = field(default_factory=time.perf_counter)
+    kept: Optional[bool] = None
+
+
+class SpeculativeGenerator:
+    """Dispara e resolve rascunhos de generate_response"""
+
+    def __init__(self, workers: Optional[int] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('CHAT_SPECULATIVE_GENERATION', 'true').lower() in ['true', 'on', '1']
+        self.enabled = enabled
+        self.workers = workers or int(os.getenv('CHAT_SPECULATION_WORKERS', '8'))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'started': 0, 'hits': 0, 'misses': 0, 'cancelled_before_start': 0,
+                      'wasted_tokens': 0, 'overlap_ms': 0.0}
+
+    def should_speculate(self, risk_level: str) -> bool:
+        """Só vale especular nos níveis em que o LLM é o caminho crítico"""
+        return self.enabled and risk_level in ('low', 'moderate')
+
+    def start(self, app, generate, risk_level: str, **kwargs) -> Draft:
+        """
+        Inicia generate(risk_level=..., **kwargs) em background, no app context
+
+        Args:
+            app: Aplicação Flask real (current_app._get_current_object())
+            generate: Normalmente ai_service.generate_response
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='speculative')
+            self.stats['started'] += 1
+
+        def run():
+            with app.app_context():
+                return generate(risk_level=risk_level, **kwargs)
+
+        return Draft(future=self._executor.submit(run), risk_level=risk_level)
+
+    def resolve(self, draft: Optional[Draft], final_risk_level: str) -> Optional[Draft]:
+        """Mantém o rascunho se o risco não escalou; senão cancela e devolve None"""
+        if draft is None:
+            return None
+        escalated = RISK_ORDER.get(final_risk_level, 1) > RISK_ORDER.get(draft.risk_level, 1)
+        with self._lock:
+            if not escalated:
+                draft.kept = True
+                self.stats['hits'] += 1
+                # Tempo da análise de risco em que a geração já estava andando
+                self.stats['overlap_ms'] += (time.perf_counter() - draft.started_at) * 1000
+                return draft
+            draft.kept = False
+            self.stats['misses'] += 1
+        if draft.future.cancel():
+            with self._lock:
+                self.stats['cancelled_before_start'] += 1
+        else:
+            draft.future.add_done_callback(self._count_wasted)
+        logger.info(f"Rascunho descartado: risco escalou de {draft.risk_level} para {final_risk_level}")
+        return None
+
+    def _count_wasted(self, future: Future) -> None:
+        try:
+            tokens = (future.result() or {}).get('tokens_used') or 0
+        except Exception:
+            tokens = 0
+        with self._lock:
+            self.stats['wasted_tokens'] += tokens
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            resolved = self.stats['hits'] + self.stats['misses']
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                overlap_ms=round(self.stats['overlap_ms'], 1),
+                hit_rate=round(self.stats['hits'] / resolved, 3) if resolved else 0.0,
+                avg_saved_ms=round(self.stats['overlap_ms'] / self.stats['hits'], 1) if self.stats['hits'] else 0.0
+            )
+
+
+# Instância global
+speculative_generator = SpeculativeGenerator()
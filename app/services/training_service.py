@@ -2,71 +2,117 @@
 Serviço de treinamento e embeddings para melhorar as respostas da IA
 """
 
+import json
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import openai
 from sqlalchemy import text
 from app import db
-from app.models import ChatMessage, DiaryEntry
+from app.models import ChatMessage, ChatSession, ChatMessageType, DiaryEntry
+from app.services.embedding_service import EmbeddingService, create_embedding_provider, vector_to_pg
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def message_risk_level(message: ChatMessage) -> Optional[str]:
+    """Nível de risco da mensagem (risk_indicators guarda o JSON completo da análise)"""
+    try:
+        return json.loads(message.risk_indicators or '{}').get('risk_level')
+    except (ValueError, AttributeError):
+        return None
+
+
 class AITrainingService:
     """Serviço para treinamento contínuo da IA usando embeddings"""
     
     def __init__(self):
         self.openai_client = openai
-        self.embedding_model = "text-embedding-ada-002"
+        # Pipeline em lote com deduplicação e cache persistente por hash de conteúdo
+        # Provedor selecionável: EMBEDDING_PROVIDER=openai (padrão) ou local (CPU)
+        self.embedding_service = EmbeddingService(
+            provider=create_embedding_provider(client=self.openai_client)
+        )
+        self.embedding_model = self.embedding_service.provider.model
     
     def generate_embedding(self, text: str) -> List[float]:
-        """Gera embedding para um texto"""
+        """Gera embedding para um texto (reutiliza o cache quando possível)"""
         try:
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
+            return self.embedding_service.embed_text(text)
         except Exception as e:
             logger.error(f"Erro ao gerar embedding: {e}")
             return None
     
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings para vários textos em lote"""
+        try:
+            return self.embedding_service.embed_texts(texts)
+        except Exception as e:
+            logger.error(f"Erro ao gerar embeddings em lote: {e}")
+            return [None] * len(texts)
+    
     def store_conversation_embedding(self, message_id: int = None, 
                                    diary_id: int = None, text: str = None,
                                    risk_level: str = None, sentiment_score: float = None):
         """Armazena embedding de conversa no banco"""
         if not text:
             return False
+        stored = self.store_conversation_embeddings([{
+            'message_id': message_id,
+            'diary_id': diary_id,
+            'text': text,
+            'risk_level': risk_level,
+            'sentiment_score': sentiment_score
+        }])
+        return stored > 0
+    
+    def store_conversation_embeddings(self, items: List[Dict], raise_errors: bool = False) -> int:
+        """
+        Armazena embeddings de várias conversas com um único insert em lote
+        
+        Args:
+            items: Dicts com text, message_id, diary_id, risk_level e sentiment_score
+            raise_errors: Propaga o erro do insert (jobs da fila: o job é reenfileirado)
             
-        embedding = self.generate_embedding(text)
-        if not embedding:
-            return False
+        Returns:
+            Número de linhas gravadas
+        """
+        items = [item for item in items if item.get('text')]
+        if not items:
+            return 0
+        
+        embeddings = self.generate_embeddings([item['text'] for item in items])
+        rows = [
+            {
+                'message_id': item.get('message_id'),
+                'diary_id': item.get('diary_id'),
+                'embedding': vector_to_pg(embedding),
+                'risk_level': item.get('risk_level'),
+                'sentiment_score': item.get('sentiment_score')
+            }
+            for item, embedding in zip(items, embeddings) if embedding
+        ]
+        if not rows:
+            return 0
         
         try:
-            # Converter embedding para formato PostgreSQL
-            embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-            
             query = text("""
                 INSERT INTO conversation_embeddings 
                 (chat_message_id, diary_entry_id, embedding, risk_level, sentiment_score)
-                VALUES (:message_id, :diary_id, :embedding::vector, :risk_level, :sentiment_score)
+                VALUES (:message_id, :diary_id, CAST(:embedding AS vector), :risk_level, :sentiment_score)
             """)
             
-            db.session.execute(query, {
-                'message_id': message_id,
-                'diary_id': diary_id,
-                'embedding': embedding_str,
-                'risk_level': risk_level,
-                'sentiment_score': sentiment_score
-            })
+            # executemany: uma ida ao banco e um único commit para todo o lote
+            db.session.execute(query, rows)
             db.session.commit()
-            return True
+            return len(rows)
             
         except Exception as e:
-            logger.error(f"Erro ao armazenar embedding: {e}")
+            logger.error(f"Erro ao armazenar embeddings: {e}")
             db.session.rollback()
-            return False
+            if raise_errors:
+                raise
+            return 0
     
     def find_similar_conversations(self, text: str, limit: int = 5) -> List[Dict]:
         """Encontra conversas similares usando busca vetorial"""
@@ -75,7 +121,7 @@ class AITrainingService:
             return []
         
         try:
-            embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+            embedding_str = vector_to_pg(embedding)
             
             query = text("""
                 SELECT 
@@ -86,11 +132,11 @@ class AITrainingService:
                     ce.sentiment_score,
                     cm.content as message_content,
                     de.content as diary_content,
-                    (ce.embedding <=> :embedding::vector) as similarity_distance
+                    (ce.embedding <=> CAST(:embedding AS vector)) as similarity_distance
                 FROM conversation_embeddings ce
                 LEFT JOIN chat_messages cm ON ce.chat_message_id = cm.id
                 LEFT JOIN diary_entries de ON ce.diary_entry_id = de.id
-                ORDER BY ce.embedding <=> :embedding::vector
+                ORDER BY ce.embedding <=> CAST(:embedding AS vector)
                 LIMIT :limit
             """)
             
@@ -130,33 +176,31 @@ class AITrainingService:
     
     def train_from_successful_conversations(self):
         """Treina usando conversas bem avaliadas"""
-        # Buscar conversas com boa avaliação (4-5 estrelas)
-        successful_sessions = db.session.execute(text("""
-            SELECT cs.id, cs.user_rating
-            FROM chat_sessions cs
-            WHERE cs.user_rating >= 4
-            AND cs.ended_at IS NOT NULL
-        """)).fetchall()
+        # Buscar mensagens de usuário das conversas com boa avaliação (4-5 estrelas)
+        messages = ChatMessage.query.join(
+            ChatSession, ChatSession.id == ChatMessage.session_id
+        ).filter(
+            ChatSession.user_rating >= 4,
+            ChatSession.ended_at.isnot(None),
+            ChatMessage.message_type == ChatMessageType.USER
+        ).order_by(ChatMessage.session_id, ChatMessage.created_at).all()
         
-        processed = 0
-        for session in successful_sessions:
-            # Processar mensagens dessa sessão
-            messages = ChatMessage.query.filter_by(
-                session_id=session.id
-            ).order_by(ChatMessage.created_at).all()
-            
-            for msg in messages:
-                if msg.message_type == 'USER':
-                    # Armazenar embedding da mensagem do usuário
-                    self.store_conversation_embedding(
-                        message_id=msg.id,
-                        text=msg.content,
-                        risk_level=msg.risk_indicators,
-                        sentiment_score=msg.sentiment_score
-                    )
-                    processed += 1
+        # Embeddings gerados em lote e gravados com um único insert
+        processed = self.store_conversation_embeddings([
+            {
+                'message_id': msg.id,
+                'text': msg.content,
+                'risk_level': message_risk_level(msg),
+                'sentiment_score': msg.sentiment_score
+            }
+            for msg in messages
+        ])
         
-        logger.info(f"Processadas {processed} mensagens para treinamento")
+        stats = self.embedding_service.get_statistics()
+        logger.info(
+            f"Processadas {processed} mensagens para treinamento | "
+            f"{stats['embeddings_per_second']} embeddings/s | cache hit {stats['cache_hit_rate']:.0%}"
+        )
         return processed
     
     def analyze_conversation_patterns(self) -> Dict:
@@ -203,6 +247,12 @@ class AITrainingService:
             logger.error(f"Erro na análise de padrões: {e}")
             return {}
     
+    def get_embedding_statistics(self) -> Dict:
+        """Retorna throughput e taxa de cache do pipeline de embeddings"""
+        stats = self.embedding_service.get_statistics()
+        stats['total_embeddings'] = self.get_embedding_count()
+        return stats
+    
     def get_embedding_count(self) -> int:
         """Retorna número total de embeddings armazenados"""
         try:
@@ -232,7 +282,7 @@ def setup_embeddings_table():
             );
             
             CREATE INDEX IF NOT EXISTS idx_conversation_embeddings_vector 
-            ON conversation_embeddings USING ivfflat (embedding vector_cosine_ops);
+            ON conversation_embeddings USING hnsw (embedding vector_cosine_ops);
         """))
         db.session.commit()
         return True
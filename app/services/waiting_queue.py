@@ -0,0 +1,252 @@
+"""
+Fila de espera do chat 1a1 (clientes aguardando voluntário)
+
+Reivindicação atômica: antes, accept_client lia a sessão, conferia
+status == 'WAITING' e depois gravava; dois voluntários clicando juntos
+ficavam com o mesmo cliente. Agora:
+- claim_session: um único UPDATE ... WHERE status = 'WAITING' AND
+  volunteer_id IS NULL RETURNING; quem perde a corrida recebe None
+- claim_next: tenta os primeiros da lista de espera (mesma ordem que o
+  voluntário vê) e, se outros voluntários já os pegaram, escolhe e
+  reivindica numa única instrução; a subconsulta usa FOR UPDATE SKIP
+  LOCKED, então voluntários simultâneos pegam clientes diferentes sem
+  esperar uns pelos outros
+
+Nenhuma função faz commit: a rota publica o status e commita, e o lock da
+linha dura só até lá.
+
+Lista de espera (WaitingQueue):
+- Uma única consulta traz as sessões em espera com o cliente e a triagem
+  mais recente (janela row_number sobre triage_logs, só dos clientes na
+  fila); o índice parcial idx_chat1a1_sessions_waiting cobre o filtro
+- Ordem por pontuação: nível de prioridade + risco da triagem + tempo de
+  espera (aging: um ponto a cada WAITING_QUEUE_AGING_SECONDS), para que
+  ninguém fique esquecido no fim da fila. Como a espera muda a cada
+  instante, a ordem é recalculada na leitura sobre o snapshot
+- O snapshot fica em cache por alguns segundos e é invalidado no commit de
+  entrada na fila, reivindicação ou triagem nova. Em outros workers vive no
+  máximo o TTL; a reivindicação continua atômica no banco
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.chat1a1 import Chat1a1Session
+from app.models.triage import RiskLevel, TriageLog
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Pontos de prioridade: critical sempre à frente, high antes de normal
+PRIORITY_POINTS = {'critical': 100, 'high': 20, 'normal': 0}
+RISK_POINTS = {RiskLevel.CRITICAL: 10, RiskLevel.HIGH: 6, RiskLevel.MODERATE: 3, RiskLevel.LOW: 0}
+
+PRIORITY_LABELS = {'critical': 'Urgente', 'high': 'Alto', 'normal': 'Normal'}
+PRIORITY_COLORS = {'critical': '#d63031', 'high': '#e17055', 'normal': '#00b894'}
+
+# Candidatos tentados por claim_next antes de recorrer ao SKIP LOCKED
+CLAIM_CANDIDATES = 5
+
+_QUEUE_CHANGED = 'waiting_queue_changed'
+
+
+def priority_rank():
+    """Prioridade: critical > high > normal (menor = atende antes)"""
+    return sa.case(
+        (Chat1a1Session.priority_level == 'critical', 1),
+        (Chat1a1Session.priority_level == 'high', 2),
+        else_=3
+    )
+
+
+def waiting_filter():
+    return sa.and_(Chat1a1Session.status == 'WAITING', Chat1a1Session.volunteer_id.is_(None))
+
+
+def priority_score(entry: Dict, now: datetime, aging_seconds: float) -> float:
+    """Maior = atende antes"""
+    triage = entry['triage_log']
+    waited = max(0.0, (now - entry['session']['started_at']).total_seconds())
+    return (PRIORITY_POINTS.get(entry['session']['priority_level'], 0)
+            + (RISK_POINTS.get(triage['risk_level'], 0) if triage else 0)
+            + waited / aging_seconds)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devolve datetime sem fuso; no PostgreSQL a coluna já é timestamptz
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class WaitingQueue:
+    """Snapshot da lista de espera, ordenado por prioridade com aging"""
+
+    def __init__(self, ttl: Optional[float] = None, aging_seconds: Optional[float] = None, clock=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('WAITING_QUEUE_CACHE_TTL', '10'))
+        self.aging_seconds = aging_seconds or float(os.getenv('WAITING_QUEUE_AGING_SECONDS', '60'))
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._snapshot: Optional[List[Dict]] = None
+        self._loaded_at: Optional[datetime] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+    def _load(self) -> List[Dict]:
+        """Sessões em espera + cliente + triagem mais recente, numa única consulta"""
+        waiting_users = select(Chat1a1Session.user_id).where(waiting_filter())
+        latest_triage = select(
+            TriageLog.id, TriageLog.user_id,
+            func.row_number().over(
+                partition_by=TriageLog.user_id,
+                order_by=(TriageLog.created_at.desc(), TriageLog.id.desc())
+            ).label('position')
+        ).where(TriageLog.user_id.in_(waiting_users)).subquery()
+
+        rows = db.session.execute(
+            select(
+                Chat1a1Session.id, Chat1a1Session.priority_level, Chat1a1Session.started_at,
+                User.id.label('client_id'), User.first_name, User.last_name, User.email,
+                TriageLog.risk_level, TriageLog.emotional_state, TriageLog.notes
+            )
+            .join(User, User.id == Chat1a1Session.user_id)
+            .outerjoin(latest_triage, sa.and_(latest_triage.c.user_id == Chat1a1Session.user_id,
+                                              latest_triage.c.position == 1))
+            .outerjoin(TriageLog, TriageLog.id == latest_triage.c.id)
+            .where(waiting_filter())
+        ).all()
+
+        return [{
+            'session': {'id': row.id, 'priority_level': row.priority_level,
+                        'started_at': _as_utc(row.started_at)},
+            'client': {'id': row.client_id, 'first_name': row.first_name,
+                       'last_name': row.last_name, 'email': row.email},
+            'triage_log': {'risk_level': row.risk_level, 'emotional_state': row.emotional_state,
+                           'notes': row.notes} if row.risk_level is not None else None,
+            'priority_label': PRIORITY_LABELS.get(row.priority_level, 'Normal'),
+            'priority_color': PRIORITY_COLORS.get(row.priority_level, '#00b894')
+        } for row in rows]
+
+    def snapshot(self) -> List[Dict]:
+        now = self.clock()
+        with self._lock:
+            if self._snapshot is not None and (now - self._loaded_at).total_seconds() < self.ttl:
+                self.stats['hits'] += 1
+                return self._snapshot
+            generation = self._generation
+        snapshot = self._load()
+        with self._lock:
+            self.stats['loads'] += 1
+            # Invalidado durante a consulta: usa o resultado, mas não guarda
+            if generation == self._generation:
+                self._snapshot, self._loaded_at = snapshot, now
+        return snapshot
+
+    def waiting_list(self) -> List[Dict]:
+        """Fila em ordem de atendimento, com o tempo de espera atual de cada cliente"""
+        now = self.clock()
+        ordered = sorted(
+            self.snapshot(),
+            key=lambda entry: (-priority_score(entry, now, self.aging_seconds),
+                               entry['session']['started_at'], entry['session']['id'])
+        )
+        return [dict(entry, waiting_time=now - entry['session']['started_at']) for entry in ordered]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._snapshot is not None:
+                self.stats['invalidations'] += 1
+            self._snapshot = None
+            self._generation += 1
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            size = len(self._snapshot) if self._snapshot is not None else None
+        return dict(self.stats, ttl=self.ttl, aging_seconds=self.aging_seconds, size=size)
+
+
+# Instância global
+waiting_queue = WaitingQueue()
+
+
+# === REIVINDICAÇÃO ===
+
+def _claim(criteria, volunteer_id: int) -> Optional[Chat1a1Session]:
+    stmt = update(Chat1a1Session).where(*criteria).values(
+        volunteer_id=volunteer_id, status='ACTIVE'
+    ).returning(Chat1a1Session)
+    # populate_existing: a sessão já carregada no identity map recebe os valores novos
+    session = db.session.execute(
+        stmt, execution_options={'synchronize_session': False, 'populate_existing': True}
+    ).scalar_one_or_none()
+    if session is not None:
+        # UPDATE em massa não passa pelo after_flush: marca a fila para invalidar no commit
+        db.session.info[_QUEUE_CHANGED] = True
+    return session
+
+
+def claim_session(session_id: int, volunteer_id: int) -> Optional[Chat1a1Session]:
+    """Reivindica a sessão se ainda estiver em espera; None se outro voluntário chegou antes"""
+    return _claim([Chat1a1Session.id == session_id, waiting_filter()], volunteer_id)
+
+
+def claim_next(volunteer_id: int) -> Optional[Chat1a1Session]:
+    """
+    Reivindica a próxima sessão da fila; None se a fila estiver vazia
+
+    Segue a ordem da lista de espera (prioridade, risco e aging). Se os
+    primeiros candidatos já foram pegos por outros voluntários, recorre à
+    ordem por nível e chegada com SKIP LOCKED.
+    """
+    for entry in waiting_queue.waiting_list()[:CLAIM_CANDIDATES]:
+        session = claim_session(entry['session']['id'], volunteer_id)
+        if session is not None:
+            return session
+
+    candidate = select(Chat1a1Session.id).where(waiting_filter()).order_by(
+        priority_rank(), Chat1a1Session.started_at.asc(), Chat1a1Session.id.asc()
+    ).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+    return _claim([Chat1a1Session.id == candidate, waiting_filter()], volunteer_id)
+
+
+# === INVALIDAÇÃO (eventos da sessão do SQLAlchemy) ===
+
+# Colunas da sessão que mudam a fila (message_count etc. não invalidam)
+_QUEUE_COLUMNS = ('status', 'volunteer_id', 'priority_level')
+
+
+def _changes_queue(obj, is_dirty: bool) -> bool:
+    if isinstance(obj, TriageLog):
+        return True
+    if not isinstance(obj, Chat1a1Session):
+        return False
+    if not is_dirty:
+        return True
+    state = sa.inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in _QUEUE_COLUMNS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _capture_queue_changes(db_session, flush_context):
+    changed = any(_changes_queue(obj, False) for obj in list(db_session.new) + list(db_session.deleted)) \
+        or any(_changes_queue(obj, True) for obj in db_session.dirty)
+    if changed:
+        db_session.info[_QUEUE_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(db_session):
+    if db_session.info.pop(_QUEUE_CHANGED, False):
+        waiting_queue.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changes(db_session, previous_transaction):
+    if not previous_transaction.nested:
+        db_session.info.pop(_QUEUE_CHANGED, None)
@@ -274,6 +274,28 @@ async function endCurrentChat() {
 }
 
 // Enviar mensagem
+// Envia a mensagem com Idempotency-Key: repetições (rede instável) reutilizam a
+// mesma chave e o servidor devolve a resposta original, sem duplicar a mensagem
+async function postChatMessage(payload, retries = 2) {
+    const idempotencyKey = (window.crypto && crypto.randomUUID) ?
+        crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    for (let attempt = 0; ; attempt++) {
+        try {
+            const response = await fetch('/chat/api/chat/send', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
+                credentials: 'include',
+                body: JSON.stringify(payload)
+            });
+            // 409: a requisição original ainda está em andamento
+            if (response.status !== 409 || attempt >= retries) return response;
+        } catch (error) {
+            if (attempt >= retries) throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+    }
+}
+
 async function sendMessage() {
     const text = chatInput.value.trim();
     if (!text) return;
@@ -300,19 +322,25 @@ async function sendMessage() {
     showTypingIndicator();
     
     try {
-        const response = await fetch('/chat/api/chat/send', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            credentials: 'include',
-            body: JSON.stringify({ 
-                message: text, 
-                session_id: currentSessionId 
-            })
+        const response = await postChatMessage({ 
+            message: text, 
+            session_id: currentSessionId 
         });
         
+        // 429: limite de mensagens atingido; Retry-After diz quando tentar de novo
+        if (response.status === 429) {
+            hideTypingIndicator();
+            const retryAfter = response.headers.get('Retry-After') || '60';
+            showError(`Muitas mensagens em pouco tempo. Tente novamente em ${retryAfter}s.`);
+            return;
+        }
         if (!response.ok) throw new Error('Erro ao enviar mensagem');
         
-        const data = await response.json();
+        let data = await response.json();
+        // Modo assíncrono: 202 + job; aguardar a resposta da IA
+        if (response.status === 202 && data.job_id) {
+            data = await waitForChatJob(data.status_url);
+        }
         hideTypingIndicator();
         
         if (data.success && data.ai_response) {
@@ -322,6 +350,17 @@ async function sendMessage() {
             if (data.risk_assessment && data.risk_assessment.requires_triage) {
                 handleTriageActivation(data.risk_assessment);
             }
+            
+            // Risco crítico: resposta personalizada chega depois da mensagem de crise
+            if (data.follow_up) {
+                waitForChatJob(data.follow_up.status_url)
+                    .then(followUp => {
+                        if (followUp.success && followUp.ai_response) {
+                            renderMessage(followUp.ai_response.content, 'ai');
+                        }
+                    })
+                    .catch(error => console.warn('Continuação da resposta indisponível:', error));
+            }
         } else {
             showError('Erro ao obter resposta da IA');
         }
@@ -336,6 +375,16 @@ async function sendMessage() {
     }
 }
 
+// Aguardar um job de geração (long polling; 202 enquanto pendente)
+async function waitForChatJob(statusUrl, maxAttempts = 20) {
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+        const response = await fetch(statusUrl + '?wait=10', { credentials: 'include' });
+        if (response.status === 202) continue;
+        return await response.json();
+    }
+    throw new Error('Tempo esgotado aguardando resposta da IA');
+}
+
 // Renderizar mensagem
 function renderMessage(content, sender, timestamp = null) {
     const messageDiv = document.createElement('div');
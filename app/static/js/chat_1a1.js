@@ -4,8 +4,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const sendBtn = document.getElementById('send-btn');
     const sessionId = chatMessages ? chatMessages.dataset.sessionId : null;
     let lastMessageCount = 0;
+    let lastMessageId = 0;
+    let pollTimer = null;
 
-    // Função para buscar mensagens
+    // Função para buscar mensagens (carga inicial e fallback sem EventSource)
     function fetchMessages() {
         if (!sessionId) return;
         
@@ -32,46 +34,104 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.error('Erro ao buscar mensagens:', error);
             });
     }
+
+    // Tempo real: mensagens chegam por Server-Sent Events
+    function connectStream() {
+        const source = new EventSource(`/volunteer/api/chat1a1/${sessionId}/stream?since_id=${lastMessageId}`);
+        source.addEventListener('message', function(e) {
+            const msg = JSON.parse(e.data);
+            if (msg.id <= lastMessageId) return;
+            appendMessage(msg);
+            lastMessageCount++;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+            if (msg.message_type !== 'volunteer') {
+                showTyping(false);
+                playNotification();
+            }
+        });
+        source.addEventListener('typing', function(e) {
+            const data = JSON.parse(e.data);
+            if (data.sender_type !== 'volunteer') showTyping(data.typing);
+        });
+        source.addEventListener('status', function(e) {
+            const data = JSON.parse(e.data);
+            if (data.status === 'COMPLETED') {
+                showSessionWarning('Sessão encerrada.');
+                source.close();
+            }
+        });
+        source.addEventListener('resync', fetchMessages);
+    }
+
+    function showTyping(typing) {
+        let indicator = document.getElementById('typing-indicator');
+        if (!indicator) {
+            indicator = document.createElement('div');
+            indicator.id = 'typing-indicator';
+            indicator.className = 'message-time';
+            indicator.textContent = 'Digitando...';
+            chatMessages.parentNode.insertBefore(indicator, chatMessages.nextSibling);
+        }
+        indicator.style.display = typing ? 'block' : 'none';
+        clearTimeout(indicator._timeout);
+        if (typing) {
+            indicator._timeout = setTimeout(() => { indicator.style.display = 'none'; }, 5000);
+        }
+    }
+
+    // Avisar que está digitando (no máximo a cada 3 segundos)
+    let lastTypingSent = 0;
+    function sendTyping() {
+        const now = Date.now();
+        if (now - lastTypingSent < 3000) return;
+        lastTypingSent = now;
+        fetch(`/volunteer/api/chat1a1/${sessionId}/typing`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({typing: true})
+        }).catch(() => {});
+    }
     
     // Função separada para atualizar display das mensagens
     function updateMessagesDisplay(messages) {
         chatMessages.innerHTML = '';
+        messages.forEach(appendMessage);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function appendMessage(msg) {
+        const div = document.createElement('div');
+        const isVolunteer = msg.message_type === 'volunteer';
+        div.className = `chat-message ${isVolunteer ? 'from-volunteer' : 'from-client'}`;
         
-        messages.forEach(msg => {
-            const div = document.createElement('div');
-            const isVolunteer = msg.message_type === 'volunteer';
-            div.className = `chat-message ${isVolunteer ? 'from-volunteer' : 'from-client'}`;
-            
-            // Criar avatar
-            const avatarDiv = document.createElement('div');
-            avatarDiv.className = 'message-avatar';
-            avatarDiv.innerHTML = `<i class="${isVolunteer ? 'fas fa-heart' : 'fas fa-user'}"></i>`;
-            
-            // Criar conteúdo da mensagem
-            const contentDiv = document.createElement('div');
-            contentDiv.className = 'message-content';
-            
-            const messageText = document.createElement('div');
-            messageText.textContent = msg.content;
-            
-            const timeSpan = document.createElement('div');
-            timeSpan.className = 'message-time';
-            const msgTime = new Date(msg.created_at);
-            timeSpan.textContent = msgTime.toLocaleTimeString('pt-BR', {
-                hour: '2-digit',
-                minute: '2-digit'
-            });
-            
-            contentDiv.appendChild(messageText);
-            contentDiv.appendChild(timeSpan);
-            
-            div.appendChild(avatarDiv);
-            div.appendChild(contentDiv);
-            
-            chatMessages.appendChild(div);
+        // Criar avatar
+        const avatarDiv = document.createElement('div');
+        avatarDiv.className = 'message-avatar';
+        avatarDiv.innerHTML = `<i class="${isVolunteer ? 'fas fa-heart' : 'fas fa-user'}"></i>`;
+        
+        // Criar conteúdo da mensagem
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'message-content';
+        
+        const messageText = document.createElement('div');
+        messageText.textContent = msg.content;
+        
+        const timeSpan = document.createElement('div');
+        timeSpan.className = 'message-time';
+        const msgTime = new Date(msg.created_at);
+        timeSpan.textContent = msgTime.toLocaleTimeString('pt-BR', {
+            hour: '2-digit',
+            minute: '2-digit'
         });
         
-        chatMessages.scrollTop = chatMessages.scrollHeight;
+        contentDiv.appendChild(messageText);
+        contentDiv.appendChild(timeSpan);
+        
+        div.appendChild(avatarDiv);
+        div.appendChild(contentDiv);
+        
+        chatMessages.appendChild(div);
+        lastMessageId = Math.max(lastMessageId, msg.id);
     }
     function playNotification() {
         try {
@@ -112,8 +172,8 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(data => {
                 if (data.success) {
                     chatInput.value = '';
-                    // Buscar mensagens imediatamente após enviar
-                    setTimeout(fetchMessages, 500);
+                    // Sem EventSource, buscar mensagens imediatamente após enviar
+                    if (pollTimer) setTimeout(fetchMessages, 500);
                 } else {
                     console.error('Erro ao enviar:', data.error);
                 }
@@ -156,13 +216,28 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (sendBtn) sendBtn.click();
             }
         });
+        chatInput.addEventListener('input', function() {
+            if (sessionId) sendTyping();
+        });
     }
 
     // Atualização automática
     if (sessionId) {
-        // Carregar mensagens iniciais
-        fetchMessages();
-        // Atualização mais suave a cada 5 segundos
-        setInterval(fetchMessages, 5000);
+        if (window.EventSource) {
+            // Histórico pela API; depois só as mensagens novas, pelo stream
+            fetch(`/volunteer/api/messages/${sessionId}`)
+                .then(res => res.json())
+                .then(data => {
+                    if (data.success) {
+                        lastMessageCount = data.messages.length;
+                        updateMessagesDisplay(data.messages);
+                    }
+                })
+                .finally(connectStream);
+        } else {
+            // Navegador sem SSE: polling a cada 5 segundos
+            fetchMessages();
+            pollTimer = setInterval(fetchMessages, 5000);
+        }
     }
 });
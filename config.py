@@ -20,6 +20,11 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
+        # Turnos simultâneos no mesmo worker (gevent/threads): gunicorn.conf.py deriva
+        # worker_connections deste pool, menos DB_POOL_RESERVED para threads auxiliares
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
         'echo': False,
         'connect_args': {
             'client_encoding': 'utf8',
@@ -54,7 +59,98 @@ class Config:
     OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', '500'))
     OPENAI_TEMPERATURE = float(os.environ.get('OPENAI_TEMPERATURE', '0.5'))
     USE_LOCAL_MODELS = os.environ.get('USE_LOCAL_MODELS', 'true').lower() in ['true', 'on', '1']
-    
+
+    # Embeddings - lote máximo por requisição e cache em memória (hash de conteúdo)
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '2048'))
+    EMBEDDING_MEMORY_CACHE_SIZE = int(os.environ.get('EMBEDDING_MEMORY_CACHE_SIZE', '5000'))
+    EMBEDDING_PROVIDER = os.environ.get('EMBEDDING_PROVIDER', 'openai')  # openai | local
+    LOCAL_EMBEDDING_MODEL = os.environ.get('LOCAL_EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+    LOCAL_EMBEDDING_QUANTIZE = os.environ.get('LOCAL_EMBEDDING_QUANTIZE', 'false').lower() in ['true', 'on', '1']
+
+    # RAG - modo de recuperação (regex | hybrid) e orçamento de latência da busca híbrida
+    RAG_RETRIEVAL_MODE = os.environ.get('RAG_RETRIEVAL_MODE', 'regex')
+    RAG_HYBRID_BUDGET_MS = int(os.environ.get('RAG_HYBRID_BUDGET_MS', '400'))
+    RAG_RRF_K = int(os.environ.get('RAG_RRF_K', '60'))
+    # Busca incremental por sessão (estado expira após inatividade; drift = similaridade mínima)
+    RAG_SESSION_STATE_TTL = int(os.environ.get('RAG_SESSION_STATE_TTL', '1800'))
+    RAG_SESSION_STATE_SIZE = int(os.environ.get('RAG_SESSION_STATE_SIZE', '1000'))
+    RAG_DRIFT_THRESHOLD = float(os.environ.get('RAG_DRIFT_THRESHOLD', '0.9'))
+    # Aquecimento no boot e snapshots periódicos dos caches (arquivo local, troca atômica)
+    RAG_WARMUP_ENABLED = os.environ.get('RAG_WARMUP_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RAG_WARMUP_SIGNATURES = int(os.environ.get('RAG_WARMUP_SIGNATURES', '50'))
+    RAG_SNAPSHOT_PATH = os.environ.get('RAG_SNAPSHOT_PATH')  # Padrão: instance/rag_snapshot.json
+    RAG_SNAPSHOT_INTERVAL = int(os.environ.get('RAG_SNAPSHOT_INTERVAL', '300'))
+
+    # Ingestão de documentos de treinamento (tamanho/sobreposição dos trechos e lote de embeddings)
+    INGESTION_CHUNK_SIZE = int(os.environ.get('INGESTION_CHUNK_SIZE', '1000'))
+    INGESTION_CHUNK_OVERLAP = int(os.environ.get('INGESTION_CHUNK_OVERLAP', '200'))
+    INGESTION_BATCH_SIZE = int(os.environ.get('INGESTION_BATCH_SIZE', '64'))
+    INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', '1'))
+
+    # Chat assíncrono: /api/chat/send responde 202 e a geração roda num pool de threads
+    CHAT_ASYNC_MODE = os.environ.get('CHAT_ASYNC_MODE', 'false').lower() in ['true', 'on', '1']
+    CHAT_JOB_WORKERS = int(os.environ.get('CHAT_JOB_WORKERS', '8'))
+    CHAT_JOB_TTL = int(os.environ.get('CHAT_JOB_TTL', '600'))
+    # Risco crítico: resposta de crise pré-computada imediata + resposta da IA em background
+    CHAT_CRISIS_FAST_PATH = os.environ.get('CHAT_CRISIS_FAST_PATH', 'true').lower() in ['true', 'on', '1']
+    # Resposta gerada em paralelo com a análise de sentimento (descartada se o risco escalar)
+    CHAT_SPECULATIVE_GENERATION = os.environ.get('CHAT_SPECULATIVE_GENERATION', 'true').lower() in ['true', 'on', '1']
+    CHAT_SPECULATION_WORKERS = int(os.environ.get('CHAT_SPECULATION_WORKERS', '8'))
+    # Histórico no prompt: resumo da sessão + últimos turnos (resumo refeito em background)
+    CHAT_HISTORY_TURNS = int(os.environ.get('CHAT_HISTORY_TURNS', '4'))
+    CHAT_SUMMARY_MARGIN_TURNS = int(os.environ.get('CHAT_SUMMARY_MARGIN_TURNS', '1'))  # Turnos fora da janela antes de resumir
+    CHAT_SUMMARY_RETRY_SECONDS = int(os.environ.get('CHAT_SUMMARY_RETRY_SECONDS', '600'))  # Novo pedido após job pendente/pulado
+    # Cache em memória dos últimos turnos por sessão (atualizado no commit)
+    CHAT_HISTORY_CACHE_ENABLED = os.environ.get('CHAT_HISTORY_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    CHAT_HISTORY_CACHE_SESSIONS = int(os.environ.get('CHAT_HISTORY_CACHE_SESSIONS', '5000'))
+    CHAT_HISTORY_CACHE_TTL = int(os.environ.get('CHAT_HISTORY_CACHE_TTL', '3600'))
+    # Lista de conversas: páginas por usuário em cache curto, invalidadas em cada escrita
+    CONVERSATION_LIST_CACHE_ENABLED = os.environ.get('CONVERSATION_LIST_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    CONVERSATION_LIST_CACHE_TTL = int(os.environ.get('CONVERSATION_LIST_CACHE_TTL', '30'))
+    # Prazo do turno do chat: statement_timeout do RAG, timeouts dos provedores e etapas opcionais
+    CHAT_TURN_BUDGET_SECONDS = float(os.environ.get('CHAT_TURN_BUDGET_SECONDS', '25'))
+    CHAT_DEADLINE_MIN_SECONDS = os.environ.get('CHAT_DEADLINE_MIN_SECONDS', 'rag=2,sentiment=3')  # Mínimo por etapa opcional
+
+    # Idempotency-Key em /api/chat/send: repetições recebem a resposta gravada
+    IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() in ['true', 'on', '1']
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '3600'))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '30'))
+
+    # Fila de jobs no PostgreSQL (false = pool de threads local, sem durabilidade)
+    JOB_QUEUE_ENABLED = os.environ.get('JOB_QUEUE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # Threads no processo web; sem valor: 1, ou 0 com workers gevent (jobs CPU-bound travariam o hub)
+    JOB_EMBEDDED_WORKERS = int(os.environ['JOB_EMBEDDED_WORKERS']) if os.environ.get('JOB_EMBEDDED_WORKERS') else None
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', '300'))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '2'))
+
+    # Admissão das chamadas ao LLM: vagas simultâneas, fila por risco e espera máxima por nível
+    LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', '8'))
+    LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', '32'))
+    LLM_RESERVED_SLOTS = int(os.environ.get('LLM_RESERVED_SLOTS', '2'))  # Só high/critical
+    LLM_QUEUE_TIMEOUTS = os.environ.get('LLM_QUEUE_TIMEOUTS', 'low=5,moderate=10,high=30,critical=60')
+
+    # Degradação automática do chat por p95/erros das etapas (nunca afeta high/critical)
+    DEGRADATION_ENABLED = os.environ.get('DEGRADATION_ENABLED', 'true').lower() in ['true', 'on', '1']
+    DEGRADATION_P95_MS = os.environ.get('DEGRADATION_P95_MS', 'rag=1500,sentiment=4000,llm_reply=8000')
+    DEGRADATION_MAX_ERROR_RATE = float(os.environ.get('DEGRADATION_MAX_ERROR_RATE', '0.2'))
+    DEGRADATION_FORCE_LEVEL = os.environ.get('DEGRADATION_FORCE_LEVEL')  # 0-4, para operação manual
+
+    # Limite de requisições (token bucket por usuário e por IP) nas rotas que chamam o LLM
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory | sqlite (entre workers)
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')  # Padrão: <tmp>/porvoce_rate_limit.sqlite3
+    RATE_LIMIT_CHAT_SEND = os.environ.get('RATE_LIMIT_CHAT_SEND', 'user=20/60,ip=60/60')
+    RATE_LIMIT_TRAINING_TEST = os.environ.get('RATE_LIMIT_TRAINING_TEST', 'user=10/60,ip=30/60')
+    RATE_LIMIT_DIARY_ANALYSIS = os.environ.get('RATE_LIMIT_DIARY_ANALYSIS', 'user=10/300,ip=30/300')
+
+    # Tempo real do chat 1a1 (Server-Sent Events; NOTIFY/LISTEN entre workers)
+    REALTIME_PG_BRIDGE = os.environ.get('REALTIME_PG_BRIDGE', 'auto')  # auto: liga com WEB_CONCURRENCY > 1
+    REALTIME_STREAM_MAX_SECONDS = int(os.environ.get('REALTIME_STREAM_MAX_SECONDS', '300'))
+
+    # Fila de espera do chat 1a1 (prioridade + risco da triagem + aging)
+    WAITING_QUEUE_AGING_SECONDS = float(os.environ.get('WAITING_QUEUE_AGING_SECONDS', '60'))  # 1 ponto por intervalo de espera
+    WAITING_QUEUE_CACHE_TTL = float(os.environ.get('WAITING_QUEUE_CACHE_TTL', '10'))
+
     # Níveis de risco
     RISK_LEVELS = {
         'low': {'threshold': 0.3, 'color': 'green'},
@@ -0,0 +1,59 @@
+"""
+Configuração do Gunicorn em produção (Procfile, start.sh e render.yaml)
+
+Um turno do chat passa a maior parte do tempo esperando o provedor de LLM e o
+banco. Com workers gevent, essas esperas cedem a vez a outros turnos e um
+único processo atende muitos turnos simultâneos (GUNICORN_WORKER_CONNECTIONS,
+por padrão derivado do pool do banco). Sem gevent instalado, cai para gthread
+com GUNICORN_THREADS threads.
+
+A concorrência vem do worker (greenlets ou threads), não de /api/chat/send-async:
+o Flask roda cada view assíncrona num event loop próprio, que ocupa o
+greenlet/thread da requisição até o fim, como a rota síncrona.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        worker_class = 'gthread'
+
+# Concorrência limitada pelo pool do banco (config.py): cada turno simultâneo
+# pode ocupar uma conexão; DB_POOL_RESERVED fica para as threads auxiliares
+# (rascunhos especulativos, busca híbrida, workers da fila). Acima disso, o
+# turno excedente esperaria DB_POOL_TIMEOUT e terminaria em 500.
+db_pool_capacity = int(os.environ.get('DB_POOL_SIZE', '10')) + int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+db_pool_reserved = int(os.environ.get('DB_POOL_RESERVED', '10'))
+max_concurrent_turns = max(1, db_pool_capacity - db_pool_reserved)
+
+# gevent: turnos simultâneos por worker; gthread: threads por worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', max_concurrent_turns))
+threads = int(os.environ.get('GUNICORN_THREADS', min(8, max_concurrent_turns)))
+
+
+def post_fork(server, worker):
+    """psycopg2 é uma extensão C: sem o psycogreen, uma consulta bloqueia todos os greenlets"""
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen não instalado: consultas ao banco bloqueiam o worker gevent")
+        return
+    patch_psycopg()
+    server.log.info("psycopg2 cooperativo (psycogreen) ativado")
+
+
+def post_worker_init(worker):
+    """Workers da fila e aquecimento do RAG só nos workers web (nunca em comandos de CLI)"""
+    from app import start_background_services
+    start_background_services(worker.wsgi)
@@ -0,0 +1,32 @@
+"""Create embedding_cache table
+
+Revision ID: 0008_create_embedding_cache
+Revises: 0007_add_triage_context_to_chat_sessions
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_create_embedding_cache'
+down_revision = '0007_add_triage_context_to_chat_sessions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cache de embeddings por hash de conteúdo (texto normalizado) e modelo
+    op.create_table('embedding_cache',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash', 'model')
+    )
+
+
+def downgrade():
+    op.drop_table('embedding_cache')
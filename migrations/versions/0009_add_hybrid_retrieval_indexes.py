@@ -0,0 +1,120 @@
+"""Add indexes for hybrid (lexical + vector) retrieval
+
+Revision ID: 0009_add_hybrid_retrieval_indexes
+Revises: 0008_create_embedding_cache
+Create Date: 2026-10-19 10:00:00.000000
+
+Índices vetoriais em HNSW: diferente do ivfflat, não dependem de dados na
+tabela no momento da criação (ivfflat criado em tabela vazia fica com
+listas sem centróides úteis e exige REINDEX depois da carga).
+
+"""
+import struct
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_add_hybrid_retrieval_indexes'
+down_revision = '0008_create_embedding_cache'
+branch_labels = None
+depends_on = None
+
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def _bytes_to_vector_literal(data: bytes):
+    """Converte o embedding gravado em bytea para o literal do pgvector (None se ilegível)"""
+    try:
+        decoded = data.decode('utf-8').strip()
+        if decoded.startswith('['):
+            return decoded
+    except UnicodeDecodeError:
+        pass
+    # float32 little-endian, mesmo formato da tabela embedding_cache
+    if len(data) == EMBEDDING_DIMENSIONS * 4:
+        values = struct.unpack(f'<{EMBEDDING_DIMENSIONS}f', data)
+        return '[' + ','.join(map(str, values)) + ']'
+    return None
+
+
+def _convert_training_data_embedding():
+    """training_data.embedding era bytea na migração inicial; o modelo usa vector(1536)"""
+    conn = op.get_bind()
+    columns = {c['name']: c for c in sa.inspect(conn).get_columns('training_data')}
+    if not isinstance(columns['embedding']['type'], sa.LargeBinary):
+        return  # Já é vector (banco criado por db.create_all)
+
+    op.execute(f"ALTER TABLE training_data ADD COLUMN embedding_vector vector({EMBEDDING_DIMENSIONS})")
+    rows = conn.execute(sa.text(
+        "SELECT id, embedding FROM training_data WHERE embedding IS NOT NULL"
+    )).fetchall()
+    converted, skipped = [], 0
+    for row in rows:
+        literal = _bytes_to_vector_literal(bytes(row.embedding))
+        if literal is None:
+            skipped += 1
+        else:
+            converted.append({'id': row.id, 'embedding': literal})
+    if converted:
+        conn.execute(sa.text(
+            "UPDATE training_data SET embedding_vector = CAST(:embedding AS vector) WHERE id = :id"
+        ), converted)
+    if skipped:
+        print(f"[MIGRAÇÃO] {skipped} embeddings de training_data ilegíveis ficam NULL (reprocessar)")
+    op.execute("ALTER TABLE training_data DROP COLUMN embedding")
+    op.execute("ALTER TABLE training_data RENAME COLUMN embedding_vector TO embedding")
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    # Tabela de embeddings das trocas (antes criada só por setup_embeddings_table)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_embeddings (
+            id SERIAL PRIMARY KEY,
+            chat_message_id INTEGER REFERENCES chat_messages(id),
+            diary_entry_id INTEGER REFERENCES diary_entries(id),
+            embedding vector(1536),
+            risk_level VARCHAR(20),
+            sentiment_score FLOAT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    # setup_embeddings_table criava o mesmo índice em ivfflat
+    op.execute("DROP INDEX IF EXISTS idx_conversation_embeddings_vector")
+    op.execute("""
+        CREATE INDEX idx_conversation_embeddings_vector
+        ON conversation_embeddings USING hnsw (embedding vector_cosine_ops)
+    """)
+
+    _convert_training_data_embedding()
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_training_data_embedding_vector
+        ON training_data USING hnsw (embedding vector_cosine_ops)
+    """)
+
+    # Full-text search em português sobre mensagens de usuários (retriever léxico)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_user_content_fts
+        ON chat_messages USING gin (to_tsvector('portuguese', content))
+        WHERE message_type = 'USER'
+    """)
+    # Próxima resposta da IA na sessão (LATERAL ... ORDER BY id LIMIT 1)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_session_type_id
+        ON chat_messages (session_id, message_type, id)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_chat_messages_session_type_id")
+    op.execute("DROP INDEX IF EXISTS idx_chat_messages_user_content_fts")
+    op.execute("DROP INDEX IF EXISTS idx_training_data_embedding_vector")
+    op.execute("""
+        ALTER TABLE training_data
+        ALTER COLUMN embedding TYPE bytea USING convert_to(embedding::text, 'UTF8')
+    """)
+    op.execute("DROP INDEX IF EXISTS idx_conversation_embeddings_vector")
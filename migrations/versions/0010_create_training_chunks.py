@@ -0,0 +1,45 @@
+"""Create training_chunks table
+
+Revision ID: 0010_create_training_chunks
+Revises: 0009_add_hybrid_retrieval_indexes
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_create_training_chunks'
+down_revision = '0009_add_hybrid_retrieval_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trechos dos documentos de treinamento (pipeline de ingestão)
+    op.create_table('training_chunks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('training_data_id', sa.Integer(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['training_data_id'], ['training_data.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash')
+    )
+    op.execute("ALTER TABLE training_chunks ADD COLUMN embedding vector(1536)")
+    op.create_index('ix_training_chunks_training_data_id', 'training_chunks', ['training_data_id'])
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_training_chunks_embedding_vector
+        ON training_chunks USING hnsw (embedding vector_cosine_ops)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_training_chunks_embedding_vector")
+    op.drop_index('ix_training_chunks_training_data_id', table_name='training_chunks')
+    op.drop_table('training_chunks')
@@ -0,0 +1,54 @@
+"""Create jobs table for the durable job queue
+
+Revision ID: 0011_create_jobs_table
+Revises: 0010_create_training_chunks
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_create_jobs_table'
+down_revision = '0010_create_training_chunks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fila de jobs em background (reivindicados com FOR UPDATE SKIP LOCKED)
+    op.create_table('jobs',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False, server_default='{}'),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Índices parciais: a consulta de claim só olha jobs pendentes ou em execução
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_queued
+        ON jobs (priority DESC, run_at, id)
+        WHERE status = 'queued'
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_running_locked_until
+        ON jobs (locked_until)
+        WHERE status = 'running'
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_jobs_running_locked_until")
+    op.execute("DROP INDEX IF EXISTS idx_jobs_queued")
+    op.drop_table('jobs')
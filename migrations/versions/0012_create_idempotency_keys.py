@@ -0,0 +1,42 @@
+"""Create idempotency_keys table for Idempotency-Key replays
+
+Revision ID: 0012_create_idempotency_keys
+Revises: 0011_create_jobs_table
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_create_idempotency_keys'
+down_revision = '0011_create_jobs_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Respostas gravadas por (usuário, Idempotency-Key); a constraint única serializa as repetições
+    op.create_table('idempotency_keys',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=128), nullable=False),
+        sa.Column('endpoint', sa.String(length=100), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='processing'),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_body', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'idempotency_key', name='uq_idempotency_keys_user_key')
+    )
+    # Limpeza periódica das chaves expiradas
+    op.create_index('idx_idempotency_keys_expires_at', 'idempotency_keys', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('idx_idempotency_keys_expires_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,33 @@
+"""Add rolling summary columns to chat_sessions
+
+Revision ID: 0013_add_chat_session_summary
+Revises: 0012_create_idempotency_keys
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013_add_chat_session_summary'
+down_revision = '0012_create_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Resumo contínuo: mensagens antigas condensadas, o prompt usa resumo + últimos turnos
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('summary_until_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('summary_message_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('summary_updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.drop_column('summary_updated_at')
+        batch_op.drop_column('summary_message_count')
+        batch_op.drop_column('summary_until_id')
+        batch_op.drop_column('summary')
@@ -0,0 +1,49 @@
+"""Add last message preview to chat_sessions
+
+Revision ID: 0014_add_chat_session_last_message
+Revises: 0013_add_chat_session_summary
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0014_add_chat_session_last_message'
+down_revision = '0013_add_chat_session_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Prévia desnormalizada: a lista de conversas deixa de consultar chat_messages por sessão
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill: última mensagem de cada sessão numa única passada
+    op.execute("""
+        UPDATE chat_sessions AS s
+        SET last_message_preview = CASE
+                WHEN length(m.content) > 100 THEN left(m.content, 100) || '...'
+                ELSE m.content
+            END,
+            last_message_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (session_id) session_id, content, created_at
+            FROM chat_messages
+            ORDER BY session_id, created_at DESC, id DESC
+        ) AS m
+        WHERE m.session_id = s.id AND NOT s.is_anonymized
+    """)
+
+    # Lista de conversas do usuário: paginação por (created_at, id)
+    op.create_index('idx_chat_sessions_user_created', 'chat_sessions', ['user_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_chat_sessions_user_created', table_name='chat_sessions')
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_preview')
@@ -0,0 +1,32 @@
+"""Add waiting queue indexes
+
+Revision ID: 0015_add_waiting_queue_indexes
+Revises: 0014_add_chat_session_last_message
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0015_add_waiting_queue_indexes'
+down_revision = '0014_add_chat_session_last_message'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Índice parcial: só as sessões em espera (poucas), não o histórico inteiro do 1a1
+    op.create_index(
+        'idx_chat1a1_sessions_waiting', 'chat1a1_sessions', ['priority_level', 'started_at', 'id'],
+        postgresql_where=sa.text("status = 'WAITING' AND volunteer_id IS NULL")
+    )
+
+    # Triagem mais recente de cada cliente na fila
+    op.create_index('idx_triage_logs_user_created', 'triage_logs', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_triage_logs_user_created', table_name='triage_logs')
+    op.drop_index('idx_chat1a1_sessions_waiting', table_name='chat1a1_sessions')
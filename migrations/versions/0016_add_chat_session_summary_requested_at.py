@@ -0,0 +1,27 @@
+"""Add summary request marker to chat_sessions
+
+Revision ID: 0016_add_chat_session_summary_requested_at
+Revises: 0015_add_waiting_queue_indexes
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0016_add_chat_session_summary_requested_at'
+down_revision = '0015_add_waiting_queue_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Um job de resumo pendente por sessão (em vez de um por turno após o limite)
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary_requested_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.drop_column('summary_requested_at')
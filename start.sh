@@ -16,4 +16,4 @@ flask init-db || echo "Dados já existem ou erro na inicialização"
 
 # Iniciar aplicação com Gunicorn
 echo "🌐 Iniciando servidor..."
-exec gunicorn --bind 0.0.0.0:$PORT --workers 1 --timeout 120 wsgi:app
+exec gunicorn -c gunicorn.conf.py wsgi:app
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do envio de mensagens do chat (não é coletado pelo pytest)
+
+Abre N sessões de chat (uma por usuário de teste já existente: /new-session
+encerra a sessão ativa do mesmo usuário) e envia as mensagens em paralelo,
+medindo latência e vazão. Com um único worker, a vazão deve crescer com a
+concorrência até o limite do provedor (LLM_MAX_IN_FLIGHT); com o worker sync
+antigo ficava em ~1 turno por vez.
+
+Uso:
+    python test/load_test_chat.py --url http://localhost:5000 \\
+        --users usuarios.txt --concurrency 1,4,16 --turns 32
+    (usuarios.txt: uma linha "email,senha" por usuário; --endpoint
+    /chat/api/chat/send-async para o caminho assíncrono)
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+MESSAGES = [
+    'Oi, hoje foi um dia difícil no trabalho',
+    'Tenho me sentido cansado e sem vontade de sair',
+    'Não consigo dormir direito essa semana',
+    'Queria conversar um pouco sobre ansiedade',
+]
+
+
+def login(base_url, email, password):
+    client = requests.Session()
+    response = client.post(f'{base_url}/login', data={'email': email, 'password': password},
+                           allow_redirects=False, timeout=30)
+    if response.status_code >= 400:
+        sys.exit(f"Falha no login ({response.status_code})")
+    return client
+
+
+def new_session(client, base_url):
+    response = client.post(f'{base_url}/chat/new-session', timeout=30)
+    response.raise_for_status()
+    return response.json()['session_id']
+
+
+def send(client, base_url, endpoint, session_id, index):
+    started = time.perf_counter()
+    response = client.post(
+        f'{base_url}{endpoint}',
+        json={'message': MESSAGES[index % len(MESSAGES)], 'session_id': session_id},
+        headers={'Idempotency-Key': str(uuid.uuid4())},
+        timeout=120
+    )
+    return response.status_code, time.perf_counter() - started
+
+
+def run_level(args, concurrency):
+    if concurrency > len(args.users):
+        sys.exit(f"Concorrência {concurrency} exige {concurrency} usuários (há {len(args.users)})")
+    clients = [login(args.url, email, password) for email, password in args.users[:concurrency]]
+    sessions = [new_session(client, args.url) for client in clients]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(send, clients[i % concurrency], args.url, args.endpoint, sessions[i % concurrency], i)
+            for i in range(args.turns)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for status, _ in results if status >= 400)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"concorrência={concurrency:>3} | turnos={args.turns} | erros={errors} | "
+          f"vazão={args.turns / elapsed:.2f} turnos/s | "
+          f"latência p50={statistics.median(latencies):.2f}s p95={p95:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do /api/chat/send')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--endpoint', default='/chat/api/chat/send')
+    parser.add_argument('--users', required=True, help='Arquivo com linhas "email,senha"')
+    parser.add_argument('--concurrency', default='1,4,16', help='Níveis separados por vírgula')
+    parser.add_argument('--turns', type=int, default=32, help='Turnos por nível')
+    args = parser.parse_args()
+    with open(args.users, encoding='utf-8') as handle:
+        args.users = [tuple(line.strip().split(',', 1)) for line in handle if ',' in line]
+
+    for level in (int(value) for value in args.concurrency.split(',')):
+        run_level(args, level)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from app.services.chat_history import decode_cursor, encode_cursor, history_etag, not_modified
+
+
+def test_cursor_round_trip_and_invalid_cursor():
+    created_at = datetime(2025, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('não-é-cursor')
+
+
+def test_etag_changes_with_new_message_or_page_and_matches_if_none_match():
+    version = SimpleNamespace(id=3, message_count=10, last_activity=datetime(2025, 5, 1, tzinfo=timezone.utc))
+    etag = history_etag(version, 50, None, None)
+
+    assert etag == history_etag(version, 50, None, None)
+    assert etag != history_etag(version, 50, 'abc', None)
+    assert etag != history_etag(SimpleNamespace(id=3, message_count=11, last_activity=version.last_activity),
+                                50, None, None)
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        assert not_modified(etag)
+    with app.test_request_context():
+        assert not not_modified(etag)
@@ -0,0 +1,32 @@
+import threading
+
+from flask import Flask
+
+from app.services.chat_jobs import ChatJobRegistry
+
+
+def test_jobs_run_in_order_per_session_and_expose_result():
+    app = Flask(__name__)
+    registry = ChatJobRegistry(workers=4, ttl=60)
+    order, gate = [], threading.Event()
+
+    def slow():
+        gate.wait(2)
+        order.append('first')
+        return {'success': True, 'ai_response': {'content': 'primeira'}}
+
+    def fast():
+        order.append('second')
+        return {'success': True, 'ai_response': {'content': 'segunda'}}
+
+    first = registry.submit(app, user_id=1, session_id=10, fn=slow)
+    second = registry.submit(app, user_id=1, session_id=10, fn=fast)
+    assert not second.wait(0.2)
+    gate.set()
+    assert first.wait(2) and second.wait(2)
+
+    assert order == ['first', 'second']
+    assert second.to_dict()['status'] == 'done'
+    assert second.to_dict()['ai_response']['content'] == 'segunda'
+    assert registry.get(first.id) is first
+    assert registry.get_statistics()['completed'] == 2
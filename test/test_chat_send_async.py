@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager, UserMixin
+
+from app import db
+from app.models import ChatSession
+from app.models.chat import ChatSessionStatus
+from app.routes.chat import chat
+from app.services import chat_pipeline
+from app.services.chat_pipeline import ChatTurn
+
+pytest.importorskip('asgiref')  # Extra async do Flask (requirements.txt)
+
+
+class FakeUser(UserMixin):
+    id = 1
+    first_name = 'Ana'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SECRET_KEY='test')
+    db.init_app(app)
+    login_manager = LoginManager(app)
+    login_manager.request_loader(lambda request: FakeUser())
+    app.register_blueprint(chat)
+    with app.app_context():
+        ChatSession.__table__.create(db.engine)
+        db.session.add(ChatSession(id=5, user_id=1, status=ChatSessionStatus.ACTIVE.value))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+
+
+def test_send_async_prepares_the_turn_off_the_event_loop(client, monkeypatch):
+    seen = {}
+
+    def prepare_turn(chat_session, user, message_content, deadline=None):
+        try:
+            asyncio.get_running_loop()
+            seen['on_loop'] = True
+        except RuntimeError:
+            seen['on_loop'] = False
+        seen['thread'] = threading.current_thread()
+        return ChatTurn(session_id=chat_session.id, user_id=user.id, user_name=user.first_name,
+                        message_content=message_content)
+
+    async def agenerate_reply(turn, follow_up=False):
+        seen['loop_thread'] = threading.current_thread()
+        return {'success': True, 'ai_response': {'content': f'eco: {turn.message_content}'}}
+
+    monkeypatch.setattr(chat_pipeline, 'prepare_turn', prepare_turn)
+    monkeypatch.setattr(chat_pipeline, 'agenerate_reply', agenerate_reply)
+
+    response = client.post('/api/chat/send-async', json={'message': 'oi', 'session_id': 5})
+
+    assert response.status_code == 200
+    assert response.get_json()['ai_response']['content'] == 'eco: oi'
+    assert seen['on_loop'] is False
+    assert seen['thread'] is not seen['loop_thread']
+
+
+def test_send_async_validates_like_the_sync_route(client):
+    response = client.post('/api/chat/send-async', json={'message': 'oi', 'session_id': 999})
+    assert response.status_code == 404
+    response = client.post('/api/chat/send-async', json={'message': '  ', 'session_id': 5})
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from cachetools import LRUCache
+
+from app.services.ai_service import AIService
+from app.services.safe_cache import SafeCache
+
+
+class SlowAsyncCompletions:
+    """Simula o provedor: cada chamada espera `delay` segundos sem bloquear o event loop"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        message = SimpleNamespace(content='Estou aqui com você.')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(total_tokens=10))
+
+
+def test_async_turns_overlap_on_one_event_loop():
+    service = AIService()
+    service.rag_enabled = False
+    service.openai_client = object()
+    completions = SlowAsyncCompletions(delay=0.2)
+    service._async_openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def run_turns():
+        return await asyncio.gather(*[
+            service.agenerate_response(f'mensagem {i}', risk_level='low') for i in range(6)
+        ])
+
+    started = time.perf_counter()
+    results = asyncio.run(run_turns())
+    elapsed = time.perf_counter() - started
+
+    assert all(result['source'] == 'openai' for result in results)
+    assert completions.max_active == 6
+    # Seis turnos de 0.2s em sequência levariam 1.2s
+    assert elapsed < 0.8
+
+
+def test_safe_cache_survives_concurrent_writes_and_iteration():
+    cache = SafeCache(LRUCache(maxsize=50))
+    errors = []
+
+    def writer(offset):
+        try:
+            for i in range(2000):
+                cache[(offset, i)] = i
+                cache.get((offset, i - 1))
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(200):
+                for key in cache:
+                    cache.get(key)
+                cache.items()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)] + [threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache) == 50
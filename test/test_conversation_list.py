@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.models import ChatSession
+from app.models.chat import message_preview
+from app.services.conversation_list import conversation_list_cache
+
+
+def test_preview_is_truncated_like_the_old_list():
+    assert message_preview('oi') == 'oi'
+    assert message_preview('a' * 150) == 'a' * 100 + '...'
+
+
+def test_committed_session_write_invalidates_the_user_pages():
+    engine = create_engine('sqlite://')
+    ChatSession.__table__.create(engine)
+    conversation_list_cache.set(5, (None, 50), {'conversations': []})
+    conversation_list_cache.set(6, (None, 50), {'conversations': []})
+
+    with Session(engine) as db_session:
+        db_session.add(ChatSession(user_id=5, title='nova'))
+        db_session.flush()
+        assert conversation_list_cache.get(5, (None, 50)) is not None  # Só no commit
+        db_session.commit()
+
+    assert conversation_list_cache.get(5, (None, 50)) is None
+    assert conversation_list_cache.get(6, (None, 50)) is not None
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from app.services.ai_prompt import AIPromptManager, PromptContext, RiskLevel
+from app.services.conversation_summary import ConversationSummarizer
+
+
+def test_summary_is_scheduled_as_soon_as_messages_leave_the_window():
+    summarizer = ConversationSummarizer(history_turns=2, margin_turns=1)
+    assert summarizer.window_messages == 4
+    assert not summarizer.needs_summary(SimpleNamespace(message_count=5, summary_message_count=0))
+    assert summarizer.needs_summary(SimpleNamespace(message_count=6, summary_message_count=None))
+    # Após um resumo, as próximas mensagens que saem da janela já disparam outro
+    assert not summarizer.needs_summary(SimpleNamespace(message_count=9, summary_message_count=4))
+    assert summarizer.needs_summary(SimpleNamespace(message_count=10, summary_message_count=4))
+
+
+def test_prompt_has_summary_and_recent_turns_without_repeating_current_message():
+    history = [
+        {'content': 'terminei meu namoro', 'message_type': 'user'},
+        {'content': 'Sinto muito, quer falar sobre isso?', 'message_type': 'ai'},
+        {'content': 'estou me sentindo sozinho', 'message_type': 'user'},
+    ]
+    prompt = AIPromptManager().build_contextual_prompt(PromptContext(
+        user_message='estou me sentindo sozinho',
+        risk_level=RiskLevel.MODERATE,
+        session_history=history,
+        conversation_summary='Usuário relatou perda do emprego.'
+    ))['prompt']
+    assert 'Resumo da conversa até aqui: Usuário relatou perda do emprego.' in prompt
+    assert 'Usuário: terminei meu namoro' in prompt
+    assert 'Assistente: Sinto muito' in prompt
+    assert prompt.count('estou me sentindo sozinho') == 1
+
+
+def test_one_summary_job_per_session_until_retry_interval(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from flask import Flask
+
+    from app import db
+    from app.models import ChatSession
+    from app.services.job_queue import job_queue
+
+    enqueued = []
+    monkeypatch.setattr(job_queue, 'enqueue', lambda kind, payload, **kwargs: enqueued.append(payload))
+    summarizer = ConversationSummarizer(history_turns=2, margin_turns=1, retry_seconds=600)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        ChatSession.__table__.create(db.engine)
+        chat_session = ChatSession(user_id=1, message_count=12, summary_message_count=0)
+        db.session.add(chat_session)
+        db.session.commit()
+
+        # Cada turno após o limite tenta agendar: só o primeiro enfileira
+        assert [summarizer.schedule_if_needed(chat_session) for _ in range(3)] == [True, False, False]
+        assert enqueued == [{'session_id': chat_session.id}]
+
+        # Job pulado (resumo vazio) deixa o pedido marcado: novo job só após o intervalo
+        chat_session.summary_requested_at = datetime.now(timezone.utc) - timedelta(seconds=601)
+        db.session.commit()
+        assert summarizer.schedule_if_needed(chat_session)
+        assert len(enqueued) == 2
+        db.session.remove()
@@ -0,0 +1,88 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import ChatMessage, ChatSession
+from app.services.ai_service import AIService
+from app.services.chat_pipeline import ChatTurn, agenerate_reply, generate_reply
+
+
+class FailingCompletions:
+    """Provedor fora do ar: toda chamada falha"""
+
+    def create(self, **kwargs):
+        raise ConnectionError('provedor indisponível')
+
+
+class AsyncFailingCompletions:
+    async def create(self, **kwargs):
+        raise ConnectionError('provedor indisponível')
+
+
+@pytest.fixture
+def failing_provider_app(monkeypatch):
+    service = AIService()
+    service.rag_enabled = False
+    service.gemini_client = None
+    service.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=FailingCompletions()))
+    service._async_openai_client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncFailingCompletions()))
+    service.response_cache.clear()
+    monkeypatch.setattr(sys.modules['app'], 'ai_service', service, raising=False)
+    monkeypatch.setattr(sys.modules['app'], 'AI_AVAILABLE', True, raising=False)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        for model in (ChatSession, ChatMessage):
+            model.__table__.create(db.engine)
+        chat_session = ChatSession(user_id=1, title='crise')
+        db.session.add(chat_session)
+        db.session.commit()
+        yield chat_session.id
+        db.session.remove()
+
+
+def _turn(session_id):
+    return ChatTurn(session_id=session_id, user_id=1, user_name='Ana',
+                    message_content='não aguento mais', detected_risk_level='critical')
+
+
+def test_follow_up_does_not_repeat_the_canned_fallback(failing_provider_app):
+    payload = generate_reply(_turn(failing_provider_app), follow_up=True)
+
+    assert payload['ai_response'] is None
+    assert ChatMessage.query.count() == 0
+
+
+def test_async_follow_up_does_not_repeat_the_canned_fallback(failing_provider_app):
+    payload = asyncio.run(agenerate_reply(_turn(failing_provider_app), follow_up=True))
+
+    assert payload['ai_response'] is None
+    assert ChatMessage.query.count() == 0
+
+
+def test_no_transaction_is_open_during_the_llm_call(failing_provider_app, monkeypatch):
+    from app import ai_service
+    open_during_call = []
+
+    class RecordingCompletions:
+        def create(self, **kwargs):
+            open_during_call.append(db.session().in_transaction())
+            raise ConnectionError('provedor indisponível')
+
+    monkeypatch.setattr(ai_service.openai_client.chat, 'completions', RecordingCompletions())
+    chat_session = db.session.get(ChatSession, failing_provider_app)
+    # prepare_turn devolve o turno com sentimento/triagem só em flush
+    chat_session.initial_risk_level = 'moderate'
+    db.session.flush()
+    turn = ChatTurn(session_id=failing_provider_app, user_id=1, user_name='Ana',
+                    message_content='dia difícil no trabalho', detected_risk_level='moderate')
+    generate_reply(turn)
+
+    assert open_during_call and not any(open_during_call)
+    assert db.session.get(ChatSession, failing_provider_app).initial_risk_level == 'moderate'
@@ -0,0 +1,10 @@
+from app.services.crisis_reply import build_crisis_reply
+
+
+def test_crisis_reply_is_localized_and_always_has_hotlines():
+    for locale in ('pt-BR', 'en', 'es', 'de', None):
+        reply = build_crisis_reply('Maria Souza', locale)
+        assert '188' in reply and '192' in reply
+        assert reply.startswith('Maria, ')
+    assert 'segurança' in build_crisis_reply(None, 'de')
+    assert build_crisis_reply('amigo', 'en').startswith('Your safety')
@@ -0,0 +1,35 @@
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded, activate, current_deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_timeouts_shrink_with_the_remaining_budget():
+    clock = FakeClock()
+    deadline = Deadline(10, stage_minimums={'rag': 2}, reserve=0.5, clock=clock)
+    assert deadline.timeout() == 9.5
+    assert deadline.timeout(cap=3) == 3
+    clock.now = 8.6
+    assert deadline.statement_timeout_ms() == 900
+    assert not deadline.allows('rag') and deadline.skipped == ['rag']
+    clock.now = 9.6
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout()
+    clock.now = 11
+    assert deadline.expired and deadline.remaining() == 0
+
+
+def test_activate_sets_current_deadline_only_inside_the_block():
+    deadline = Deadline(5)
+    with activate(None):
+        assert current_deadline() is None
+    with activate(deadline):
+        assert current_deadline() is deadline
+    assert current_deadline() is None
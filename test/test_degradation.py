@@ -0,0 +1,54 @@
+from app.services.degradation import DegradationController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_steps_down_under_latency_and_recovers_without_touching_crisis():
+    clock = FakeClock()
+    controller = DegradationController(p95_limits={'llm_reply': 1000}, max_error_rate=0.5, window=60,
+                                       min_samples=3, cooldown=10, recovery=30, enabled=True, clock=clock)
+    for _ in range(3):
+        controller.record('llm_reply', 5.0)
+    assert controller.level_name == 'no_rag'
+    assert not controller.use_rag('low') and controller.use_rag('critical')
+
+    # Intervalo mínimo entre mudanças
+    controller.record('llm_reply', 5.0)
+    assert controller.level == 1
+    for step in range(3):
+        clock.now += 11
+        for _ in range(3):
+            controller.record('llm_reply', 5.0)
+    assert controller.level_name == 'static_low'
+    assert controller.use_static_reply('low') and not controller.use_static_reply('high')
+    assert controller.use_llm_reply('moderate') and not controller.use_llm_reply('low')
+    assert controller.use_llm_sentiment('critical')
+
+    clock.now += 31
+    controller.record('llm_reply', 0.1)
+    assert controller.level == 3
+    assert controller.get_statistics()['transitions'][-1]['to'] == 'llm_moderate'
+
+
+def test_recovers_without_new_samples():
+    clock = FakeClock()
+    controller = DegradationController(p95_limits={'llm_reply': 1000}, max_error_rate=0.5, window=60,
+                                       min_samples=3, cooldown=10, recovery=30, enabled=True, clock=clock)
+    for step in range(4):
+        clock.now += 11
+        for _ in range(3):
+            controller.record('llm_reply', 5.0)
+    assert controller.level_name == 'static_low'
+
+    # Tráfego low não passa mais pelo LLM: nenhuma amostra nova, e mesmo assim sobe
+    for _ in range(4):
+        clock.now += 31
+        controller.use_llm_reply('low')
+    assert controller.level == 0
+    assert controller.get_statistics()['transitions'][-1]['reason'] == 'etapas dentro dos limites'
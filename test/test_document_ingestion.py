@@ -0,0 +1,95 @@
+import os
+
+from app.services.document_ingestion import chunk_segments, extract_segments
+
+
+def test_chunks_respect_size_and_overlap():
+    words = ' '.join(f'palavra{i}' for i in range(300))
+    chunks = [c for _, c in chunk_segments([(1, words)], chunk_size=200, overlap=50)]
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    # O início de cada trecho repete o final do anterior
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous.split()
+
+
+def test_chunks_keep_start_page():
+    segments = [(1, 'a ' * 60), (2, 'b ' * 60)]
+    pages = [page for page, _ in chunk_segments(segments, chunk_size=100, overlap=10)]
+    assert pages[0] == 1
+    assert pages[-1] == 2
+
+
+def test_extracts_docx_paragraphs(tmp_path):
+    from docx import Document
+    path = tmp_path / 'guia.docx'
+    document = Document()
+    document.add_paragraph('Acolha sem julgamentos.')
+    document.add_paragraph('Indique o CVV (188) em situações de risco.')
+    document.save(path)
+    text = ' '.join(segment for _, segment in extract_segments(str(path), 'docx'))
+    assert 'Acolha sem julgamentos.' in text
+    assert 'CVV (188)' in text
+
+
+def test_import_manifest_is_resumable(tmp_path):
+    from app.services.corpus_import import CorpusImporter
+    (tmp_path / 'corpus').mkdir()
+    (tmp_path / 'corpus' / 'guia.txt').write_text('Acolhimento inicial.', encoding='utf-8')
+    (tmp_path / 'corpus' / 'imagem.png').write_bytes(b'')
+    files = CorpusImporter.discover(str(tmp_path / 'corpus'))
+    assert list(files) == ['guia.txt']
+
+    manifest_path = str(tmp_path / 'corpus.manifest.json')
+    manifest = CorpusImporter.load_manifest(manifest_path, str(tmp_path / 'corpus'))
+    manifest['files']['guia.txt'] = {'status': 'done'}
+    CorpusImporter.save_manifest(manifest, manifest_path)
+    assert CorpusImporter.load_manifest(manifest_path, '')['files']['guia.txt']['status'] == 'done'
+
+
+def test_zip_with_parent_paths_is_rejected(tmp_path):
+    import zipfile
+    import pytest
+    from app.services.corpus_import import safe_extract
+    path = tmp_path / 'corpus.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('guias/ok.txt', 'Acolhimento.')
+        archive.writestr('../fora.txt', 'Não deveria sair do diretório.')
+    target = tmp_path / 'extraido'
+    target.mkdir()
+    with zipfile.ZipFile(path) as archive, pytest.raises(ValueError):
+        safe_extract(archive, str(target))
+    assert not (tmp_path / 'fora.txt').exists()
+
+
+def test_failed_indexing_removes_training_data(tmp_path):
+    from flask import Flask
+    from app import db
+    from app.models import TrainingChunk, TrainingData
+    from app.services.corpus_import import CorpusImporter
+
+    class FailingIngestion:
+        chunk_size, overlap = 200, 20
+
+        def index_chunks(self, record, chunks, stats):
+            raise RuntimeError('provedor de embeddings fora do ar')
+
+    app = Flask(__name__, root_path=str(tmp_path))
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    source = tmp_path / 'guia.txt'
+    source.write_text('Acolhimento inicial.', encoding='utf-8')
+    with app.app_context():
+        TrainingData.__table__.create(db.engine)
+        TrainingChunk.__table__.create(db.engine)
+        importer = CorpusImporter(submitted_by=1, ingestion=FailingIngestion(), echo=lambda _: None)
+        entries, summary = {}, {'done': 0, 'errors': 0, 'chunks': 0, 'stored': 0}
+        importer._store_group([{'path': str(source), 'relative': 'guia.txt', 'sha256': 'abc',
+                                'chunks': [(1, 'Acolhimento inicial.')], 'duplicates': 0, 'pages': 1}],
+                              entries, summary)
+
+        assert db.session.query(TrainingData).count() == 0
+        assert entries['guia.txt']['status'] == 'error'
+        assert summary['errors'] == 1
+        assert not os.listdir(tmp_path / 'static' / 'uploads' / 'training')
+        db.session.remove()
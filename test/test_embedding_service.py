@@ -0,0 +1,80 @@
+import pytest
+from app.services.embedding_service import EmbeddingService, content_hash, normalize_text
+
+
+class FakeProvider:
+    name = 'fake'
+    model = 'fake-model'
+    max_batch_size = 3
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def provider():
+    return FakeProvider()
+
+
+@pytest.fixture
+def service(provider):
+    return EmbeddingService(provider=provider, use_db_cache=False)
+
+
+def test_normalize_and_hash():
+    assert normalize_text('  Estou   triste\n hoje ') == 'Estou triste hoje'
+    assert content_hash('Estou triste hoje') == content_hash(' Estou  triste\thoje')
+
+
+def test_deduplicates_before_calling_provider(service, provider):
+    vectors = service.embed_texts(['ansiedade', 'ansiedade ', 'medo', '', 'ansiedade'])
+    assert sum(len(call) for call in provider.calls) == 2
+    assert vectors[0] == vectors[1] == vectors[4]
+    assert vectors[3] is None
+
+
+def test_batches_respect_provider_limit(service, provider):
+    service.embed_texts([f'texto {i}' for i in range(7)])
+    assert [len(call) for call in provider.calls] == [3, 3, 1]
+
+
+def test_memory_cache_avoids_reembedding(service, provider):
+    service.embed_text('solidão')
+    service.embed_text('solidão')
+    assert len(provider.calls) == 1
+    stats = service.get_statistics()
+    assert stats['memory_hits'] == 1
+    assert stats['embedded'] == 1
+
+
+def test_local_provider_dynamic_batches():
+    from app.services.local_embedding_provider import plan_batches
+    lengths = [50, 5, 48, 6, 7]
+    batches = plan_batches(lengths, max_batch_size=2, max_batch_tokens=120)
+    assert sorted(i for batch in batches for i in batch) == [0, 1, 2, 3, 4]
+    assert all(len(batch) <= 2 for batch in batches)
+    # Textos de tamanho parecido ficam juntos (menos padding)
+    assert [1, 3] in batches
+
+
+def test_local_provider_call_size_spans_several_batches(monkeypatch):
+    from app.services import local_embedding_provider
+    from app.services.embedding_service import EmbeddingService
+    monkeypatch.setattr(local_embedding_provider, 'LOCAL_EMBEDDINGS_AVAILABLE', True)
+    local = local_embedding_provider.LocalEmbeddingProvider(max_forward_size=64, max_batch_tokens=8192, workers=2)
+    service = EmbeddingService(provider=local, use_db_cache=False)
+    # Uma chamada do serviço rende vários lotes por thread
+    assert service.batch_size >= local.max_forward_size * local.workers * 2
+
+
+def test_local_provider_without_torch_refuses_to_start(monkeypatch):
+    from app.services import local_embedding_provider
+    from app.services.embedding_service import create_embedding_provider
+    monkeypatch.setattr(local_embedding_provider, 'LOCAL_EMBEDDINGS_AVAILABLE', False)
+    # Sem fallback para a OpenAI: vetores de provedores diferentes não se misturam
+    with pytest.raises(ImportError):
+        create_embedding_provider('local', client=object())
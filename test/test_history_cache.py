@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.services.history_cache import CachedMessage, RecentTurnsCache
+
+
+def _message(content, message_type='user'):
+    return SimpleNamespace(content=content, message_type=message_type, created_at=datetime.now(timezone.utc))
+
+
+def test_write_through_window_serves_turns_without_queries():
+    cache = RecentTurnsCache(window_messages=4, enabled=True)
+    for count, content in enumerate(['oi', 'olá', 'estou triste', 'sinto muito', 'perdi o emprego', 'entendo'], 1):
+        cache.append(7, CachedMessage(content, 'user' if count % 2 else 'ai', None), count)
+
+    history = cache.get_history(SimpleNamespace(id=7, message_count=7), current_message=_message('e agora?'))
+    assert [m['content'] for m in history] == ['estou triste', 'sinto muito', 'perdi o emprego', 'entendo', 'e agora?']
+    assert cache.get_statistics()['hits'] == 1
+
+
+def test_gap_in_sequence_or_session_end_drops_the_entry():
+    cache = RecentTurnsCache(window_messages=4, enabled=True)
+    cache.append(1, CachedMessage('oi', 'user', None), 1)
+    cache.append(1, CachedMessage('de outro worker', 'ai', None), 3)
+    assert cache.get_statistics()['sessions'] == 0
+
+    cache.append(2, CachedMessage('oi', 'user', None), 1)
+    cache.invalidate(2)
+    assert cache.get_statistics()['invalidations'] == 1
+    # Sessão já existente e ainda não carregada: nada é gravado até a primeira leitura
+    cache.append(3, CachedMessage('meio da conversa', 'user', None), 5)
+    assert cache.get_statistics()['sessions'] == 0
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.hybrid_retrieval import apply_boosts, mmr_select, reciprocal_rank_fusion
+
+
+def _candidate(source_id, text, retriever, **extra):
+    return dict(source='exchange', source_id=source_id, user_message=text,
+                ai_response='resposta', retriever=retriever, **extra)
+
+
+def test_rrf_rewards_candidates_found_by_both_retrievers():
+    lexical = [_candidate(1, 'a', 'lexical'), _candidate(2, 'b', 'lexical')]
+    vector = [_candidate(3, 'c', 'vector'), _candidate(2, 'b', 'vector')]
+    fused = reciprocal_rank_fusion([lexical, vector], k=60)
+    assert fused[0]['source_id'] == 2
+    assert fused[0]['retrievers'] == ['lexical', 'vector']
+    assert len(fused) == 3
+
+
+def test_boosts_prefer_rated_and_recent():
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    old = dict(rrf_score=1.0, user_rating=3, created_at=now - timedelta(days=365))
+    recent = dict(rrf_score=1.0, user_rating=3, created_at=now)
+    rated = dict(rrf_score=1.0, user_rating=5, created_at=now - timedelta(days=365))
+    ranked = apply_boosts([old, recent, rated], now=now)
+    assert ranked[-1] is old
+    assert recent['relevance_score'] > old['relevance_score']
+    assert rated['relevance_score'] > old['relevance_score']
+
+
+def test_mmr_skips_near_duplicates():
+    candidates = [
+        dict(user_message='estou muito ansioso com o trabalho', ai_response='respire', relevance_score=1.0),
+        dict(user_message='estou muito ansioso com o trabalho', ai_response='respire', relevance_score=0.95),
+        dict(user_message='brigas em casa com a família', ai_response='converse', relevance_score=0.6),
+    ]
+    selected = mmr_select(candidates, 2, lambda_=0.5)
+    assert selected[0] is candidates[0]
+    assert selected[1] is candidates[2]
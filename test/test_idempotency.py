@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from app.services.idempotency import IdempotencyConflict, IdempotencyStore, request_fingerprint
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Mesma lógica, com a tabela idempotency_keys num dicionário"""
+
+    def __init__(self, **kwargs):
+        super().__init__(enabled=True, **kwargs)
+        self.rows = {}
+
+    def _claim(self, user_id, key, endpoint, fingerprint):
+        if (user_id, key) in self.rows:
+            return False
+        self.rows[(user_id, key)] = {'endpoint': endpoint, 'request_hash': fingerprint, 'status': 'processing',
+                                     'response_status': None, 'response_body': None}
+        return True
+
+    def _lookup(self, user_id, key):
+        return self.rows.get((user_id, key))
+
+    def _complete(self, user_id, key, status, body):
+        self.rows[(user_id, key)].update(status='done', response_status=status, response_body=body)
+
+    def _release(self, user_id, key):
+        self.rows.pop((user_id, key), None)
+
+
+def test_concurrent_duplicates_share_one_execution():
+    store = MemoryIdempotencyStore(wait_timeout=5, poll_interval=0.01)
+    calls = []
+    results = []
+
+    def execute():
+        calls.append(1)
+        time.sleep(0.1)
+        return '{"ok": true}', 200
+
+    def send():
+        results.append(store.run(1, 'abc', 'chat_send', request_fingerprint(b'{"m": 1}'), execute))
+
+    threads = [threading.Thread(target=send) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(body == '{"ok": true}' and status == 200 for body, status, _ in results)
+    assert sum(1 for _, _, replayed in results if replayed) == 4
+
+
+def test_replay_from_another_process_and_conflicting_body():
+    store = MemoryIdempotencyStore(wait_timeout=1, poll_interval=0.01)
+    store.rows[(1, 'k')] = {'endpoint': 'chat_send', 'request_hash': request_fingerprint(b'a'),
+                            'status': 'done', 'response_status': 202, 'response_body': '{}'}
+    assert store.run(1, 'k', 'chat_send', request_fingerprint(b'a'), lambda: ('x', 200)) == ('{}', 202, True)
+    with pytest.raises(IdempotencyConflict):
+        store.run(1, 'k', 'chat_send', request_fingerprint(b'b'), lambda: ('x', 200))
+
+
+def test_server_errors_are_not_stored():
+    store = MemoryIdempotencyStore()
+    assert store.run(1, 'k', 'chat_send', 'h', lambda: ('erro', 500)) == ('erro', 500, False)
+    assert store.rows == {}
+    assert store.run(1, 'k', 'chat_send', 'h', lambda: ('ok', 200)) == ('ok', 200, False)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.services.job_queue import JobQueue, backoff_delay
+
+
+def test_backoff_grows_exponentially_and_is_capped():
+    delays = [backoff_delay(n, base=10, cap=300, jitter=0) for n in range(1, 8)]
+    assert delays[:4] == [10, 20, 40, 80]
+    assert delays[-1] == 300
+
+
+def test_disabled_queue_runs_handler_locally_in_app_context():
+    queue = JobQueue(enabled=False)
+    done = threading.Event()
+    seen = {}
+
+    @queue.task('example', priority=3)
+    def handler(payload):
+        from flask import current_app
+        seen['app'] = current_app.name
+        seen['payload'] = payload
+        done.set()
+
+    app = Flask('jobs-test')
+    with app.app_context():
+        assert queue.enqueue('example', {'entry_id': 1}) is None
+    assert done.wait(2)
+    assert seen == {'app': 'jobs-test', 'payload': {'entry_id': 1}}
+    assert queue.tasks['example'].priority == 3
+
+    with pytest.raises(ValueError):
+        queue.enqueue('desconhecido')
+
+
+def test_conversation_embedding_risk_level_is_the_parsed_level():
+    from types import SimpleNamespace
+    from app.services.training_service import message_risk_level
+
+    message = SimpleNamespace(risk_indicators='{"risk_level": "high", "emotion": "tristeza", "confidence": 0.9}')
+    assert message_risk_level(message) == 'high'
+    assert message_risk_level(SimpleNamespace(risk_indicators=None)) is None
+    assert message_risk_level(SimpleNamespace(risk_indicators='não é json')) is None
+
+
+def test_running_job_lease_is_renewed_until_released():
+    renewals = []
+
+    class RecordingQueue(JobQueue):
+        def _renew_lease(self, engine, job_id, worker_id, timeout):
+            renewals.append((job_id, worker_id, timeout))
+
+    from app.services.job_queue import ClaimedJob
+    queue = RecordingQueue(enabled=True)
+    lease = queue._hold_lease(ClaimedJob(7, 'example', {}, 1, 3), 'w1', timeout=0.06, engine=None)
+    time.sleep(0.2)
+    lease.set()
+    time.sleep(0.02)
+    count = len(renewals)
+    time.sleep(0.1)
+
+    assert count >= 2
+    assert len(renewals) == count  # Parou após liberar
+    assert renewals[0] == (7, 'w1', 0.06)
+
+
+def test_no_embedded_workers_by_default_under_gevent(monkeypatch):
+    from app.services import job_queue as job_queue_module
+    started = []
+    monkeypatch.setattr(job_queue_module.job_queue, 'enabled', True)
+    monkeypatch.setattr(job_queue_module.JobWorker, 'start', lambda self: started.append(self.threads) or self)
+    app = Flask('jobs-test')
+
+    monkeypatch.setattr(job_queue_module, '_gevent_patched', lambda: True)
+    assert job_queue_module.start_job_workers(app) is None
+    app.config['JOB_EMBEDDED_WORKERS'] = 2
+    assert job_queue_module.start_job_workers(app) is not None
+
+    app.config['JOB_EMBEDDED_WORKERS'] = None
+    monkeypatch.setattr(job_queue_module, '_gevent_patched', lambda: False)
+    assert job_queue_module.start_job_workers(app) is not None
+    assert started == [2, 1]
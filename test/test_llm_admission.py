@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.llm_admission import LLMAdmissionController, LLMAdmissionRejected
+
+
+def _start(controller, level, order):
+    def run():
+        try:
+            with controller.slot(level, timeout=2):
+                order.append(level)
+        except LLMAdmissionRejected:
+            order.append(f'{level}:rejeitado')
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_for_depth(controller, depth):
+    for _ in range(100):
+        if controller.get_statistics()['queue_depth'] == depth:
+            return
+        time.sleep(0.01)
+
+
+def test_critical_jumps_the_queue():
+    controller = LLMAdmissionController(max_in_flight=1, max_queue=10, reserved_slots=0)
+    order = []
+    controller.acquire('low')
+    threads = [_start(controller, 'low', order)]
+    _wait_for_depth(controller, 1)
+    threads.append(_start(controller, 'critical', order))
+    _wait_for_depth(controller, 2)
+    controller.release()
+    for thread in threads:
+        thread.join(3)
+
+    assert order == ['critical', 'low']
+    stats = controller.get_statistics()['levels']
+    assert stats['critical']['queued'] == 1 and stats['low']['admitted'] == 2
+
+
+def test_full_queue_sheds_lowest_risk_first():
+    controller = LLMAdmissionController(max_in_flight=1, max_queue=1, reserved_slots=0)
+    order = []
+    controller.acquire('moderate')
+    low = _start(controller, 'low', order)
+    _wait_for_depth(controller, 1)
+    high = _start(controller, 'high', order)
+    low.join(3)
+    assert order == ['low:rejeitado']
+
+    with pytest.raises(LLMAdmissionRejected):
+        controller.acquire('moderate', timeout=0.1)
+    controller.release()
+    high.join(3)
+    assert order[-1] == 'high'
+    assert controller.get_statistics()['levels']['low']['shed'] == 1
+
+
+def test_reserved_slots_only_for_high_risk():
+    controller = LLMAdmissionController(max_in_flight=1, max_queue=5, reserved_slots=1)
+    controller.acquire('low')
+    controller.acquire('high')
+    with pytest.raises(LLMAdmissionRejected):
+        controller.acquire('low', timeout=0.05)
+    assert controller.get_statistics()['levels']['low']['timed_out'] == 1
+
+
+def test_cancelled_aslot_returns_slot_granted_later():
+    controller = LLMAdmissionController(max_in_flight=1, max_queue=5, reserved_slots=0)
+    controller.acquire('low')
+
+    async def wait_for_slot():
+        async with controller.aslot('low', timeout=2):
+            pass
+
+    async def cancel_while_queued():
+        task = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # A thread continua na fila e recebe a vaga depois do cancelamento
+        controller.release()
+        for _ in range(100):
+            if controller.get_statistics()['in_flight'] == 0:
+                return
+            await asyncio.sleep(0.01)
+
+    asyncio.run(cancel_while_queued())
+    assert controller.get_statistics()['in_flight'] == 0
+    assert controller.get_statistics()['levels']['low']['timed_out'] == 0
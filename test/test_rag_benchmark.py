@@ -0,0 +1,20 @@
+from app.services.rag_benchmark import HashingEmbeddingProvider, build_corpus_texts, build_query_set
+from app.services.retrieval_state import cosine_similarity
+
+
+def test_corpus_and_queries_share_topics():
+    texts = build_corpus_texts()
+    queries = build_query_set()
+    assert {t['topic'] for t in texts} == {q['topic'] for q in queries}
+    assert len({t['content'] for t in texts}) == len(texts)
+
+
+def test_hashing_embeddings_are_deterministic_and_topical():
+    provider = HashingEmbeddingProvider(dimensions=256)
+    same, other, query = provider.embed([
+        'Estou sentindo muita ansiedade por causa de meu trabalho',
+        'Estou sentindo muita tristeza por causa de minha família',
+        'como lidar com ansiedade em meu trabalho?'
+    ])
+    assert HashingEmbeddingProvider(dimensions=256).embed(['ansiedade'])[0] == provider.embed(['ansiedade'])[0]
+    assert cosine_similarity(query, same) > cosine_similarity(query, other)
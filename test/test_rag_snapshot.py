@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from app.services.ai_service import SimpleRAG
+from app.services.rag_snapshot import RAGSnapshotManager
+
+
+def test_snapshot_roundtrip_is_atomic_and_lazy(tmp_path):
+    path = str(tmp_path / 'rag_snapshot.json')
+    source = SimpleRAG()
+    created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    source.signature_cache['ansiedade|trabalho:6'] = [
+        {'user_message': 'ansiedade no trabalho', 'ai_response': 'respire fundo', 'created_at': created_at}
+    ]
+    source.cache_writes += 1
+    manager = RAGSnapshotManager(source, path)
+    assert manager.save()
+    assert not manager.save()  # Nada novo desde a última gravação
+    assert [p.name for p in tmp_path.iterdir()] == ['rag_snapshot.json']
+
+    restored = SimpleRAG()
+    RAGSnapshotManager(restored, path)
+    assert len(restored.signature_cache) == 0
+    rows = restored._get_ranked_conversations('ansiedade no trabalho', 'low', 3)
+    assert rows[0]['created_at'] == created_at
@@ -0,0 +1,70 @@
+import time
+
+from app.services.rate_limit import MemoryBackend, RateLimiter, SQLiteBackend, parse_rules
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _limiter(backend, clock):
+    limiter = RateLimiter(backend=backend, enabled=True, clock=clock)
+    limiter._rules['chat_send'] = parse_rules('user=3/60,ip=5/60')
+    return limiter
+
+
+def test_user_bucket_empties_and_refills():
+    clock = FakeClock()
+    limiter = _limiter(MemoryBackend(), clock)
+    results = [limiter.check('chat_send', {'user': '1', 'ip': '10.0.0.1'}) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    assert results[3].retry_after == 20  # 3 fichas por 60s: uma a cada 20s
+
+    clock.now += 20
+    assert limiter.check('chat_send', {'user': '1', 'ip': '10.0.0.1'}).allowed
+    # Outro usuário no mesmo IP tem o próprio balde, mas divide o do IP (2.67 fichas)
+    other = [limiter.check('chat_send', {'user': '2', 'ip': '10.0.0.1'}) for _ in range(3)]
+    assert [r.allowed for r in other] == [True, True, False]
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / 'buckets.sqlite3')
+    first, second = _limiter(SQLiteBackend(path), clock), _limiter(SQLiteBackend(path), clock)
+
+    assert first.check('chat_send', {'user': '7'}).allowed
+    assert second.check('chat_send', {'user': '7'}).allowed
+    assert first.check('chat_send', {'user': '7'}).allowed
+    denied = second.check('chat_send', {'user': '7'})
+    assert not denied.allowed and denied.retry_after == 20
+
+
+def test_memory_check_overhead_is_microseconds():
+    limiter = RateLimiter(backend=MemoryBackend(), enabled=True)
+    limiter._rules['chat_send'] = parse_rules('user=1000000/1,ip=1000000/1')
+    started = time.perf_counter()
+    for i in range(10000):
+        limiter.check('chat_send', {'user': str(i % 100), 'ip': '10.0.0.1'})
+    per_check = (time.perf_counter() - started) / 10000
+    assert per_check < 100e-6
+
+
+def test_denial_by_ip_does_not_spend_the_user_bucket(tmp_path):
+    for backend in (MemoryBackend(), SQLiteBackend(str(tmp_path / 'buckets.sqlite3'))):
+        clock = FakeClock()
+        limiter = _limiter(backend, clock)
+        # Outros usuários atrás do mesmo NAT esgotam o balde do IP
+        for user in range(5):
+            assert limiter.check('chat_send', {'user': f'nat-{user}', 'ip': '10.0.0.9'}).allowed
+        retries = [limiter.check('chat_send', {'user': '1', 'ip': '10.0.0.9'}) for _ in range(5)]
+        assert not any(r.allowed for r in retries)
+
+        # De outro IP, o usuário ainda tem o balde cheio
+        fresh = [limiter.check('chat_send', {'user': '1', 'ip': '10.0.0.10'}) for _ in range(3)]
+        assert all(r.allowed for r in fresh)
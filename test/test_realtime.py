@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services.realtime import EventBroker, event_broker, format_sse, session_channel, stream_events
+
+
+def _item(event_type, event_id=None, data=None):
+    return {'channel': session_channel(1), 'event': event_type, 'id': event_id, 'data': data or {}}
+
+
+def test_publish_reaches_only_subscribers_of_the_channel():
+    broker = EventBroker(bridge_enabled=False)
+    first = broker.subscribe(session_channel(1))
+    other = broker.subscribe(session_channel(2))
+
+    broker.publish(session_channel(1), 'message', {'content': 'oi'}, event_id=7)
+
+    assert first.get(timeout=0)['id'] == 7
+    assert other.get(timeout=0) is None
+    first.close()
+    other.close()
+    assert broker.get_statistics()['connections'] == 0
+
+
+def test_stream_skips_messages_already_sent_in_the_backlog():
+    broker = EventBroker(bridge_enabled=False)
+    subscription = broker.subscribe(session_channel(1))
+    # Publicada entre a assinatura e a leitura do backlog: chega pelos dois caminhos
+    broker.deliver(_item('message', 5))
+    broker.deliver(_item('message', 6))
+
+    stream = stream_events(subscription, [_item('message', 5), _item('status')], last_id=4, heartbeat=0.01, max_seconds=0.05)
+    chunks = list(stream)
+
+    assert chunks[0] == 'retry: 3000\n\n'
+    assert [c for c in chunks if c.startswith('id:')] == [format_sse(_item('message', 5)), format_sse(_item('message', 6))]
+    assert broker.get_statistics()['connections'] == 0  # Assinatura fechada ao fim do stream
+
+
+def test_events_are_published_only_after_commit():
+    subscription = event_broker.subscribe(session_channel(99))
+    engine = create_engine('sqlite://')
+    try:
+        with Session(engine) as db_session:
+            db_session.execute(text('SELECT 1'))
+            event_broker.publish_on_commit(db_session, session_channel(99), 'status', {'status': 'ACTIVE'})
+            assert subscription.get(timeout=0) is None
+            db_session.commit()
+        assert subscription.get(timeout=0)['data'] == {'status': 'ACTIVE'}
+
+        with Session(engine) as db_session:
+            db_session.execute(text('SELECT 1'))
+            event_broker.publish_on_commit(db_session, session_channel(99), 'status', {'status': 'COMPLETED'})
+            db_session.rollback()
+            db_session.execute(text('SELECT 1'))
+            db_session.commit()
+        assert subscription.get(timeout=0) is None
+    finally:
+        subscription.close()
@@ -0,0 +1,54 @@
+from app.services.ai_service import SimpleRAG
+from app.services.retrieval_state import SessionRetrievalState, merge_candidates
+
+
+def test_state_tracks_new_keywords_and_drift():
+    state = SessionRetrievalState(keywords={'ansiedade'})
+    assert state.new_keywords(['ansiedade', 'trabalho']) == ['trabalho']
+    assert state.has_drifted([1.0, 0.0], threshold=0.9)
+    state.embedding, state.vector = [1.0, 0.0], [{'source_id': 1}]
+    assert not state.has_drifted([0.99, 0.05], threshold=0.9)
+    assert state.has_drifted([0.0, 1.0], threshold=0.9)
+
+
+def test_merge_replaces_scores_without_duplicates():
+    old = [{'id': 1, 'score': 0.2}, {'id': 2, 'score': 0.5}]
+    new = [{'id': 1, 'score': 0.9}]
+    merged = merge_candidates(old, new, key_fn=lambda c: c['id'], score_key='score')
+    assert [c['id'] for c in merged] == [1, 2]
+    assert merged[0]['score'] == 0.9
+
+
+def test_session_queries_only_new_keywords():
+    rag = SimpleRAG()
+    queried = []
+
+    def fake_find(keywords, risk_level, limit=10):
+        queried.append(sorted(keywords))
+        return [{'user_message': f'sobre {k}', 'ai_response': 'resposta acolhedora', 'user_rating': 4}
+                for k in keywords]
+
+    rag._find_similar_conversations = fake_find
+    rag._get_ranked_conversations('com ansiedade', 'low', 3, session_id=7)
+    rag._get_ranked_conversations('ansiedade de novo', 'low', 3, session_id=7)
+    ranked = rag._get_ranked_conversations('ansiedade no trabalho', 'low', 3, session_id=7)
+
+    assert len(queried) == 2
+    assert 'trabalho' in queried[1] and 'ansiedade' not in queried[1]
+    assert {c['user_message'] for c in ranked} >= {'sobre ansiedade', 'sobre trabalho'}
+    assert rag.session_states.get_statistics()['lexical_skipped'] == 1
+
+
+def test_new_turn_results_survive_the_candidate_cap():
+    rag = SimpleRAG()
+
+    def fake_find(keywords, risk_level, limit=10):
+        return [{'user_message': f'sobre {k} {i}', 'ai_response': 'resposta acolhedora', 'user_rating': 4}
+                for k in keywords for i in range(limit)]
+
+    rag._find_similar_conversations = fake_find
+    topics = ['ansiedade', 'trabalho', 'família', 'escola', 'dinheiro', 'solidão', 'futuro']
+    for topic in topics:
+        ranked = rag._get_ranked_conversations(f'preocupação com {topic}', 'low', 3, session_id=9)
+        # Depois de atingir o limite de candidatos, o turno ainda traz os próprios resultados
+        assert any(topic in c['user_message'] for c in ranked), topic
@@ -0,0 +1,33 @@
+import threading
+import time
+
+from flask import Flask
+
+from app.services.speculation import SpeculativeGenerator
+
+
+def test_draft_kept_unless_risk_escalates():
+    app = Flask(__name__)
+    generator = SpeculativeGenerator(workers=2, enabled=True)
+    release = threading.Event()
+
+    def generate(risk_level, user_message):
+        release.wait(2)
+        return {'message': f'{risk_level}: {user_message}', 'tokens_used': 42}
+
+    kept = generator.resolve(generator.start(app, generate, 'low', user_message='oi'), 'low')
+    discarded = generator.start(app, generate, 'moderate', user_message='estou mal')
+    assert generator.resolve(discarded, 'high') is None
+    release.set()
+
+    assert kept.future.result(2)['message'] == 'low: oi'
+    discarded.future.result(2)
+    for _ in range(100):  # O callback roda logo após o resultado
+        if generator.get_statistics()['wasted_tokens']:
+            break
+        time.sleep(0.01)
+    stats = generator.get_statistics()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+    assert stats['wasted_tokens'] == 42
+    assert generator.should_speculate('moderate') and not generator.should_speculate('high')
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+from app.models.chat1a1 import Chat1a1Session
+from app.models.triage import RiskLevel, TriageLog
+from app.services.waiting_queue import claim_next, claim_session, waiting_queue
+
+
+@pytest.fixture
+def queue_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        for model in (User, Chat1a1Session, TriageLog):
+            model.__table__.create(db.engine)
+        waiting_queue.invalidate()
+        yield app
+        db.session.remove()
+        waiting_queue.invalidate()
+
+
+def _waiting(user_id, priority='normal', minutes_ago=0, risk=None):
+    db.session.add(User(id=user_id, email=f'u{user_id}@x.com', username=f'u{user_id}', password_hash='x',
+                        first_name=f'Cliente {user_id}', last_name='Teste'))
+    if risk is not None:
+        db.session.add(TriageLog(user_id=user_id, risk_level=RiskLevel.LOW, context_type='triage',
+                                 created_at=datetime.now(timezone.utc) - timedelta(days=1)))
+        db.session.add(TriageLog(user_id=user_id, risk_level=risk, context_type='triage',
+                                 emotional_state='ansioso'))
+    session = Chat1a1Session(user_id=user_id, status='WAITING', priority_level=priority,
+                             started_at=datetime.now(timezone.utc) - timedelta(minutes=minutes_ago))
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def test_second_volunteer_loses_the_claim(queue_app):
+    session = _waiting(1)
+
+    claimed = claim_session(session.id, volunteer_id=10)
+    db.session.commit()
+    assert claimed.volunteer_id == 10 and claimed.status == 'ACTIVE'
+
+    assert claim_session(session.id, volunteer_id=11) is None
+    db.session.commit()
+    assert db.session.get(Chat1a1Session, session.id).volunteer_id == 10
+
+
+def test_claim_next_takes_highest_priority_then_oldest(queue_app):
+    old_normal = _waiting(1, 'normal', minutes_ago=3)
+    new_high = _waiting(2, 'high', minutes_ago=1)
+    old_high = _waiting(3, 'high', minutes_ago=5)
+
+    claimed = []
+    for volunteer_id in (10, 11, 12):
+        claimed.append(claim_next(volunteer_id).id)
+        db.session.commit()
+    assert claimed == [old_high.id, new_high.id, old_normal.id]
+    assert claim_next(volunteer_id=13) is None
+
+
+def test_order_uses_triage_risk_and_aging(queue_app):
+    fresh_high = _waiting(1, 'high', minutes_ago=0)
+    risky_normal = _waiting(2, 'normal', minutes_ago=1, risk=RiskLevel.CRITICAL)
+    # 30 min de espera (aging de 1 ponto/min) passam à frente do high recém-chegado
+    starving_normal = _waiting(3, 'normal', minutes_ago=30)
+    critical = _waiting(4, 'critical', minutes_ago=0)
+
+    entries = waiting_queue.waiting_list()
+
+    assert [e['session']['id'] for e in entries] == [critical.id, starving_normal.id, fresh_high.id, risky_normal.id]
+    risky = entries[-1]
+    assert risky['triage_log']['risk_level'] == RiskLevel.CRITICAL  # A triagem mais recente
+    assert risky['client']['first_name'] == 'Cliente 2'
+    assert entries[0]['priority_label'] == 'Urgente'
+
+
+def test_list_is_one_query_and_cached_until_enqueue(queue_app):
+    for user_id in range(1, 6):
+        _waiting(user_id, risk=RiskLevel.HIGH)
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    assert len(waiting_queue.waiting_list()) == 5
+    assert len(statements) == 1
+    waiting_queue.waiting_list()
+    assert len(statements) == 1  # Snapshot em cache
+
+    _waiting(6)  # Entrada na fila invalida no commit
+    statements.clear()
+    assert len(waiting_queue.waiting_list()) == 6
+    assert len(statements) == 1
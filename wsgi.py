@@ -69,6 +69,101 @@ def init_db():
         click.echo(f'❌ Erro ao criar dados de teste: {str(e)}')
         raise
 
+@app.cli.command('import-training')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--manifest', default=None, help='Arquivo de manifesto (padrão: <source>.manifest.json)')
+@click.option('--workers', default=None, type=int, help='Processos para extração (padrão: núcleos - 1)')
+@click.option('--user-email', default=None, help='Usuário registrado como autor (padrão: primeiro admin)')
+@with_appcontext
+def import_training(source, manifest, workers, user_email):
+    """Importa em massa documentos de treinamento de um diretório ou .zip."""
+    from app.services.corpus_import import CorpusImporter
+
+    if user_email:
+        user = User.query.filter_by(email=user_email).first()
+    else:
+        user = User.query.filter_by(role=UserRole.ADMIN).order_by(User.id).first()
+    if not user:
+        click.echo('❌ Nenhum usuário encontrado para registrar a importação.')
+        return
+
+    click.echo(f'🚀 Importando corpus de treinamento de {source}...')
+    importer = CorpusImporter(submitted_by=user.id, workers=workers, echo=click.echo)
+    summary = importer.run(source, manifest)
+
+    click.echo('')
+    click.echo(f"✅ Importados: {summary['done']} | Pulados: {summary['skipped']} | "
+               f"Duplicados: {summary['duplicates']} | Erros: {summary['errors']}")
+    click.echo(f"📄 Trechos: {summary['chunks']} | Indexados: {summary['stored']} | "
+               f"{summary['files_per_second']} arquivos/s")
+
+@app.cli.group('rag-benchmark')
+def rag_benchmark():
+    """Corpus sintético e benchmark dos backends de RAG."""
+
+
+@rag_benchmark.command('seed')
+@click.option('--size', default=10000, type=int, help='Número de trocas (ex.: 10000 a 5000000)')
+@click.option('--reset/--no-reset', default=False, help='Remove o corpus sintético anterior')
+@click.option('--embeddings/--no-embeddings', default=True, help='Popula conversation_embeddings')
+@with_appcontext
+def rag_benchmark_seed(size, reset, embeddings):
+    """Popula o banco local com trocas sintéticas rotuladas."""
+    from app.services.rag_benchmark import RAGBenchmark
+
+    benchmark = RAGBenchmark(echo=click.echo)
+    if reset:
+        benchmark.reset()
+    click.echo(f'🚀 Gerando {size:,} trocas sintéticas...')
+    result = benchmark.seed(size, with_embeddings=embeddings)
+    click.echo(f"✅ {result['exchanges']:,} trocas em {result['seconds']}s "
+               f"({result['exchanges_per_second']:,} trocas/s)")
+
+
+@rag_benchmark.command('run')
+@click.option('--backend', 'backends', multiple=True, type=click.Choice(['regex', 'fulltext', 'vector', 'hybrid']),
+              help='Backends a medir (padrão: todos)')
+@click.option('--k', default=3, type=int, help='Exemplos por busca (hit_rate@k)')
+@click.option('--repeat', default=1, type=int, help='Repetições do conjunto de consultas')
+@click.option('--output', default=None, type=click.Path(), help='Salva o relatório em JSON')
+@with_appcontext
+def rag_benchmark_run(backends, k, repeat, output):
+    """Mede hit_rate@k, MRR, latência e consultas por busca de cada backend."""
+    import json
+    from app.services.rag_benchmark import RAGBenchmark
+
+    benchmark = RAGBenchmark(echo=click.echo)
+    size = benchmark.corpus_size()
+    click.echo(f'📊 Corpus sintético: {size:,} trocas')
+    report = benchmark.run(list(backends) or None, k=k, repeat=repeat)
+    if output:
+        with open(output, 'w', encoding='utf-8') as handle:
+            json.dump({'corpus_size': size, 'k': k, 'backends': report}, handle, indent=2)
+        click.echo(f'💾 Relatório salvo em {output}')
+
+@app.cli.command('worker')
+@click.option('--threads', default=2, type=int, help='Threads por processo')
+@click.option('--processes', default=1, type=int, help='Processos worker (cada um com --threads)')
+def worker(threads, processes):
+    """Consome a fila de jobs (pode rodar em vários nós ao mesmo tempo)."""
+    import multiprocessing
+    from app.services.job_queue import JobWorker, run_worker_process
+
+    children = []
+    context = multiprocessing.get_context('spawn')
+    for _ in range(processes - 1):
+        process = context.Process(target=run_worker_process, args=(threads,), daemon=True)
+        process.start()
+        children.append(process)
+
+    click.echo(f'🚀 Worker da fila de jobs: {processes} processo(s) x {threads} thread(s)')
+    JobWorker(app, threads=threads).run_forever()
+    for process in children:
+        process.terminate()
+        process.join(10)
+    click.echo('👋 Worker encerrado')
+
+
 @app.shell_context_processor
 def make_shell_context():
     """Context para Flask shell"""
@@ -91,6 +186,10 @@ if __name__ == "__main__":
 
     # Para desenvolvimento local
     if debug:
+        # Com o reloader, só o processo filho (que atende) inicia os serviços em background
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            from app import start_background_services
+            start_background_services(app)
         app.run(
             host='0.0.0.0',
             port=port,